@@ -1,7 +1,15 @@
 from flask import Flask, render_template
 from flask_cors import CORS
 from config import config
-from extensions import limiter
+from extensions import (
+    limiter,
+    broker,
+    skill_index,
+    people_index,
+    skill_catalog,
+    image_pipeline,
+    score_refresher,
+)
 from routes import (
     auth_bp,
     profile_bp,
@@ -10,6 +18,7 @@ from routes import (
     requests_bp,
     reviews_bp,
     chat_bp,
+    media_bp,
 )
 from database.db import init_db
 from utils.error_handlers import register_error_handlers, register_request_logging
@@ -31,6 +40,20 @@ def create_app(config_name="development"):
     # Initialize Limiter
     limiter.init_app(app)
 
+    # Initialize chat event broker
+    broker.init_app(app)
+
+    # In-memory indexes, kept in sync across workers via the broker
+    skill_index.init_app(app, broker)
+    people_index.init_app(app, broker)
+    skill_catalog.init_app(app)
+
+    # Background processing of uploaded profile pictures
+    image_pipeline.init_app(app)
+
+    # Background refresh of recommendation scores
+    score_refresher.init_app(app)
+
     # Register error handlers and logging
     register_error_handlers(app)
     register_request_logging(app)
@@ -43,6 +66,7 @@ def create_app(config_name="development"):
     app.register_blueprint(requests_bp)
     app.register_blueprint(reviews_bp)
     app.register_blueprint(chat_bp)
+    app.register_blueprint(media_bp)
 
     # Home route
     @app.route("/")
@@ -119,6 +143,12 @@ with app.app_context():
         log_error("Database initialization failed", exception=e)
         raise
 
+    # Warm the matching index now; it retries on first use if this fails
+    try:
+        skill_index.load()
+    except Exception as e:
+        log_error("Skill index load failed", exception=e)
+
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
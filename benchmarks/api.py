@@ -0,0 +1,475 @@
+"""
+Benchmark every API endpoint against synthetic datasets of growing size.
+
+For each --users scale a database is filled by database/generate_data.py
+and every endpoint is called --requests times through the Flask test
+client, as randomly picked (seeded) users. Latency p50/p95 and SQL
+queries per request are reported, and --output writes them as JSON with
+sorted keys so results from two commits can be diffed, or compared
+directly with --compare.
+
+Each scale runs in its own process against a fresh SQLite file (kept and
+reused with --data-dir), or against --database-url for a single scale.
+1M users takes a long while to generate, so it's opt-in.
+
+Usage:
+    python benchmarks/api.py [--users 1000 10000] [--requests 50] [--seed 42]
+        [--data-dir DIR] [--database-url URL] [--output results.json]
+        [--compare previous.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, ROOT)
+
+# Excluded on purpose: the event stream never ends, it's covered by /poll,
+# and generated users have no uploaded pictures to serve
+SKIPPED_RULES = {
+    ("GET", "/api/chat/stream"),
+    ("GET", "/media/avatars/<key>/<int:size>"),
+}
+
+Endpoint = namedtuple("Endpoint", "method rule build")
+
+
+def _sample_data(db, seed):
+    """Ids the endpoint builders pick from, all from the generated users"""
+    from sqlalchemy import text
+
+    from database.generate_data import EMAIL_DOMAIN
+
+    def rows(sql, **params):
+        return [tuple(row) for row in db.execute(text(sql), params).fetchall()]
+
+    users = [row[0] for row in rows(
+        "SELECT id FROM users WHERE email LIKE :pattern ORDER BY id",
+        pattern=f"%.s{seed}@{EMAIL_DOMAIN}",
+    )]
+    first, last = users[0], users[-1]
+    return {
+        "users": users,
+        "emails": dict(rows(
+            "SELECT id, email FROM users WHERE id BETWEEN :first AND :last",
+            first=first, last=last,
+        )),
+        # Popular skills first, as users would search them
+        "skills": [row[0] for row in rows(
+            """SELECT skill_id FROM user_skills GROUP BY skill_id
+            ORDER BY COUNT(*) DESC, skill_id LIMIT 50"""
+        )],
+        "skill_names": dict(rows("SELECT id, name FROM skills")),
+        "teaching": rows(
+            """SELECT user_id, skill_id FROM user_skills
+            WHERE is_teaching = :yes AND user_id BETWEEN :first AND :last""",
+            yes=True, first=first, last=last,
+        ),
+        "conversations": rows(
+            """SELECT id, user1_id, user2_id, last_message_id FROM conversations
+            WHERE user1_id BETWEEN :first AND :last ORDER BY id""",
+            first=first, last=last,
+        ),
+        "pending": rows(
+            """SELECT id, receiver_id FROM swap_requests
+            WHERE status = 'pending' AND sender_id BETWEEN :first AND :last
+            ORDER BY id""",
+            first=first, last=last,
+        ),
+        "unreviewed": rows(
+            """SELECT r.id, r.sender_id FROM swap_requests r
+            LEFT JOIN reviews v ON v.request_id = r.id AND v.reviewer_id = r.sender_id
+            WHERE r.status = 'completed' AND v.id IS NULL
+                AND r.sender_id BETWEEN :first AND :last
+            ORDER BY r.id""",
+            first=first, last=last,
+        ),
+        "locations": [row[0] for row in rows(
+            """SELECT DISTINCT location FROM users
+            WHERE location IS NOT NULL AND id BETWEEN :first AND :last""",
+            first=first, last=last,
+        )],
+    }
+
+
+def _endpoints(sample, rng, password):
+    """
+    What to call, in order: reads first so they see the generated data
+    only, then writes. Builders return (user_id or None, path, json body).
+    """
+    from utils.profile_helper import AVATAR_COLORS
+
+    users = sample["users"]
+    skills = sample["skills"]
+
+    def user():
+        return rng.choice(users)
+
+    def skill():
+        # Popularity-weighted, like the generated data
+        return skills[min(int(rng.expovariate(1 / 5)), len(skills) - 1)]
+
+    def word(text):
+        words = text.replace(",", "").split()
+        return rng.choice(words)[:5]
+
+    def conversation():
+        conversation_id, user1_id, user2_id, last_id = rng.choice(sample["conversations"])
+        return conversation_id, rng.choice((user1_id, user2_id)), last_id
+
+    def messages():
+        conversation_id, user_id, _ = conversation()
+        return user_id, f"/api/chat/{conversation_id}/messages", None
+
+    def read_receipt():
+        conversation_id, user_id, last_id = conversation()
+        return user_id, f"/api/chat/{conversation_id}/read", {"message_id": last_id}
+
+    def send():
+        _, user1_id, user2_id, _ = rng.choice(sample["conversations"])
+        return user1_id, "/api/chat/send", {"receiver_id": user2_id, "content": "Benchmark"}
+
+    def signup():
+        return None, "/api/auth/signup", {
+            "email": f"bench{rng.randrange(10**9)}@bench.example.com",
+            "password": password,
+            "full_name": "Bench Mark",
+        }
+
+    def login():
+        user_id = user()
+        return None, "/api/auth/login", {
+            "email": sample["emails"][user_id],
+            "password": password,
+        }
+
+    def create_request():
+        teacher_id, skill_id = rng.choice(sample["teaching"])
+        return user(), "/api/requests/", {
+            "receiver_id": teacher_id,
+            "skill_id": skill_id,
+            "message": "Benchmark",
+        }
+
+    def accept_request():
+        request_id, receiver_id = sample["pending"].pop()
+        return receiver_id, f"/api/requests/{request_id}/status", {"status": "accepted"}
+
+    def review():
+        request_id, sender_id = sample["unreviewed"].pop()
+        return sender_id, "/api/reviews/", {
+            "request_id": request_id,
+            "rating": rng.randint(1, 5),
+            "comment": "Benchmark",
+        }
+
+    def update_profile():
+        return user(), "/api/profile/update", {
+            "bio": "Benchmarking",
+            "location": rng.choice(sample["locations"]),
+            "availability_schedule": {"sat": ["09-12"]},
+        }
+
+    def add_skill():
+        return user(), "/api/profile/skills", {
+            "skill_id": skill(),
+            "proficiency_level": "Intermediate",
+            "is_teaching": True,
+        }
+
+    def remove_skill():
+        user_id, skill_id = rng.choice(sample["teaching"])
+        return user_id, f"/api/profile/skills/{skill_id}", None
+
+    return [
+        Endpoint("GET", "/api/auth/me", lambda: (user(), "/api/auth/me", None)),
+        Endpoint("GET", "/api/skills/", lambda: (None, "/api/skills/", None)),
+        Endpoint("GET", "/api/skills/categories", lambda: (None, "/api/skills/categories", None)),
+        Endpoint("GET", "/api/skills/search", lambda: (
+            None, f"/api/skills/search?q={word(sample['skill_names'][skill()])}", None
+        )),
+        Endpoint("GET", "/api/skills/autocomplete", lambda: (
+            None, f"/api/skills/autocomplete?q={word(sample['skill_names'][skill()])[:3]}", None
+        )),
+        Endpoint("GET", "/api/skills/stats", lambda: (
+            None, f"/api/skills/stats?skill_ids={skill()},{skill()}", None
+        )),
+        Endpoint("GET", "/api/skills/trending", lambda: (None, "/api/skills/trending", None)),
+        Endpoint("GET", "/api/profile/<int:user_id>", lambda: (
+            None, f"/api/profile/{user()}", None
+        )),
+        Endpoint("GET", "/media/initials/<initials>/<int:color>.svg", lambda: (
+            None,
+            f"/media/initials/{chr(65 + rng.randrange(26))}{chr(65 + rng.randrange(26))}/"
+            f"{rng.randrange(len(AVATAR_COLORS))}.svg",
+            None,
+        )),
+        Endpoint("GET", "/api/matching/find-teachers", lambda: (
+            user(), f"/api/matching/find-teachers?skill_id={skill()}", None
+        )),
+        Endpoint("GET", "/api/matching/find-learners", lambda: (
+            user(), f"/api/matching/find-learners?skill_id={skill()}", None
+        )),
+        Endpoint("GET", "/api/matching/search-users", lambda: (
+            user(), f"/api/matching/search-users?q={word(rng.choice(sample['locations']))}", None
+        )),
+        Endpoint("GET", "/api/matching/recommendations", lambda: (
+            user(), "/api/matching/recommendations", None
+        )),
+        Endpoint("GET", "/api/matching/mutual", lambda: (user(), "/api/matching/mutual", None)),
+        Endpoint("GET", "/api/matching/similar-users", lambda: (
+            user(), "/api/matching/similar-users", None
+        )),
+        Endpoint("GET", "/api/matching/suggested-skills", lambda: (
+            user(), "/api/matching/suggested-skills", None
+        )),
+        Endpoint("GET", "/api/requests/", lambda: (user(), "/api/requests/", None)),
+        Endpoint("GET", "/api/requests/rings", lambda: (user(), "/api/requests/rings", None)),
+        Endpoint("GET", "/api/reviews/user/<int:user_id>", lambda: (
+            None, f"/api/reviews/user/{user()}", None
+        )),
+        Endpoint("GET", "/api/chat/conversations", lambda: (
+            conversation()[1], "/api/chat/conversations", None
+        )),
+        Endpoint("GET", "/api/chat/<int:conversation_id>/messages", messages),
+        Endpoint("GET", "/api/chat/unread", lambda: (conversation()[1], "/api/chat/unread", None)),
+        Endpoint("GET", "/api/chat/search", lambda: (
+            conversation()[1], "/api/chat/search?q=session", None
+        )),
+        Endpoint("GET", "/api/chat/poll", lambda: (user(), "/api/chat/poll?timeout=0", None)),
+        Endpoint("POST", "/api/chat/<int:conversation_id>/read", read_receipt),
+        Endpoint("POST", "/api/chat/send", send),
+        Endpoint("POST", "/api/auth/signup", signup),
+        Endpoint("POST", "/api/auth/login", login),
+        Endpoint("POST", "/api/requests/", create_request),
+        Endpoint("PUT", "/api/requests/<int:request_id>/status", accept_request),
+        Endpoint("POST", "/api/reviews/", review),
+        Endpoint("PUT", "/api/profile/update", update_profile),
+        Endpoint("POST", "/api/profile/skills", add_skill),
+        Endpoint("DELETE", "/api/profile/skills/<int:skill_id>", remove_skill),
+    ]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def run_scale(users, requests, seed, warmup):
+    """Generate (or reuse) the dataset for DATABASE_URL and time every endpoint"""
+    from sqlalchemy import event, text
+
+    from app import app
+    from database.db import engine, get_db, get_db_dialect
+    from database.generate_data import EMAIL_DOMAIN, generate, rebuild_derived
+    from extensions import limiter, skill_index
+    from utils import generate_token
+
+    limiter.enabled = False
+    app.config["TESTING"] = True
+    password = "Benchmark-2024"
+    result = {"dialect": get_db_dialect()}
+
+    with app.app_context():
+        db = get_db()
+        existing = db.execute(
+            text("SELECT COUNT(*) FROM users WHERE email LIKE :pattern"),
+            {"pattern": f"%.s{seed}@{EMAIL_DOMAIN}"},
+        ).scalar()
+        db.close()
+        if existing and existing != users:
+            raise SystemExit(f"Database already holds {existing} users for seed {seed}")
+        if not existing:
+            started = time.perf_counter()
+            generate(users=users, seed=seed, password=password)
+            rebuild_derived(5000)
+            result["generate_seconds"] = round(time.perf_counter() - started, 1)
+        skill_index.load()
+
+        db = get_db()
+        sample = _sample_data(db, seed)
+        db.close()
+
+    queries = [0]
+
+    def count_query(*args):
+        queries[0] += 1
+
+    event.listen(engine, "before_cursor_execute", count_query)
+
+    rng = random.Random(seed)
+    client = app.test_client()
+    endpoints = {}
+    covered = set()
+    for endpoint in _endpoints(sample, rng, password):
+        covered.add((endpoint.method, endpoint.rule))
+        timings, counts, errors = [], [], 0
+        for i in range(warmup + requests):
+            try:
+                user_id, path, body = endpoint.build()
+            except (IndexError, KeyError):
+                break  # Ran out of pending requests and the like
+            headers = {}
+            if user_id is not None:
+                token = generate_token(user_id, sample["emails"].get(user_id, ""))
+                headers["Authorization"] = f"Bearer {token}"
+
+            queries[0] = 0
+            started = time.perf_counter()
+            response = client.open(path, method=endpoint.method, json=body, headers=headers)
+            elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            counts.append(queries[0])
+            if response.status_code >= 400:
+                errors += 1
+
+        name = f"{endpoint.method} {endpoint.rule}"
+        if not timings:
+            endpoints[name] = {"skipped": "no sample data"}
+            continue
+        endpoints[name] = {
+            "requests": len(timings),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "queries": round(sum(counts) / len(counts), 1),
+            "errors": errors,
+        }
+
+    event.remove(engine, "before_cursor_execute", count_query)
+
+    result["endpoints"] = endpoints
+    result["not_covered"] = sorted(
+        f"{method} {rule.rule}"
+        for rule in app.url_map.iter_rules()
+        if rule.rule.startswith("/api")
+        for method in rule.methods - {"HEAD", "OPTIONS"}
+        if (method, rule.rule) not in covered | SKIPPED_RULES
+    )
+    return result
+
+
+def run_in_process(users, args, database_url):
+    """run_scale in a fresh interpreter, since the engine binds DATABASE_URL at import"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "result.json")
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", output,
+            "--users", str(users), "--requests", str(args.requests),
+            "--seed", str(args.seed), "--warmup", str(args.warmup),
+        ]
+        env = {**os.environ, "DATABASE_URL": database_url}
+        subprocess.run(command, env=env, cwd=ROOT, check=True)
+        with open(output) as f:
+            return json.load(f)
+
+
+def print_results(results):
+    for scale, result in results["scales"].items():
+        print(f"\n{scale} users ({result['dialect']})")
+        print(f"  {'endpoint':<48} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'errors':>6}")
+        for name, stats in result["endpoints"].items():
+            if "skipped" in stats:
+                print(f"  {name:<48} skipped: {stats['skipped']}")
+                continue
+            print(
+                f"  {name:<48} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                f"{stats['queries']:>8.1f} {stats['errors']:>6}"
+            )
+        if result["not_covered"]:
+            print(f"  not covered: {', '.join(result['not_covered'])}")
+
+
+def compare(previous, results):
+    """p95 and query count changes against an earlier --output file"""
+    print("\nChanges against the previous run (p95 ms, queries per request):")
+    for scale, result in results["scales"].items():
+        before = previous.get("scales", {}).get(scale)
+        if not before:
+            print(f"  {scale} users: not in the previous run")
+            continue
+        for name, stats in result["endpoints"].items():
+            old = before["endpoints"].get(name)
+            if not old or "p95_ms" not in old or "p95_ms" not in stats:
+                continue
+            change = (stats["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0
+            flag = " <- more queries" if stats["queries"] > old["queries"] else ""
+            print(
+                f"  {scale:>8} {name:<48} {old['p95_ms']:>8.2f} -> {stats['p95_ms']:>8.2f} "
+                f"({change:+.0f}%)  {old['queries']:.1f} -> {stats['queries']:.1f}{flag}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--users", type=int, nargs="+", default=[1000, 10000],
+        help="dataset sizes, e.g. 1000 10000 100000 1000000",
+    )
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=2, help="untimed requests per endpoint")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", help="keep the SQLite files here and reuse them")
+    parser.add_argument("--database-url", help="benchmark this database (single scale only)")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier --output to compare with")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_scale(args.users[0], args.requests, args.seed, args.warmup)
+        with open(args.worker, "w") as f:
+            json.dump(result, f)
+        return
+
+    if args.database_url and len(args.users) > 1:
+        parser.error("--database-url takes a single --users scale")
+
+    results = {
+        "config": {
+            "requests": args.requests,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "scales": {},
+    }
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="skillswap-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        for users in sorted(args.users):
+            database_url = args.database_url or "sqlite:///" + os.path.join(
+                data_dir, f"bench-{users}-s{args.seed}.db"
+            )
+            print(f"Benchmarking {users} users...")
+            results["scales"][str(users)] = run_in_process(users, args, database_url)
+    finally:
+        if not args.data_dir:
+            for name in os.listdir(data_dir):
+                os.remove(os.path.join(data_dir, name))
+            os.rmdir(data_dir)
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n[OK] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
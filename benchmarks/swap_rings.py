@@ -0,0 +1,76 @@
+"""
+Benchmark the swap ring finder (database/find_swap_rings.py) on a synthetic
+teach/learn graph. No database is needed: user_skills rows are generated in
+memory, with skill popularity following a Zipf-like curve as in real
+catalogs.
+
+Usage:
+    python benchmarks/swap_rings.py [--users 100000] [--skills 2000]
+        [--workers 1 2 4] [--seed 42]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from itertools import accumulate
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.find_swap_rings import SkillGraph, find_rings
+
+
+def synthetic_rows(users, skills, seed, max_per_side=4):
+    """(user_id, skill_id, is_teaching, is_learning) rows for `users` users"""
+    rng = random.Random(seed)
+    skill_ids = range(1, skills + 1)
+    cum_weights = list(accumulate(1 / rank for rank in skill_ids))
+    rows = []
+    for user_id in range(1, users + 1):
+        # Some users only teach or only learn
+        teach_count = rng.randint(0, max_per_side)
+        learn_count = rng.randint(0 if teach_count else 1, max_per_side)
+        teach = set(rng.choices(skill_ids, cum_weights=cum_weights, k=teach_count))
+        learn = set(rng.choices(skill_ids, cum_weights=cum_weights, k=learn_count))
+        for skill_id in teach | learn:
+            rows.append((user_id, skill_id, skill_id in teach, skill_id in learn - teach))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--skills", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = synthetic_rows(args.users, args.skills, args.seed)
+    print(f"Generated {len(rows)} user skills for {args.users} users in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    graph = SkillGraph(rows)
+    print(f"Built graph ({len(graph.candidates())} candidates) in "
+          f"{time.perf_counter() - started:.1f}s")
+
+    for workers in sorted(set(args.workers)):
+        started = time.perf_counter()
+        rings = find_rings(rows, workers, args.chunk_size)
+        elapsed = time.perf_counter() - started
+
+        sizes = {}
+        for members, _ in rings:
+            sizes[len(members)] = sizes.get(len(members), 0) + 1
+        covered = len({u for members, _ in rings for u in members})
+        print(f"workers={workers}: {len(rings)} rings {dict(sorted(sizes.items()))}, "
+              f"{covered} users covered, {elapsed:.1f}s "
+              f"({args.users / elapsed:.0f} users/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,11 @@ class Config:
 
         _encryption_key = Fernet.generate_key().decode("utf-8")
     ENCRYPTION_KEY = _encryption_key
+    # Retired keys (comma-separated) still accepted for decryption after a rotation
+    ENCRYPTION_OLD_KEYS = os.getenv("ENCRYPTION_OLD_KEYS", "")
+    # Encrypt new chat messages. Only enable with a fixed ENCRYPTION_KEY;
+    # existing rows are migrated by database/reencrypt_messages.py
+    ENCRYPT_MESSAGES = os.getenv("ENCRYPT_MESSAGES", "false").lower() == "true"
 
     # Flask settings
     DEBUG = os.getenv("FLASK_ENV") == "development"
@@ -26,11 +31,22 @@ class Config:
 
     # JWT settings
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 hours in seconds
+    # Tickets for EventSource, which can't send headers and so puts them in the URL
+    STREAM_TICKET_EXPIRES = 60
 
     # File upload settings
     UPLOAD_FOLDER = "static/uploads"
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+    ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+    # Threads rendering avatar variants (utils/image_pipeline.py), 0 = inline
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+    # How often each worker refreshes stale recommendation scores
+    # (utils/recommendation_scores.py); 0 leaves them to the rebuild script
+    RECOMMENDATION_REFRESH_SECONDS = int(os.getenv("RECOMMENDATION_REFRESH_SECONDS", "10"))
+
+    # Chat push events: memory:// (single worker), file:///path (shared spool
+    # for several workers on one host) or redis://host:port
+    CHAT_BROKER_URL = os.getenv("CHAT_BROKER_URL", "memory://")
 
 
 class DevelopmentConfig(Config):
@@ -1,4 +1,26 @@
 # Database package initialization
-from .db import get_db, init_db, close_db
+from .db import (
+    get_db,
+    init_db,
+    close_db,
+    get_db_dialect,
+    insert_returning_id,
+    build_in_clause,
+    fulltext_available,
+    message_search_available,
+    index_message,
+    index_person,
+)
 
-__all__ = ['get_db', 'init_db', 'close_db']
+__all__ = [
+    'get_db',
+    'init_db',
+    'close_db',
+    'get_db_dialect',
+    'insert_returning_id',
+    'build_in_clause',
+    'fulltext_available',
+    'message_search_available',
+    'index_message',
+    'index_person',
+]
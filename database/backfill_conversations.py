@@ -0,0 +1,182 @@
+"""
+Rebuild the denormalized conversation summary (last message id, preview,
+timestamp, read watermarks and per-participant unread counts) from the
+messages table.
+
+send_message keeps the summary current; run this once after upgrading an
+existing database, or any time the summary is suspected to have drifted.
+
+Usage: python database/backfill_conversations.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db, build_in_clause
+from routes.chat import PREVIEW_LENGTH
+from utils.encryption import encrypt_message, decrypt_message
+
+
+def backfill_batch(db, conversations):
+    """Recompute the summary for one batch of conversation rows"""
+    placeholders, params = build_in_clause(
+        "c", [conv["id"] for conv in conversations]
+    )
+
+    result = db.execute(
+        text(
+            f"""
+        SELECT m.conversation_id, m.id, m.content, m.created_at
+        FROM messages m
+        JOIN (
+            SELECT conversation_id, MAX(id) AS id FROM messages
+            WHERE conversation_id IN ({placeholders})
+            GROUP BY conversation_id
+        ) latest ON latest.id = m.id
+    """
+        ),
+        params,
+    )
+    last_messages = {row._mapping["conversation_id"]: row._mapping for row in result}
+
+    # Watermarks predate the legacy per-message is_read flag on old data;
+    # take whichever is further along
+    result = db.execute(
+        text(
+            f"""
+        SELECT conversation_id, sender_id, MAX(id) AS last_read
+        FROM messages
+        WHERE conversation_id IN ({placeholders}) AND is_read = 1
+        GROUP BY conversation_id, sender_id
+    """
+        ),
+        params,
+    )
+    read_by_sender = {}
+    for row in result:
+        row = row._mapping
+        read_by_sender.setdefault(row["conversation_id"], {})[row["sender_id"]] = row[
+            "last_read"
+        ]
+
+    updates = []
+    for conv in conversations:
+        last = last_messages.get(conv["id"])
+        legacy_read = read_by_sender.get(conv["id"], {})
+        preview = None
+        if last:
+            preview = encrypt_message(decrypt_message(last["content"])[:PREVIEW_LENGTH])
+
+        watermarks = {}
+        for participant in ("user1", "user2"):
+            # A participant has read what the other side sent up to this id
+            read_from_other = [
+                last_read
+                for sender, last_read in legacy_read.items()
+                if sender != conv[f"{participant}_id"]
+            ]
+            watermarks[participant] = max(
+                [conv[f"{participant}_last_read_id"] or 0] + read_from_other
+            )
+
+        updates.append(
+            {
+                "id": conv["id"],
+                "last_message_id": last["id"] if last else None,
+                "preview": preview,
+                "last_message_at": last["created_at"] if last else None,
+                "user1_last_read": watermarks["user1"],
+                "user2_last_read": watermarks["user2"],
+            }
+        )
+
+    db.execute(
+        text(
+            """
+        UPDATE conversations
+        SET last_message_id = :last_message_id,
+            last_message_preview = :preview,
+            last_message_at = :last_message_at,
+            user1_last_read_id = :user1_last_read,
+            user2_last_read_id = :user2_last_read
+        WHERE id = :id
+    """
+        ),
+        updates,
+    )
+
+    # Unread = messages from the other participant above the watermark
+    db.execute(
+        text(
+            f"""
+        UPDATE conversations
+        SET user1_unread_count = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.conversation_id = conversations.id
+                  AND m.sender_id != conversations.user1_id
+                  AND m.id > conversations.user1_last_read_id
+            ),
+            user2_unread_count = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.conversation_id = conversations.id
+                  AND m.sender_id != conversations.user2_id
+                  AND m.id > conversations.user2_last_read_id
+            )
+        WHERE id IN ({placeholders})
+    """
+        ),
+        params,
+    )
+
+
+def backfill(batch_size=500):
+    """Walk conversations in id order, committing after every batch"""
+    db = get_db()
+    last_id = 0
+    total = 0
+    try:
+        while True:
+            result = db.execute(
+                text(
+                    """
+                SELECT id, user1_id, user2_id, user1_last_read_id, user2_last_read_id
+                FROM conversations
+                WHERE id > :last_id ORDER BY id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            conversations = [dict(row._mapping) for row in result]
+            if not conversations:
+                break
+
+            backfill_batch(db, conversations)
+            db.commit()
+
+            last_id = conversations[-1]["id"]
+            total += len(conversations)
+            print(f"Backfilled {total} conversations (last id {last_id})")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Conversation summaries rebuilt for {total} conversations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        backfill(args.batch_size)
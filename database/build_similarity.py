@@ -0,0 +1,320 @@
+"""
+Compute "users like you" neighbours and skill suggestions.
+
+Loads user_skills into a sparse user x skill matrix with separate teach
+and learn channels (teach entries weighted by proficiency, both scaled by
+skill IDF so rare skills count for more). Rows are L2-normalized, so one
+sparse product per chunk of users gives their cosine similarity to
+everybody; chunks are spread over a process pool. The top SIMILAR_USERS_K neighbours of each user go into
+similar_users. Skills their neighbours teach or learn that the user
+doesn't have yet, weighted by similarity, go into suggested_skills.
+
+Default mode recomputes everyone. --changed-only recomputes only users
+whose skills changed (users.skills_updated_at) since the last run, still
+against the full matrix. Other users' lists catch up on the next full run.
+
+Requires numpy and scipy.
+
+Usage:
+    python database/build_similarity.py [--changed-only] [--chunk-size 500]
+        [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import text
+
+SIMILAR_USERS_K = 20
+SUGGESTED_SKILLS_K = 10
+
+TEACH_WEIGHT = 1.0
+LEARN_WEIGHT = 1.0
+PROFICIENCY_ORDINAL = {"Beginner": 1, "Intermediate": 2, "Expert": 3}
+
+# Neighbours below this cosine are noise rather than "like you"
+MIN_SIMILARITY = 0.05
+
+# Per-process matrices, set up once by _init_worker
+_matrix = None
+_has_skill = None
+
+
+def _init_worker(matrix, has_skill):
+    global _matrix, _has_skill
+    _matrix, _has_skill = matrix, has_skill
+
+
+def _compute_chunk(chunk_rows):
+    return compute_chunk(_matrix, _has_skill, chunk_rows)
+
+
+def load_matrix(db):
+    """
+    Build the normalized user x (teach skills | learn skills) matrix.
+
+    Returns (matrix, user_ids, skill_ids, has_skill) where has_skill is the
+    binary user x skill matrix of skills a user teaches or learns.
+    """
+    rows = db.execute(
+        text(
+            "SELECT user_id, skill_id, proficiency_level, is_teaching, is_learning FROM user_skills"
+        )
+    ).fetchall()
+
+    user_ids = np.array(sorted({row[0] for row in rows}), dtype=np.int64)
+    skill_ids = np.array(sorted({row[1] for row in rows}), dtype=np.int64)
+    user_index = {uid: i for i, uid in enumerate(user_ids.tolist())}
+    skill_index = {sid: i for i, sid in enumerate(skill_ids.tolist())}
+    n_users, n_skills = len(user_ids), len(skill_ids)
+
+    row_idx, col_idx, values = [], [], []
+    for user_id, skill_id, proficiency, is_teaching, is_learning in rows:
+        u, s = user_index[user_id], skill_index[skill_id]
+        if is_teaching:
+            row_idx.append(u)
+            col_idx.append(s)
+            values.append(TEACH_WEIGHT * PROFICIENCY_ORDINAL.get(proficiency, 1))
+        if is_learning:
+            row_idx.append(u)
+            col_idx.append(n_skills + s)
+            values.append(LEARN_WEIGHT)
+
+    matrix = sparse.csr_matrix(
+        (np.array(values, dtype=np.float32), (row_idx, col_idx)),
+        shape=(n_users, 2 * n_skills),
+    )
+    matrix.sum_duplicates()
+
+    # IDF per column: sharing a rare skill says more than sharing a popular one
+    document_frequency = np.bincount(matrix.indices, minlength=2 * n_skills)
+    idf = np.log((1 + n_users) / (1 + document_frequency)).astype(np.float32) + 1
+    matrix = matrix @ sparse.diags(idf)
+
+    # L2-normalize rows so dot products are cosines
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = sparse.diags(1 / norms) @ matrix
+    matrix = matrix.tocsr().astype(np.float32)
+
+    # Collapse the two channels into "has this skill at all"
+    has_skill = (matrix[:, :n_skills] + matrix[:, n_skills:]).tocsr()
+    has_skill.data[:] = 1
+
+    return matrix, user_ids, skill_ids, has_skill
+
+
+def top_k_rows(product, rows, k, min_value=0, exclude=None):
+    """
+    Per-row top k (column, value) of a CSR product with value > min_value,
+    best first. exclude[i] is a column to skip for row i (the user themself).
+    """
+    results = []
+    for i in range(rows):
+        start, end = product.indptr[i], product.indptr[i + 1]
+        columns = product.indices[start:end]
+        values = product.data[start:end]
+
+        keep = values > min_value
+        if exclude is not None:
+            keep &= columns != exclude[i]
+        columns, values = columns[keep], values[keep]
+
+        if len(values) > k:
+            best = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[best], values[best]
+        order = np.argsort(-values, kind="stable")
+        results.append((columns[order], values[order]))
+    return results
+
+
+def compute_chunk(matrix, has_skill, chunk_rows):
+    """Neighbours and suggestions for one chunk of matrix rows"""
+    similarities = (matrix[chunk_rows] @ matrix.T).tocsr()
+    neighbours = top_k_rows(
+        similarities,
+        len(chunk_rows),
+        SIMILAR_USERS_K,
+        min_value=MIN_SIMILARITY,
+        exclude=chunk_rows,
+    )
+
+    # Sparse chunk x users matrix of the kept neighbours only
+    row_idx = np.repeat(np.arange(len(chunk_rows)), [len(c) for c, _ in neighbours])
+    col_idx = np.concatenate([c for c, _ in neighbours]) if len(row_idx) else []
+    weights = np.concatenate([v for _, v in neighbours]) if len(row_idx) else []
+    neighbour_matrix = sparse.csr_matrix(
+        (weights, (row_idx, col_idx)), shape=(len(chunk_rows), matrix.shape[0])
+    )
+
+    # Similarity-weighted votes for skills, minus the ones the user already has
+    votes = (neighbour_matrix @ has_skill).tocsr()
+    owned = has_skill[chunk_rows]
+    votes = (votes - votes.multiply(owned)).tocsr()
+    votes.eliminate_zeros()
+    suggestions = top_k_rows(votes, len(chunk_rows), SUGGESTED_SKILLS_K)
+
+    return neighbours, suggestions
+
+
+def store_chunk(db, user_ids, skill_ids, chunk_rows, neighbours, suggestions, computed_at):
+    from database.db import build_in_clause
+
+    chunk_user_ids = user_ids[chunk_rows].tolist()
+    placeholders, params = build_in_clause("u", chunk_user_ids)
+    db.execute(text(f"DELETE FROM similar_users WHERE user_id IN ({placeholders})"), params)
+    db.execute(text(f"DELETE FROM suggested_skills WHERE user_id IN ({placeholders})"), params)
+
+    similar_rows, skill_rows = [], []
+    for user_id, (columns, values), (skill_columns, scores) in zip(
+        chunk_user_ids, neighbours, suggestions
+    ):
+        for ordinal, (column, value) in enumerate(zip(columns.tolist(), values.tolist())):
+            similar_rows.append(
+                {
+                    "user_id": user_id,
+                    "other_id": int(user_ids[column]),
+                    "similarity": round(float(value), 4),
+                    "ordinal": ordinal,
+                    "computed_at": computed_at,
+                }
+            )
+        for ordinal, (column, score) in enumerate(zip(skill_columns.tolist(), scores.tolist())):
+            skill_rows.append(
+                {
+                    "user_id": user_id,
+                    "skill_id": int(skill_ids[column]),
+                    "score": round(float(score), 4),
+                    "ordinal": ordinal,
+                    "computed_at": computed_at,
+                }
+            )
+
+    if similar_rows:
+        db.execute(
+            text(
+                """
+            INSERT INTO similar_users (user_id, similar_user_id, similarity, ordinal, computed_at)
+            VALUES (:user_id, :other_id, :similarity, :ordinal, :computed_at)
+        """
+            ),
+            similar_rows,
+        )
+    if skill_rows:
+        db.execute(
+            text(
+                """
+            INSERT INTO suggested_skills (user_id, skill_id, score, ordinal, computed_at)
+            VALUES (:user_id, :skill_id, :score, :ordinal, :computed_at)
+        """
+            ),
+            skill_rows,
+        )
+
+
+def changed_rows(db, user_ids):
+    """Matrix rows of users whose skills changed since the last run"""
+    last_run = db.execute(text("SELECT MAX(computed_at) FROM similar_users")).scalar()
+    if last_run is None:
+        return np.arange(len(user_ids))
+
+    result = db.execute(
+        text("SELECT id FROM users WHERE skills_updated_at >= :last_run"),
+        {"last_run": last_run},
+    )
+    changed = np.array([row[0] for row in result], dtype=np.int64)
+    return np.flatnonzero(np.isin(user_ids, changed))
+
+
+def build(changed_only=False, chunk_size=500, workers=1):
+    from database.db import get_db
+
+    started = time.time()
+    db = get_db()
+    try:
+        # Stamp rows with the database clock at the start, so changes made
+        # while this runs are picked up by the next --changed-only run
+        computed_at = db.execute(text("SELECT CURRENT_TIMESTAMP")).scalar()
+
+        matrix, user_ids, skill_ids, has_skill = load_matrix(db)
+        print(
+            f"Loaded {matrix.shape[0]} users x {len(skill_ids)} skills "
+            f"({matrix.nnz} entries) in {time.time() - started:.1f}s"
+        )
+
+        rows = changed_rows(db, user_ids) if changed_only else np.arange(len(user_ids))
+        db.commit()
+
+        chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        if workers > 1 and len(chunks) > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(matrix, has_skill),
+            )
+            results = pool.map(_compute_chunk, chunks)
+        else:
+            pool = None
+            _init_worker(matrix, has_skill)
+            results = map(_compute_chunk, chunks)
+
+        try:
+            done = 0
+            # Results arrive in order; writes stay in this process
+            for chunk_rows, (neighbours, suggestions) in zip(chunks, results):
+                store_chunk(
+                    db, user_ids, skill_ids, chunk_rows, neighbours, suggestions, computed_at
+                )
+                db.commit()
+                done += len(chunk_rows)
+                print(f"Processed {done}/{len(rows)} users")
+        finally:
+            if pool:
+                pool.shutdown()
+
+        if not changed_only:
+            # Users who no longer have any skills
+            db.execute(
+                text(
+                    "DELETE FROM similar_users WHERE user_id NOT IN (SELECT user_id FROM user_skills)"
+                )
+            )
+            db.execute(
+                text(
+                    "DELETE FROM suggested_skills WHERE user_id NOT IN (SELECT user_id FROM user_skills)"
+                )
+            )
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Similarity built for {len(rows)} users in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Only users whose skills changed since the last run",
+    )
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        build(args.changed_only, args.chunk_size, args.workers)
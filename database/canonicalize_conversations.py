@@ -0,0 +1,136 @@
+"""
+Rewrite conversations so every row is keyed by the canonical
+(user1_id < user2_id) pair that send_message now upserts on.
+
+Rows stored the other way round are flipped, swapping the per-participant
+unread counters and read watermarks with them. Where both orderings exist
+for the same pair, messages are moved onto the canonical row and the
+duplicate is deleted.
+
+Usage: python database/canonicalize_conversations.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from database.backfill_conversations import backfill_batch
+
+
+def merge_into(db, keep, drop):
+    """Move messages from the flipped duplicate onto the canonical row"""
+    db.execute(
+        text("UPDATE messages SET conversation_id = :keep WHERE conversation_id = :drop"),
+        {"keep": keep["id"], "drop": drop["id"]},
+    )
+    # drop is flipped, so its user2 is keep's user1 and vice versa
+    keep["user1_last_read_id"] = max(
+        keep["user1_last_read_id"] or 0, drop["user2_last_read_id"] or 0
+    )
+    keep["user2_last_read_id"] = max(
+        keep["user2_last_read_id"] or 0, drop["user1_last_read_id"] or 0
+    )
+    db.execute(text("DELETE FROM conversations WHERE id = :id"), {"id": drop["id"]})
+    db.execute(
+        text(
+            """
+        UPDATE conversations
+        SET user1_last_read_id = :user1_last_read_id,
+            user2_last_read_id = :user2_last_read_id,
+            updated_at = CASE WHEN updated_at < :drop_updated THEN :drop_updated ELSE updated_at END
+        WHERE id = :id
+    """
+        ),
+        {**keep, "drop_updated": drop["updated_at"]},
+    )
+    # Summary and unread counters now span both rows' messages
+    backfill_batch(db, [keep])
+
+
+def flip(db, conv):
+    """Swap participants (and their per-participant columns) in place"""
+    db.execute(
+        text(
+            """
+        UPDATE conversations
+        SET user1_id = :user2_id, user2_id = :user1_id,
+            user1_unread_count = :user2_unread_count,
+            user2_unread_count = :user1_unread_count,
+            user1_last_read_id = :user2_last_read_id,
+            user2_last_read_id = :user1_last_read_id
+        WHERE id = :id
+    """
+        ),
+        conv,
+    )
+
+
+def canonicalize(batch_size=500):
+    db = get_db()
+    last_id = 0
+    flipped = merged = 0
+    columns = """
+        id, user1_id, user2_id, updated_at, user1_unread_count, user2_unread_count,
+        user1_last_read_id, user2_last_read_id
+    """
+    try:
+        while True:
+            result = db.execute(
+                text(
+                    f"""
+                SELECT {columns} FROM conversations
+                WHERE user1_id > user2_id AND id > :last_id
+                ORDER BY id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            rows = [dict(row._mapping) for row in result]
+            if not rows:
+                break
+
+            for conv in rows:
+                result = db.execute(
+                    text(
+                        f"""
+                    SELECT {columns} FROM conversations
+                    WHERE user1_id = :user2_id AND user2_id = :user1_id
+                """
+                    ),
+                    conv,
+                )
+                canonical = result.fetchone()
+                if canonical:
+                    merge_into(db, dict(canonical._mapping), conv)
+                    merged += 1
+                else:
+                    flip(db, conv)
+                    flipped += 1
+
+            db.commit()
+            last_id = rows[-1]["id"]
+            print(f"Processed up to conversation {last_id}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Flipped {flipped} conversations, merged {merged} duplicates")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        canonicalize(args.batch_size)
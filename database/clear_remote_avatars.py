@@ -0,0 +1,79 @@
+"""
+Clear the ui-avatars.com URLs stored as profile pictures.
+
+Users were given those before initials avatars were served locally
+(routes/media.py). Cleared, they get the local initials avatar. Run it
+once after upgrading; running it again only picks up what is left, e.g.
+rows restored from an old backup.
+
+Usage: python database/clear_remote_avatars.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db, build_in_clause
+
+REMOTE_AVATAR_PATTERN = "https://ui-avatars.com/%"
+
+
+def clear(batch_size=500):
+    db = get_db()
+    last_id = 0
+    cleared = 0
+    try:
+        while True:
+            ids = [
+                row[0]
+                for row in db.execute(
+                    text(
+                        """
+                    SELECT id FROM users
+                    WHERE id > :last_id AND profile_picture LIKE :pattern
+                    ORDER BY id LIMIT :limit
+                """
+                    ),
+                    {"last_id": last_id, "pattern": REMOTE_AVATAR_PATTERN, "limit": batch_size},
+                )
+            ]
+            if not ids:
+                break
+
+            placeholders, params = build_in_clause("u", ids)
+            result = db.execute(
+                text(
+                    f"""
+                UPDATE users SET profile_picture = NULL
+                WHERE id IN ({placeholders}) AND profile_picture LIKE :pattern
+            """
+                ),
+                {**params, "pattern": REMOTE_AVATAR_PATTERN},
+            )
+            db.commit()
+            cleared += result.rowcount
+            last_id = ids[-1]
+            print(f"Cleared pictures up to user {last_id} ({cleared} so far)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Cleared {cleared} ui-avatars.com profile pictures")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        clear(args.batch_size)
@@ -0,0 +1,133 @@
+"""
+Delete stored avatars that no user shows any more.
+
+Reference counts are first recounted from users.profile_picture, which
+fixes drift from concurrent profile edits. Then the files of avatars
+released more than --grace-hours ago are deleted, so pages rendered just
+before a change keep their pictures. Files with no avatars row are
+deleted too, such as uploads whose profile update failed, once they are
+older than the grace period.
+
+Each avatar is claimed (ref_count -1) before its files go, and they are
+moved aside until the row is deleted, so a user picking the same picture
+meanwhile revives the row and keeps the files (see utils/image_pipeline.py).
+
+Usage: python database/collect_avatars.py [--grace-hours 24] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from extensions import image_pipeline
+from utils.image_pipeline import recount_avatars
+
+
+def collect(grace_hours=24, dry_run=False):
+    db = get_db()
+    released = freed = orphans = 0
+    try:
+        drifted = recount_avatars(db)
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+        print(f"Recounted avatar references ({drifted} drifted)")
+
+        # Naive UTC, like CURRENT_TIMESTAMP values
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=grace_hours)
+        keys = [
+            row[0]
+            for row in db.execute(
+                text(
+                    "SELECT avatar_key FROM avatars "
+                    "WHERE ref_count = 0 AND released_at < :cutoff"
+                ),
+                {"cutoff": cutoff},
+            )
+        ]
+        for key in keys:
+            if dry_run:
+                released += 1
+                continue
+            # Only if nobody picked the same picture again meanwhile
+            result = db.execute(
+                text(
+                    "UPDATE avatars SET ref_count = -1 "
+                    "WHERE avatar_key = :key AND ref_count = 0"
+                ),
+                {"key": key},
+            )
+            db.commit()
+            if not result.rowcount:
+                continue
+            moved = image_pipeline.set_aside(key)
+            result = db.execute(
+                text("DELETE FROM avatars WHERE avatar_key = :key AND ref_count = -1"),
+                {"key": key},
+            )
+            db.commit()
+            if result.rowcount:
+                released += 1
+                freed += image_pipeline.discard(moved)
+            else:
+                image_pipeline.put_back(moved)  # revived by acquire_avatar
+
+        known = {row[0] for row in db.execute(text("SELECT avatar_key FROM avatars"))}
+        oldest = time.time() - grace_hours * 3600
+        stale = {}
+        for key, path, mtime in image_pipeline.stored_files():
+            if (key is None or key not in known) and mtime < oldest:
+                orphans += 1
+                if key is None or os.path.basename(path) == key:
+                    # Partial writes and abandoned uploads nothing renders from
+                    if not dry_run:
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+                else:
+                    stale.setdefault(key, []).append(path)
+
+        for key in stale:
+            if dry_run:
+                continue
+            # As above, in case an upload of the same picture came in since
+            moved = image_pipeline.set_aside(key)
+            db.rollback()  # a snapshot taken after the move
+            revived = db.execute(
+                text("SELECT 1 FROM avatars WHERE avatar_key = :key"), {"key": key}
+            ).first()
+            if revived:
+                image_pipeline.put_back(moved)
+            else:
+                freed += image_pipeline.discard(moved)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    action = "Would delete" if dry_run else "Deleted"
+    print(
+        f"[OK] {action} {released} released avatars and {orphans} orphaned files "
+        f"({freed / 1024:.0f} KiB freed)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--grace-hours", type=float, default=24)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would go")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        collect(args.grace_hours, args.dry_run)
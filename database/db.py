@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine, text
+from flask import current_app
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import scoped_session, sessionmaker
 
 # Database Configuration
@@ -50,7 +51,111 @@ def get_db():
     return connection
 
 
-def _get_db_dialect():
+# Columns added to tables after they first shipped. CREATE TABLE IF NOT EXISTS
+# leaves existing tables alone, so init_db adds whichever of these are missing.
+COLUMN_MIGRATIONS = [
+    ("skills", "aliases", "VARCHAR(255)"),
+    ("skills", "parent_id", "INTEGER"),
+    ("users", "last_active_at", "TIMESTAMP"),
+    ("users", "skills_updated_at", "TIMESTAMP"),
+    ("users", "scores_stale_at", "TIMESTAMP"),
+    ("users", "latitude", "REAL"),
+    ("users", "longitude", "REAL"),
+    ("users", "geohash", "VARCHAR(12)"),
+    ("users", "availability_slots", "VARCHAR(42)"),
+    ("users", "utc_offset", "INTEGER"),
+    ("swap_requests", "ring_id", "INTEGER"),
+    ("swap_ring_members", "accepted_at", "TIMESTAMP"),
+    ("swap_ring_members", "note", "TEXT"),
+    ("conversations", "last_message_id", "INTEGER"),
+    ("conversations", "last_message_preview", "TEXT"),
+    ("conversations", "last_message_at", "TIMESTAMP"),
+    ("conversations", "user1_unread_count", "INTEGER DEFAULT 0"),
+    ("conversations", "user2_unread_count", "INTEGER DEFAULT 0"),
+    ("conversations", "user1_last_read_id", "INTEGER DEFAULT 0"),
+    ("conversations", "user2_last_read_id", "INTEGER DEFAULT 0"),
+]
+
+# Columns whose type was widened after they first shipped, as (table,
+# column, type). Only PostgreSQL needs this: there REAL is 4 bytes, while
+# SQLite and MySQL store it as a double already.
+COLUMN_TYPE_MIGRATIONS = [
+    ("skill_stats", "trending_score", "DOUBLE PRECISION"),
+]
+
+
+# Full-text indexes, created per dialect because schema.sql only holds
+# portable DDL. Rows are written by the application (not triggers) since
+# the indexed text is plaintext while the base column may be encrypted.
+# SQLite's FTS5 table is contentless: it keeps the token index, not the text.
+# MySQL's FULLTEXT key needs the text itself, so with ENCRYPT_MESSAGES on
+# messages aren't indexed there at all (see message_search_available).
+SEARCH_INDEXES = {
+    "message_search": {
+        "sqlite": [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+                body, members, content='', tokenize='unicode61 remove_diacritics 2'
+            )""",
+        ],
+        "postgresql": [
+            """CREATE TABLE IF NOT EXISTS message_search (
+                message_id INTEGER PRIMARY KEY REFERENCES messages(id) ON DELETE CASCADE,
+                conversation_id INTEGER NOT NULL,
+                body TSVECTOR NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_message_search_body ON message_search USING GIN (body)",
+            "CREATE INDEX IF NOT EXISTS idx_message_search_conversation ON message_search(conversation_id)",
+        ],
+        "mysql": [
+            """CREATE TABLE IF NOT EXISTS message_search (
+                message_id INT PRIMARY KEY,
+                conversation_id INT NOT NULL,
+                body TEXT NOT NULL,
+                FULLTEXT KEY idx_message_search_body (body),
+                KEY idx_message_search_conversation (conversation_id),
+                FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""",
+        ],
+    },
+    # People search over name, bio and location (utils/people_search.py)
+    "people_search": {
+        "sqlite": [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS people_search USING fts5(
+                full_name, bio, location,
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3'
+            )""",
+        ],
+        "postgresql": [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            """CREATE TABLE IF NOT EXISTS people_search (
+                user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+                full_name TEXT NOT NULL,
+                location TEXT NOT NULL,
+                document TEXT NOT NULL
+            )""",
+            "CREATE INDEX IF NOT EXISTS idx_people_search_document ON people_search USING GIN (document gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS idx_people_search_location ON people_search USING GIN (location gin_trgm_ops)",
+        ],
+        "mysql": [
+            """CREATE TABLE IF NOT EXISTS people_search (
+                user_id INT PRIMARY KEY,
+                full_name VARCHAR(255) NOT NULL,
+                bio TEXT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                FULLTEXT KEY idx_people_search_all (full_name, bio, location),
+                FULLTEXT KEY idx_people_search_name (full_name),
+                FULLTEXT KEY idx_people_search_location (location),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""",
+        ],
+    },
+}
+
+# Search indexes that exist in this database, filled in by init_db
+_available_search_indexes = set()
+
+
+def get_db_dialect():
     """Determine the database dialect from DATABASE_URL"""
     if "postgresql" in DATABASE_URL:
         return "postgresql"
@@ -91,6 +196,185 @@ def _convert_statement_to_dialect(statement, dialect):
     return stmt
 
 
+def insert_returning_id(conn, statement, params):
+    """Execute an INSERT and return the new row's primary key"""
+    if get_db_dialect() == "postgresql":
+        return conn.execute(text(f"{statement} RETURNING id"), params).scalar()
+    return conn.execute(text(statement), params).lastrowid
+
+
+def build_in_clause(prefix, values):
+    """
+    Build named placeholders for an IN (...) clause.
+
+    Returns (":prefix0, :prefix1, ...", {"prefix0": v0, ...}).
+    """
+    params = {f"{prefix}{i}": value for i, value in enumerate(values)}
+    return ", ".join(f":{name}" for name in params), params
+
+
+def fulltext_available(name):
+    """Whether the SEARCH_INDEXES entry `name` was created by init_db"""
+    return name in _available_search_indexes
+
+
+def message_search_available():
+    """
+    Whether messages are indexed for search. Not on MySQL while
+    ENCRYPT_MESSAGES is on: its message_search table would hold the
+    plaintext of every encrypted message. SQLite and PostgreSQL keep
+    normalized terms only.
+    """
+    if not fulltext_available("message_search"):
+        return False
+    return not (get_db_dialect() == "mysql" and current_app.config.get("ENCRYPT_MESSAGES"))
+
+
+def index_message(conn, message_id, conversation_id, user1_id, user2_id, body):
+    """
+    Add a message's plaintext to the message_search index. On SQLite the
+    participants are indexed alongside as "u<id>" tokens so a search can be
+    scoped to one user's conversations inside the index itself.
+    """
+    dialect = get_db_dialect()
+    if dialect == "sqlite":
+        conn.execute(
+            text(
+                "INSERT INTO message_search (rowid, body, members) VALUES (:id, :body, :members)"
+            ),
+            {"id": message_id, "body": body, "members": f"u{user1_id} u{user2_id}"},
+        )
+        return
+
+    # PostgreSQL stores lexemes, MySQL the text under its FULLTEXT key
+    value = "to_tsvector('simple', :body)" if dialect == "postgresql" else ":body"
+    conn.execute(
+        text(
+            f"""
+        INSERT INTO message_search (message_id, conversation_id, body)
+        VALUES (:id, :conv_id, {value})
+    """
+        ),
+        {"id": message_id, "conv_id": conversation_id, "body": body},
+    )
+
+
+def index_person(conn, user_id, full_name, bio, location):
+    """(Re)index a user's name, bio and location in people_search"""
+    dialect = get_db_dialect()
+    params = {
+        "id": user_id,
+        "full_name": full_name or "",
+        "bio": bio or "",
+        "location": location or "",
+    }
+
+    if dialect == "sqlite":
+        conn.execute(text("DELETE FROM people_search WHERE rowid = :id"), params)
+        conn.execute(
+            text(
+                """
+            INSERT INTO people_search (rowid, full_name, bio, location)
+            VALUES (:id, :full_name, :bio, :location)
+        """
+            ),
+            params,
+        )
+        return
+
+    conn.execute(text("DELETE FROM people_search WHERE user_id = :id"), params)
+    if dialect == "postgresql":
+        conn.execute(
+            text(
+                """
+            INSERT INTO people_search (user_id, full_name, location, document)
+            VALUES (:id, :full_name, :location, :full_name || ' ' || :location || ' ' || :bio)
+        """
+            ),
+            params,
+        )
+    else:
+        conn.execute(
+            text(
+                """
+            INSERT INTO people_search (user_id, full_name, bio, location)
+            VALUES (:id, :full_name, :bio, :location)
+        """
+            ),
+            params,
+        )
+
+
+def _create_search_indexes(conn, dialect):
+    """
+    Create the SEARCH_INDEXES for this dialect. A database without full-text
+    support (e.g. SQLite built without FTS5) just leaves them unavailable.
+    Returns the names of the indexes newly created.
+    """
+    existing_tables = set(inspect(conn).get_table_names())
+    created = []
+
+    for name, statements in SEARCH_INDEXES.items():
+        if name in existing_tables:
+            _available_search_indexes.add(name)
+            continue
+
+        savepoint = conn.begin_nested()
+        try:
+            for statement in statements.get(dialect, ()):
+                conn.execute(text(statement))
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            print(f"Warning: full-text index {name} unavailable -> {e}")
+            continue
+
+        _available_search_indexes.add(name)
+        created.append(name)
+        print(f"[OK] Created full-text index {name}")
+
+    return created
+
+
+def _apply_column_migrations(conn, dialect):
+    """Add columns from COLUMN_MIGRATIONS that existing tables are missing"""
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+    columns = {}
+
+    for table, column, definition in COLUMN_MIGRATIONS:
+        if table not in existing_tables:
+            continue  # created with the column by schema.sql
+        if table not in columns:
+            columns[table] = {c["name"] for c in inspector.get_columns(table)}
+        if column in columns[table]:
+            continue
+
+        statement = _convert_statement_to_dialect(
+            f"ALTER TABLE {table} ADD COLUMN {column} {definition}", dialect
+        )
+        conn.execute(text(statement))
+        columns[table].add(column)
+        print(f"[OK] Added column {table}.{column}")
+
+
+def _apply_column_type_migrations(conn, dialect):
+    """Widen PostgreSQL REAL columns listed in COLUMN_TYPE_MIGRATIONS"""
+    if dialect != "postgresql":
+        return
+    inspector = inspect(conn)
+    existing_tables = set(inspector.get_table_names())
+
+    for table, column, definition in COLUMN_TYPE_MIGRATIONS:
+        if table not in existing_tables:
+            continue
+        types = {c["name"]: c["type"] for c in inspector.get_columns(table)}
+        if column not in types or str(types[column]).upper() != "REAL":
+            continue
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {definition}"))
+        print(f"[OK] Changed column {table}.{column} to {definition}")
+
+
 def init_db():
     """Initialize the database with schema"""
     import logging
@@ -104,7 +388,7 @@ def init_db():
         print(f"Schema file not found at: {SCHEMA_PATH}")
         return
 
-    db_type = _get_db_dialect()
+    db_type = get_db_dialect()
     print(f"Initializing {db_type} database...")
 
     try:
@@ -117,15 +401,28 @@ def init_db():
 
                 trans = conn.begin()
                 try:
+                    # Before schema.sql so its indexes can use the new columns
+                    _apply_column_migrations(conn, db_type)
+                    _apply_column_type_migrations(conn, db_type)
+
                     for statement in statements:
                         # Convert statement to target dialect
                         converted_stmt = _convert_statement_to_dialect(
                             statement, db_type
                         )
 
+                        # A failed statement aborts the whole transaction on
+                        # PostgreSQL, so isolate each one in a savepoint there
+                        savepoint = (
+                            conn.begin_nested() if db_type == "postgresql" else None
+                        )
                         try:
                             conn.execute(text(converted_stmt))
+                            if savepoint:
+                                savepoint.commit()
                         except Exception as stmt_error:
+                            if savepoint:
+                                savepoint.rollback()
                             # Log but continue - some statements might fail on existing tables
                             error_msg = str(stmt_error)
                             # Ignore table already exists errors
@@ -137,8 +434,17 @@ def init_db():
                                     f"Warning executing: {converted_stmt[:60]}... -> {error_msg}"
                                 )
 
+                    created_indexes = _create_search_indexes(conn, db_type)
+
                     trans.commit()
                     print("[OK] Database initialized successfully!")
+
+                    if created_indexes:
+                        print(
+                            "New full-text indexes start empty, run "
+                            "database/rebuild_search_index.py to index existing rows: "
+                            + ", ".join(created_indexes)
+                        )
                 except Exception as trans_error:
                     trans.rollback()
                     raise trans_error
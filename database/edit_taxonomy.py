@@ -0,0 +1,95 @@
+"""
+Show or edit the skill taxonomy (parents of skills and their closure rows).
+
+Skills are named by id or exact name. Moving a skill moves everything
+under it; the API picks the change up with the next catalog check.
+
+Usage: python database/edit_taxonomy.py [--show]
+       python database/edit_taxonomy.py --parent "Web Development" --child JavaScript
+       python database/edit_taxonomy.py --detach JavaScript
+       python database/edit_taxonomy.py --rebuild
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.skill_taxonomy import rebuild_closure, set_parent
+
+
+def _skill_id(db, value):
+    if value.isdigit():
+        row = db.execute(text("SELECT id FROM skills WHERE id = :id"), {"id": int(value)}).fetchone()
+    else:
+        row = db.execute(text("SELECT id FROM skills WHERE name = :name"), {"name": value}).fetchone()
+    if row is None:
+        raise SystemExit(f"[ERROR] No skill {value!r}")
+    return row[0]
+
+
+def show(db):
+    rows = db.execute(text("SELECT id, name, parent_id FROM skills ORDER BY name")).fetchall()
+    children = {}
+    for skill_id, name, parent_id in rows:
+        children.setdefault(parent_id, []).append((skill_id, name))
+
+    def walk(parent_id, depth):
+        for skill_id, name in children.get(parent_id, []):
+            print(f"{'  ' * depth}{name} ({skill_id})")
+            walk(skill_id, depth + 1)
+
+    # Only skills that are part of the taxonomy
+    for skill_id, name in children.get(None, []):
+        if skill_id in children:
+            print(f"{name} ({skill_id})")
+            walk(skill_id, 1)
+
+
+def main(args):
+    db = get_db()
+    try:
+        if args.rebuild:
+            count = rebuild_closure(db)
+            db.commit()
+            print(f"[OK] Rebuilt skill_closure: {count} rows")
+        elif args.detach:
+            set_parent(db, _skill_id(db, args.detach), None)
+            db.commit()
+            print(f"[OK] {args.detach} is now a top-level skill")
+        elif args.parent or args.child:
+            if not (args.parent and args.child):
+                raise SystemExit("[ERROR] --parent and --child go together")
+            try:
+                set_parent(db, _skill_id(db, args.child), _skill_id(db, args.parent))
+            except ValueError as e:
+                raise SystemExit(f"[ERROR] {e}")
+            db.commit()
+            print(f"[OK] {args.child} is now under {args.parent}")
+        else:
+            show(db)
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--show", action="store_true", help="print the taxonomy (default)")
+    parser.add_argument("--parent", help="skill to move --child under")
+    parser.add_argument("--child", help="skill to move")
+    parser.add_argument("--detach", help="skill to make top-level")
+    parser.add_argument("--rebuild", action="store_true", help="recompute skill_closure from parent_id")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        main(args)
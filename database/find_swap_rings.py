@@ -0,0 +1,313 @@
+"""
+Find multi-party swap rings: A teaches B, B teaches C, ... and the last
+member teaches A.
+
+The teach/learn graph has an edge u -> v when u teaches a skill v wants to
+learn. Rings are cycles of length 2 to MAX_RING_SIZE. Each ring is searched
+for from its smallest member id only, so every ring is found exactly once
+and start ids can be split across a process pool with no coordination.
+
+The search is bounded: each hop expands at most MAX_BRANCH neighbours (the
+lowest ids above the start), length 4 meets in the middle (two hops out
+from the start, one hop back from it), and each start stops after
+MAX_RINGS_PER_START rings, shortest first. Across starts, each user keeps
+at most MAX_RINGS_PER_USER rings.
+
+Rings are stored in swap_rings / swap_ring_members with status 'proposed'.
+Each run replaces the proposed rings. Rings already turned into swap
+requests (see routes/requests.py), or accepted by any member so far, are
+kept and not proposed again.
+
+Usage:
+    python database/find_swap_rings.py [--workers 4] [--chunk-size 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+MAX_RING_SIZE = 4
+MAX_BRANCH = 25
+MAX_RINGS_PER_START = 5
+MAX_RINGS_PER_USER = 5
+DELETE_BATCH_SIZE = 500
+
+
+class SkillGraph:
+    """
+    The teach/learn graph, kept as skill-indexed sorted tuples: neighbours
+    are merged from per-skill lists, so no per-user adjacency is built.
+    """
+
+    def __init__(self, rows):
+        """rows are (user_id, skill_id, is_teaching, is_learning)"""
+        teaches = defaultdict(set)
+        learns = defaultdict(set)
+        teachers = defaultdict(set)
+        learners = defaultdict(set)
+        for user_id, skill_id, is_teaching, is_learning in rows:
+            if is_teaching:
+                teaches[user_id].add(skill_id)
+                teachers[skill_id].add(user_id)
+            if is_learning:
+                learns[user_id].add(skill_id)
+                learners[skill_id].add(user_id)
+
+        # Only users who both teach and learn can be in a ring
+        members = teaches.keys() & learns.keys()
+        self.teaches = {u: frozenset(teaches[u]) for u in members}
+        self.learns = {u: frozenset(learns[u]) for u in members}
+        self.teachers = {s: tuple(sorted(u & members)) for s, u in teachers.items()}
+        self.learners = {s: tuple(sorted(u & members)) for s, u in learners.items()}
+
+    def candidates(self):
+        """Users who both teach and learn"""
+        return sorted(self.teaches)
+
+    def can_teach(self, teacher_id, learner_id):
+        return not self.teaches[teacher_id].isdisjoint(self.learns[learner_id])
+
+    def has_teacher_above(self, user_id, above):
+        """Whether anyone with an id above `above` teaches something user_id learns"""
+        return any(
+            (self.teachers.get(skill_id) or (0,))[-1] > above
+            for skill_id in self.learns.get(user_id, ())
+        )
+
+    def out_neighbours(self, user_id, above, limit):
+        """The `limit` lowest ids above `above` that user_id can teach"""
+        found = set()
+        for skill_id in self.teaches.get(user_id, ()):
+            learners = self.learners.get(skill_id, ())
+            i = bisect_right(learners, above)
+            found.update(learners[i : i + limit + 1])
+        found.discard(user_id)
+        return sorted(found)[:limit]
+
+    def in_neighbours(self, user_id, above, limit):
+        """The `limit` lowest ids above `above` that can teach user_id"""
+        found = set()
+        for skill_id in self.learns.get(user_id, ()):
+            teachers = self.teachers.get(skill_id, ())
+            i = bisect_right(teachers, above)
+            found.update(teachers[i : i + limit + 1])
+        found.discard(user_id)
+        return sorted(found)[:limit]
+
+    def edge_skill(self, teacher_id, learner_id):
+        """A skill teacher_id teaches and learner_id wants (lowest id)"""
+        return min(self.teaches[teacher_id] & self.learns[learner_id])
+
+
+def rings_from(graph, start):
+    """Rings whose smallest member is `start`, shortest first"""
+    if not graph.has_teacher_above(start, start):
+        return []
+
+    rings = []
+    first_hops = graph.out_neighbours(start, start, MAX_BRANCH)
+
+    # Length 2: direct reciprocal partners
+    for a in first_hops:
+        if graph.can_teach(a, start):
+            rings.append((start, a))
+            if len(rings) >= MAX_RINGS_PER_START:
+                return rings
+
+    # Length 3: start -> a -> b -> start
+    second_hops = {a: graph.out_neighbours(a, start, MAX_BRANCH) for a in first_hops}
+    wanted = graph.learns[start]
+    closing = {
+        b
+        for hops in second_hops.values()
+        for b in hops
+        if not graph.teaches[b].isdisjoint(wanted)
+    }
+    for a in first_hops:
+        for b in second_hops[a]:
+            if b in closing:
+                rings.append((start, a, b))
+                if len(rings) >= MAX_RINGS_PER_START:
+                    return rings
+
+    if MAX_RING_SIZE < 4:
+        return rings
+
+    # Length 4: start -> a -> b -> c -> start, meeting in the middle. b
+    # comes from two hops forward, c from one hop back from the start.
+    before_last = defaultdict(list)
+    for c in graph.in_neighbours(start, start, MAX_BRANCH):
+        for b in graph.in_neighbours(c, start, MAX_BRANCH):
+            before_last[b].append(c)
+    for a in first_hops:
+        for b in second_hops[a]:
+            for c in before_last.get(b, ()):
+                if c != a:
+                    rings.append((start, a, b, c))
+                    if len(rings) >= MAX_RINGS_PER_START:
+                        return rings
+
+    return rings
+
+
+# Per-process graph, set up once by _init_worker
+_graph = None
+
+
+def _init_worker(rows):
+    global _graph
+    _graph = SkillGraph(rows)
+
+
+def _search_chunk(starts):
+    found = []
+    for start in starts:
+        for ring in rings_from(_graph, start):
+            skills = [
+                _graph.edge_skill(ring[i], ring[(i + 1) % len(ring)])
+                for i in range(len(ring))
+            ]
+            found.append((ring, skills))
+    return found
+
+
+def find_rings(rows, workers=1, chunk_size=2000):
+    """
+    All bounded rings of the graph built from user_skills rows, as
+    [(member ids, skill ids)] where member i teaches skill i to member i + 1.
+    """
+    graph = SkillGraph(rows)
+    starts = graph.candidates()
+    chunks = [starts[i : i + chunk_size] for i in range(0, len(starts), chunk_size)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(rows,)
+        ) as pool:
+            results = list(pool.map(_search_chunk, chunks))
+    else:
+        global _graph
+        _graph = graph
+        results = [_search_chunk(chunk) for chunk in chunks]
+
+    # Shortest rings first, then cap how many rings any one user is offered
+    rings = sorted((r for chunk in results for r in chunk), key=lambda r: len(r[0]))
+    per_user = defaultdict(int)
+    selected = []
+    for members, skills in rings:
+        if any(per_user[u] >= MAX_RINGS_PER_USER for u in members):
+            continue
+        for u in members:
+            per_user[u] += 1
+        selected.append((members, skills))
+    return selected
+
+
+def ring_key(members):
+    """Identity of a ring, independent of which member it is listed from"""
+    return "-".join(str(u) for u in members)
+
+
+def store_rings(db, rings):
+    """Replace the proposed rings, skipping ones already requested or accepted"""
+    from database.db import build_in_clause, insert_returning_id
+
+    # Rings a member has accepted wait for the others. Ids are fetched
+    # first since MySQL can't DELETE from a table it selects from.
+    stale = [
+        row[0]
+        for row in db.execute(
+            text(
+                """
+            SELECT id FROM swap_rings r
+            WHERE r.status = 'proposed' AND NOT EXISTS (
+                SELECT 1 FROM swap_ring_members m
+                WHERE m.ring_id = r.id AND m.accepted_at IS NOT NULL
+            )
+        """
+            )
+        )
+    ]
+    for start in range(0, len(stale), DELETE_BATCH_SIZE):
+        placeholders, params = build_in_clause("r", stale[start : start + DELETE_BATCH_SIZE])
+        db.execute(
+            text(f"DELETE FROM swap_ring_members WHERE ring_id IN ({placeholders})"), params
+        )
+        db.execute(text(f"DELETE FROM swap_rings WHERE id IN ({placeholders})"), params)
+    taken = {row[0] for row in db.execute(text("SELECT ring_key FROM swap_rings"))}
+
+    stored = 0
+    for members, skills in rings:
+        key = ring_key(members)
+        if key in taken:
+            continue
+        ring_id = insert_returning_id(
+            db,
+            "INSERT INTO swap_rings (ring_key, size, status) VALUES (:key, :size, 'proposed')",
+            {"key": key, "size": len(members)},
+        )
+        db.execute(
+            text(
+                """
+            INSERT INTO swap_ring_members (ring_id, ordinal, user_id, skill_id)
+            VALUES (:ring_id, :ordinal, :user_id, :skill_id)
+        """
+            ),
+            [
+                {"ring_id": ring_id, "ordinal": i, "user_id": u, "skill_id": s}
+                for i, (u, s) in enumerate(zip(members, skills))
+            ],
+        )
+        stored += 1
+    return stored
+
+
+def run(workers=1, chunk_size=2000):
+    from database.db import get_db
+
+    started = time.time()
+    db = get_db()
+    try:
+        rows = [
+            tuple(row)
+            for row in db.execute(
+                text("SELECT user_id, skill_id, is_teaching, is_learning FROM user_skills")
+            )
+        ]
+        db.commit()
+        print(f"Loaded {len(rows)} user skills in {time.time() - started:.1f}s")
+
+        rings = find_rings(rows, workers, chunk_size)
+        print(f"Found {len(rings)} rings in {time.time() - started:.1f}s")
+
+        stored = store_rings(db, rings)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Stored {stored} proposed swap rings in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        run(args.workers, args.chunk_size)
@@ -0,0 +1,488 @@
+"""
+Bulk-load a deterministic synthetic dataset for load testing.
+
+Generates users (names, bios, gazetteer locations and weekly
+availability), extra skills, user_skills with Zipf-skewed skill
+popularity, swap requests, reviews of completed swaps, and conversations
+with messages. Rows are written with executemany in batches, using
+explicit ids after the current maximum, so the same --seed always
+produces the same data on an empty database. Derived tables (rating and
+skill stats, the full-text indexes) are rebuilt at the end.
+
+Every generated user's password is --password, so benchmarks can log in.
+
+Usage:
+    python database/generate_data.py [--users 1000] [--skills 200] [--seed 42]
+        [--requests-per-user 2] [--batch-size 5000] [--with-scores]
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db, get_db_dialect
+from routes.chat import PREVIEW_LENGTH
+from utils import hash_password
+from utils.availability import HOURS_PER_DAY, SLOT_COUNT, encode_mask
+from utils.encryption import encrypt_message
+from utils.geo import COUNTRY_NAMES, GAZETTEER_PATH, geohash_encode
+from utils.skill_catalog import bump_catalog_version
+
+EMAIL_DOMAIN = "synthetic.example.com"
+
+FIRST_NAMES = [
+    "Aarav", "Aisha", "Alejandro", "Amara", "Anna", "Ben", "Carlos", "Chen",
+    "Chloe", "Daniel", "Elena", "Emma", "Fatima", "Felix", "Grace", "Hana",
+    "Hugo", "Ibrahim", "Isabella", "Ivan", "Jack", "James", "Jin", "Julia",
+    "Kai", "Kofi", "Laura", "Leo", "Liam", "Lucia", "Maria", "Mateo",
+    "Mei", "Mohammed", "Nadia", "Noah", "Olivia", "Omar", "Priya", "Rahul",
+    "Rosa", "Sakura", "Samuel", "Sara", "Sofia", "Tariq", "Thomas", "Yuki",
+    "Zanele", "Zoe",
+]
+LAST_NAMES = [
+    "Adeyemi", "Ahmed", "Andersen", "Bauer", "Brown", "Chen", "Costa",
+    "Da Silva", "Dubois", "Fernandez", "Garcia", "Gupta", "Hansen", "Hernandez",
+    "Ibrahim", "Ito", "Jensen", "Johnson", "Kim", "Kowalski", "Kumar", "Lee",
+    "Lopez", "Martin", "Mensah", "Meyer", "Moreau", "Muller", "Nakamura",
+    "Nguyen", "Novak", "Okafor", "Olsen", "Patel", "Petrov", "Rossi", "Santos",
+    "Schmidt", "Sharma", "Silva", "Singh", "Smith", "Suzuki", "Tanaka",
+    "Taylor", "Wang", "Williams", "Wilson", "Yilmaz", "Zhang",
+]
+BIO_OPENERS = [
+    "Lifelong learner", "Software engineer", "Teacher by day", "Student",
+    "Designer", "Musician", "Retired engineer", "Freelance writer",
+    "Data analyst", "Nurse", "Chef", "Photographer",
+]
+BIO_CLOSERS = [
+    "happy to share what I know.", "looking for a patient teacher.",
+    "keen to swap skills on weekends.", "always up for a coffee chat.",
+    "learning something new every month.", "open to online sessions.",
+]
+SKILL_TOPICS = [
+    ("Programming", ["Rust", "Go", "TypeScript", "SQL", "Kotlin", "Swift", "C++", "Haskell"]),
+    ("Design", ["Figma", "Illustration", "Typography", "3D Modeling", "Animation"]),
+    ("Languages", ["German", "Japanese", "Mandarin", "Portuguese", "Arabic", "Hindi", "Italian"]),
+    ("Music", ["Piano", "Drums", "Violin", "Singing", "Music Theory", "DJing"]),
+    ("Creative", ["Painting", "Pottery", "Knitting", "Calligraphy", "Creative Writing"]),
+    ("Soft Skills", ["Negotiation", "Leadership", "Time Management", "Interviewing"]),
+    ("Lifestyle", ["Cooking", "Baking", "Yoga", "Gardening", "Chess", "Running"]),
+    ("Business", ["Accounting", "Marketing", "Excel", "Investing", "Sales"]),
+]
+LEVELS = ["Beginner", "Intermediate", "Expert"]
+LEVEL_WEIGHTS = [0.35, 0.4, 0.25]
+REQUEST_STATUSES = ["pending", "accepted", "rejected", "completed"]
+REQUEST_STATUS_WEIGHTS = [0.4, 0.25, 0.15, 0.2]
+RATINGS = [1, 2, 3, 4, 5]
+RATING_WEIGHTS = [0.04, 0.06, 0.15, 0.3, 0.45]
+MESSAGE_PHRASES = [
+    "Hi! Are you still up for a swap?", "Sounds great, when works for you?",
+    "How about Saturday morning?", "Thanks for the session today!",
+    "Could we move it to next week?", "I found a good exercise for you.",
+    "Let me know what you'd like to cover next.", "See you then!",
+    "Do you prefer video or in person?", "That was really helpful, thanks.",
+]
+
+# Share of users with no location, and of accepted/completed swaps that chat
+NO_LOCATION_SHARE = 0.1
+CONVERSATION_SHARE = 0.6
+REVIEW_SHARE = 0.8
+
+NOW = datetime(2025, 1, 1)
+
+
+def _timestamp(rng, max_days_ago):
+    moment = NOW - timedelta(seconds=rng.randrange(max_days_ago * 86400))
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _places():
+    """(location text, latitude, longitude, geohash) and population weights"""
+    places, weights = [], []
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            latitude, longitude = float(row["latitude"]), float(row["longitude"])
+            country = COUNTRY_NAMES.get(row["country"], [row["country"]])[0]
+            places.append(
+                (f"{row['name']}, {country}", latitude, longitude, geohash_encode(latitude, longitude))
+            )
+            weights.append(int(row["population"]))
+    return places, list(accumulate(weights))
+
+
+def _availability(rng):
+    """A few recurring weekly blocks, or None for users who never set one"""
+    if rng.random() < 0.3:
+        return None
+    mask = 0
+    for _ in range(rng.randint(1, 4)):
+        start = rng.choice([7, 9, 12, 17, 18, 19, 20])
+        length = rng.randint(1, 3)
+        days = rng.sample(range(7), rng.randint(1, 5))
+        for day in days:
+            for hour in range(start, start + length):
+                mask |= 1 << ((day * HOURS_PER_DAY + hour) % SLOT_COUNT)
+    return encode_mask(mask)
+
+
+class Writer:
+    """
+    Batched executemany inserts. A full batch flushes every table in the
+    order they were first added, parents before children, so foreign keys
+    hold on databases that enforce them.
+    """
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, statement, row):
+        rows = self.pending.setdefault(statement, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        for statement, rows in self.pending.items():
+            if rows:
+                self.db.execute(text(statement), rows)
+                table = statement.split()[2]
+                self.counts[table] = self.counts.get(table, 0) + len(rows)
+                self.pending[statement] = []
+        self.db.commit()
+
+
+def _next_id(db, table):
+    return (db.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0) + 1
+
+
+def _sync_sequences(db, tables):
+    """Explicit ids don't advance PostgreSQL sequences"""
+    if get_db_dialect() != "postgresql":
+        return
+    for table in tables:
+        db.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                f"(SELECT MAX(id) FROM {table}))"
+            )
+        )
+    db.commit()
+
+
+def _ensure_skills(db, writer, rng, count):
+    """Existing skills plus generated ones up to count, in a seeded popularity order"""
+    existing = {row[1]: row[0] for row in db.execute(text("SELECT id, name FROM skills"))}
+    first_id = next_id = _next_id(db, "skills")
+    round_number = 0
+    while len(existing) < count:
+        round_number += 1
+        added = False
+        for category, topics in SKILL_TOPICS:
+            for topic in topics:
+                name = topic if round_number == 1 else f"{topic} {round_number}"
+                if name in existing or len(existing) >= count:
+                    continue
+                writer.add(
+                    "INSERT INTO skills (id, name, category, description) "
+                    "VALUES (:id, :name, :category, :description)",
+                    {
+                        "id": next_id,
+                        "name": name,
+                        "category": category,
+                        "description": f"{name} ({category.lower()})",
+                    },
+                )
+                writer.add(
+                    "INSERT INTO skill_closure (ancestor_id, descendant_id, depth) "
+                    "VALUES (:id, :id, 0)",
+                    {"id": next_id},
+                )
+                existing[name] = next_id
+                next_id += 1
+                added = True
+        if not added:
+            break
+    if next_id > first_id:
+        bump_catalog_version(db)
+    writer.flush()
+
+    skill_ids = sorted(existing.values())
+    rng.shuffle(skill_ids)
+    return skill_ids
+
+
+def generate(
+    users=1000,
+    skills=200,
+    seed=42,
+    requests_per_user=2,
+    batch_size=5000,
+    password="Password123!",
+):
+    rng = random.Random(seed)
+    db = get_db()
+    writer = Writer(db, batch_size)
+    started = time.perf_counter()
+
+    try:
+        clash = db.execute(
+            text("SELECT 1 FROM users WHERE email LIKE :pattern LIMIT 1"),
+            {"pattern": f"%.s{seed}@{EMAIL_DOMAIN}"},
+        ).fetchone()
+        if clash:
+            raise SystemExit(f"Users for seed {seed} already exist, pick another --seed")
+
+        skill_ids = _ensure_skills(db, writer, rng, skills)
+        # Zipf-like popularity: the k-th skill is picked with weight 1/k
+        skill_weights = list(accumulate(1 / rank for rank in range(1, len(skill_ids) + 1)))
+        places, place_weights = _places()
+        password_hash = hash_password(password)
+
+        # Users and their skills
+        first_user = _next_id(db, "users")
+        teachers = {skill_id: array("l") for skill_id in skill_ids}
+        learning = []  # (user_id, skill_id) pairs that can become requests
+        for user_id in range(first_user, first_user + users):
+            place = None
+            if rng.random() >= NO_LOCATION_SHARE:
+                place = rng.choices(places, cum_weights=place_weights)[0]
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            writer.add(
+                """INSERT INTO users (
+                    id, email, password_hash, full_name, bio, location, latitude,
+                    longitude, geohash, availability_slots, utc_offset, created_at,
+                    last_active_at
+                ) VALUES (
+                    :id, :email, :password_hash, :full_name, :bio, :location, :latitude,
+                    :longitude, :geohash, :availability_slots, 0, :created_at,
+                    :last_active_at
+                )""",
+                {
+                    "id": user_id,
+                    "email": f"user{user_id}.s{seed}@{EMAIL_DOMAIN}",
+                    "password_hash": password_hash,
+                    "full_name": name,
+                    "bio": f"{rng.choice(BIO_OPENERS)}, {rng.choice(BIO_CLOSERS)}",
+                    "location": place[0] if place else None,
+                    "latitude": place[1] if place else None,
+                    "longitude": place[2] if place else None,
+                    "geohash": place[3] if place else None,
+                    "availability_slots": _availability(rng),
+                    "created_at": _timestamp(rng, 365),
+                    "last_active_at": _timestamp(rng, 90),
+                },
+            )
+
+            teach = set(rng.choices(skill_ids, cum_weights=skill_weights, k=rng.randint(0, 4)))
+            learn = set(rng.choices(skill_ids, cum_weights=skill_weights, k=rng.randint(1, 4)))
+            learn -= teach
+            for skill_id in sorted(teach | learn):
+                writer.add(
+                    """INSERT INTO user_skills
+                        (user_id, skill_id, proficiency_level, is_teaching, is_learning)
+                    VALUES (:user_id, :skill_id, :level, :teaching, :learning)""",
+                    {
+                        "user_id": user_id,
+                        "skill_id": skill_id,
+                        "level": rng.choices(LEVELS, LEVEL_WEIGHTS)[0],
+                        "teaching": skill_id in teach,
+                        "learning": skill_id in learn,
+                    },
+                )
+                if skill_id in teach:
+                    teachers[skill_id].append(user_id)
+                else:
+                    learning.append((user_id, skill_id))
+        writer.flush()
+        print(f"Users and skills written in {time.perf_counter() - started:.1f}s")
+
+        # Requests, reviews and conversations
+        request_id = _next_id(db, "swap_requests")
+        conversation_id = _next_id(db, "conversations")
+        message_id = _next_id(db, "messages")
+        conversation_pairs = set()
+        for _ in range(min(users * requests_per_user, len(learning) * 3)):
+            learner_id, skill_id = rng.choice(learning)
+            candidates = teachers[skill_id]
+            if not candidates:
+                continue
+            teacher_id = candidates[rng.randrange(len(candidates))]
+            if teacher_id == learner_id:
+                continue
+
+            status = rng.choices(REQUEST_STATUSES, REQUEST_STATUS_WEIGHTS)[0]
+            created_at = _timestamp(rng, 180)
+            writer.add(
+                """INSERT INTO swap_requests
+                    (id, sender_id, receiver_id, skill_id, status, message, created_at)
+                VALUES (:id, :sender_id, :receiver_id, :skill_id, :status, :message, :created_at)""",
+                {
+                    "id": request_id,
+                    "sender_id": learner_id,
+                    "receiver_id": teacher_id,
+                    "skill_id": skill_id,
+                    "status": status,
+                    "message": rng.choice(MESSAGE_PHRASES),
+                    "created_at": created_at,
+                },
+            )
+
+            if status == "completed" and rng.random() < REVIEW_SHARE:
+                writer.add(
+                    """INSERT INTO reviews
+                        (reviewer_id, reviewed_id, request_id, rating, comment, created_at)
+                    VALUES (:reviewer_id, :reviewed_id, :request_id, :rating, :comment, :created_at)""",
+                    {
+                        "reviewer_id": learner_id,
+                        "reviewed_id": teacher_id,
+                        "request_id": request_id,
+                        "rating": rng.choices(RATINGS, RATING_WEIGHTS)[0],
+                        "comment": rng.choice(MESSAGE_PHRASES),
+                        "created_at": created_at,
+                    },
+                )
+            request_id += 1
+
+            pair = (min(learner_id, teacher_id), max(learner_id, teacher_id))
+            if (
+                status in ("accepted", "completed")
+                and pair not in conversation_pairs
+                and rng.random() < CONVERSATION_SHARE
+            ):
+                conversation_pairs.add(pair)
+                message_id = _write_conversation(
+                    writer, rng, conversation_id, pair, message_id
+                )
+                conversation_id += 1
+
+        writer.flush()
+        _sync_sequences(
+            db, ["users", "skills", "swap_requests", "reviews", "conversations", "messages"]
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    counts = ", ".join(f"{count} {table}" for table, count in sorted(writer.counts.items()))
+    print(f"[OK] Generated {counts} in {time.perf_counter() - started:.1f}s")
+
+
+def _write_conversation(writer, rng, conversation_id, pair, message_id):
+    """One conversation with its messages and summary; returns the next message id"""
+    user1_id, user2_id = pair
+    moment = NOW - timedelta(days=rng.randrange(1, 120))
+    messages = []
+    for _ in range(max(1, int(rng.expovariate(1 / 6)))):
+        moment += timedelta(minutes=rng.randrange(1, 600))
+        messages.append(
+            {
+                "id": message_id + len(messages),
+                "conversation_id": conversation_id,
+                "sender_id": rng.choice(pair),
+                "content": rng.choice(MESSAGE_PHRASES),
+                "created_at": moment.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        )
+
+    last = messages[-1]
+    last_read = {user1_id: last["id"], user2_id: last["id"]}
+    unread = {user1_id: 0, user2_id: 0}
+    if rng.random() < 0.3:
+        # The recipient hasn't read the last sender's trailing messages
+        recipient = user2_id if last["sender_id"] == user1_id else user1_id
+        trailing = 0
+        for message in reversed(messages):
+            if message["sender_id"] != last["sender_id"]:
+                break
+            trailing += 1
+        unread[recipient] = trailing
+        last_read[recipient] = last["id"] - trailing
+
+    writer.add(
+        """INSERT INTO conversations (
+            id, user1_id, user2_id, created_at, updated_at, last_message_id,
+            last_message_preview, last_message_at, user1_unread_count, user2_unread_count,
+            user1_last_read_id, user2_last_read_id
+        ) VALUES (
+            :id, :user1_id, :user2_id, :created_at, :updated_at, :last_message_id,
+            :preview, :updated_at, :user1_unread, :user2_unread, :user1_read, :user2_read
+        )""",
+        {
+            "id": conversation_id,
+            "user1_id": user1_id,
+            "user2_id": user2_id,
+            "created_at": (NOW - timedelta(days=120)).strftime("%Y-%m-%d %H:%M:%S"),
+            "updated_at": last["created_at"],
+            "last_message_id": last["id"],
+            "preview": encrypt_message(last["content"][:PREVIEW_LENGTH]),
+            "user1_unread": unread[user1_id],
+            "user2_unread": unread[user2_id],
+            "user1_read": last_read[user1_id],
+            "user2_read": last_read[user2_id],
+        },
+    )
+    for message in messages:
+        message["content"] = encrypt_message(message["content"])
+        writer.add(
+            """INSERT INTO messages (id, conversation_id, sender_id, content, created_at)
+            VALUES (:id, :conversation_id, :sender_id, :content, :created_at)""",
+            message,
+        )
+    return message_id + len(messages)
+
+
+def rebuild_derived(batch_size, with_scores=False):
+    """Rating and skill stats, full-text indexes (and recommendation scores) for the new rows"""
+    from database import rebuild_rating_stats, rebuild_search_index, rebuild_skill_stats
+
+    rebuild_rating_stats.rebuild(batch_size)
+    rebuild_skill_stats.rebuild(batch_size)
+    rebuild_search_index.rebuild(batch_size)
+    if with_scores:
+        from database import rebuild_recommendation_scores
+
+        rebuild_recommendation_scores.rebuild(batch_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--skills", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests-per-user", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--password", default="Password123!")
+    parser.add_argument(
+        "--with-scores",
+        action="store_true",
+        help="also rebuild recommendation scores (slow on large datasets)",
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        generate(
+            args.users,
+            args.skills,
+            args.seed,
+            args.requests_per_user,
+            args.batch_size,
+            args.password,
+        )
+        rebuild_derived(args.batch_size, args.with_scores)
@@ -0,0 +1,84 @@
+"""
+Resolve users.location to latitude, longitude and geohash.
+
+The profile update geocodes new locations, so this is only needed once
+after upgrading (for existing users) or with --all after the gazetteer
+(database/gazetteer.csv) changed.
+
+Usage: python database/geocode_users.py [--all] [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.geo import location_columns
+
+
+def geocode(everyone=False, batch_size=500):
+    db = get_db()
+    last_id = 0
+    scanned = resolved = 0
+    condition = "" if everyone else "AND geohash IS NULL"
+    try:
+        while True:
+            result = db.execute(
+                text(
+                    f"""
+                SELECT id, location FROM users
+                WHERE id > :last_id AND location IS NOT NULL AND location <> '' {condition}
+                ORDER BY id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            rows = result.fetchall()
+            if not rows:
+                break
+
+            for user_id, location in rows:
+                columns = location_columns(location)
+                db.execute(
+                    text(
+                        """
+                    UPDATE users SET latitude = :latitude, longitude = :longitude,
+                        geohash = :geohash
+                    WHERE id = :id
+                """
+                    ),
+                    {**columns, "id": user_id},
+                )
+                if columns["geohash"]:
+                    resolved += 1
+
+            db.commit()
+            scanned += len(rows)
+            last_id = rows[-1][0]
+            print(f"Geocoded up to user {last_id} ({resolved}/{scanned} resolved)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Resolved {resolved} of {scanned} user locations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--all", action="store_true", help="re-resolve users that already have coordinates"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        geocode(args.all, args.batch_size)
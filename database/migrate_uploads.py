@@ -0,0 +1,158 @@
+"""
+Move profile pictures to content-addressed avatar storage.
+
+Every local picture a user points at is hashed and rendered into
+variants, unless the same content is already stored, and the user is
+pointed at its /media/avatars/<key> URL. That covers files under
+UPLOAD_FOLDER (static/uploads). Reference counts are recounted afterwards. Files under
+UPLOAD_FOLDER left unreferenced, such as the original uploads that
+still carry EXIF data, are listed, and deleted with --remove-originals.
+Running it again only picks up what is left.
+
+Usage: python database/migrate_uploads.py [--batch-size 200] [--remove-originals]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import current_app
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from extensions import image_pipeline
+from utils.image_pipeline import avatar_key, inspect_upload, recount_avatars
+from utils.profile_helper import AVATAR_URL_PREFIX
+
+
+def _upload_folder():
+    return os.path.abspath(
+        os.path.join(current_app.root_path, current_app.config.get("UPLOAD_FOLDER", "static/uploads"))
+    )
+
+
+def source_path(profile_picture):
+    """The local file behind a stored profile_picture still to migrate, or None"""
+    if avatar_key(profile_picture):
+        return None  # content-addressed already
+    if not profile_picture or profile_picture == "default-avatar.png":
+        return None  # initials avatar
+    if profile_picture.startswith("http"):
+        return None
+
+    # The same rules as get_profile_picture_url
+    if profile_picture.startswith("/"):
+        relative = profile_picture.lstrip("/")
+    elif profile_picture.startswith("static/"):
+        relative = profile_picture
+    else:
+        relative = f"static/uploads/profile_pics/{profile_picture}"
+    path = os.path.abspath(os.path.join(current_app.root_path, relative))
+    # Only uploads, not e.g. /static/images/default-avatar.png
+    return path if path.startswith(_upload_folder() + os.sep) else None
+
+
+def _store(path):
+    """Stage and render a local file; returns its avatar key"""
+    with open(path, "rb") as source:
+        inspect_upload(source)
+        key = image_pipeline.stage_stream(source)
+    image_pipeline.render(key)
+    return key
+
+
+def migrate(batch_size=200, remove_originals=False):
+    db = get_db()
+    last_id = 0
+    migrated = skipped = 0
+    keys = {}  # source path -> key, for pictures shared by several users
+    try:
+        while True:
+            rows = db.execute(
+                text(
+                    """
+                SELECT id, profile_picture FROM users
+                WHERE id > :last_id ORDER BY id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            ).fetchall()
+            if not rows:
+                break
+
+            for user_id, profile_picture in rows:
+                path = source_path(profile_picture)
+                if path is None:
+                    continue
+                if path not in keys:
+                    try:
+                        keys[path] = _store(path)
+                    except (OSError, ValueError) as e:
+                        print(f"[WARN] User {user_id}: {profile_picture} kept ({e})")
+                        skipped += 1
+                        continue
+                db.execute(
+                    text("UPDATE users SET profile_picture = :profile_picture WHERE id = :id"),
+                    {"profile_picture": f"{AVATAR_URL_PREFIX}{keys[path]}", "id": user_id},
+                )
+                migrated += 1
+
+            db.commit()
+            last_id = rows[-1][0]
+            print(f"Migrated pictures up to user {last_id} ({migrated} so far)")
+
+        drifted = recount_avatars(db)
+        db.commit()
+        print(f"Recounted avatar references ({drifted} drifted)")
+
+        # Whatever users still point at stays, e.g. files that failed above
+        still_used = {
+            source_path(row[0]) for row in db.execute(text("SELECT profile_picture FROM users"))
+        }
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    originals = []
+    for root, folders, files in os.walk(_upload_folder()):
+        if os.path.abspath(root) == image_pipeline.folder:
+            folders.clear()  # content-addressed storage, see collect_avatars.py
+            continue
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in still_used:
+                originals.append(path)
+
+    size = sum(os.path.getsize(path) for path in originals)
+    if remove_originals:
+        for path in originals:
+            os.remove(path)
+        print(f"Removed {len(originals)} unreferenced files ({size / 1024:.0f} KiB)")
+    elif originals:
+        print(
+            f"{len(originals)} unreferenced files ({size / 1024:.0f} KiB) remain under "
+            f"{_upload_folder()}; rerun with --remove-originals to delete them"
+        )
+
+    print(f"[OK] Migrated {migrated} profile pictures, kept {skipped} that could not be read")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument(
+        "--remove-originals",
+        action="store_true",
+        help="delete files under UPLOAD_FOLDER that no user points at any more",
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        migrate(args.batch_size, args.remove_originals)
@@ -0,0 +1,73 @@
+"""
+Recompute user_rating_stats from reviews.
+
+create_review keeps the table current, so this is only needed once after
+upgrading (to fill it from existing reviews) or after reviews were changed
+outside the API.
+
+Usage: python database/rebuild_rating_stats.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.rating_stats import rebuild_rating_stats
+
+
+def rebuild(batch_size=500):
+    db = get_db()
+    last_id = 0
+    total = 0
+    try:
+        while True:
+            result = db.execute(
+                text(
+                    """
+                SELECT DISTINCT reviewed_id FROM reviews
+                WHERE reviewed_id > :last_id
+                ORDER BY reviewed_id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            user_ids = [row[0] for row in result]
+            if not user_ids:
+                break
+
+            total += rebuild_rating_stats(db, user_ids)
+            db.commit()
+            last_id = user_ids[-1]
+            print(f"Rebuilt rating stats up to user {last_id} ({total} users)")
+
+        # Users whose reviews were all deleted
+        db.execute(
+            text(
+                "DELETE FROM user_rating_stats WHERE user_id NOT IN (SELECT reviewed_id FROM reviews)"
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Rebuilt rating stats for {total} users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        rebuild(args.batch_size)
@@ -0,0 +1,108 @@
+"""
+Recompute recommendation_scores for every learner.
+
+Skill, review and location changes mark users stale, and the app refreshes
+their rows in the background. The recency signal decays with time alone
+though, and a teacher dropping out of a full list leaves a slot only a
+rebuild refills. Run this periodically (e.g. nightly), and once after
+upgrading to fill the table.
+
+--stale-only refreshes just the users marked stale, for deployments that
+set RECOMMENDATION_REFRESH_SECONDS=0 and run it from cron instead.
+
+Usage: python database/rebuild_recommendation_scores.py [--stale-only]
+    [--batch-size 200]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.recommendation_scores import rebuild_learner_scores, refresh_stale_scores
+
+
+def rebuild(batch_size=200):
+    db = get_db()
+    last_id = 0
+    total = 0
+    try:
+        while True:
+            result = db.execute(
+                text(
+                    """
+                SELECT DISTINCT user_id FROM user_skills
+                WHERE is_learning = 1 AND user_id > :last_id
+                ORDER BY user_id LIMIT :limit
+            """
+                ),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            learner_ids = [row[0] for row in result]
+            if not learner_ids:
+                break
+
+            total += rebuild_learner_scores(db, learner_ids)
+            db.commit()
+            last_id = learner_ids[-1]
+            print(f"Scored learners up to {last_id} ({total} rows)")
+
+        # Users who stopped learning anything keep no rows
+        db.execute(
+            text(
+                """
+            DELETE FROM recommendation_scores WHERE learner_id NOT IN (
+                SELECT user_id FROM user_skills WHERE is_learning = 1
+            )
+        """
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Rebuilt {total} recommendation scores")
+
+
+def refresh_stale(batch_size=200):
+    db = get_db()
+    total = 0
+    try:
+        while True:
+            refreshed = refresh_stale_scores(db, batch_size)
+            if not refreshed:
+                break
+            total += refreshed
+            print(f"Refreshed {total} users")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Refreshed recommendation scores of {total} stale users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--stale-only", action="store_true", help="refresh only users marked stale"
+    )
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.stale_only:
+            refresh_stale(args.batch_size)
+        else:
+            rebuild(args.batch_size)
@@ -0,0 +1,158 @@
+"""
+Rebuild the full-text search indexes (database.db.SEARCH_INDEXES) from the
+rows they cover.
+
+init_db creates the indexes empty, and from then on the application keeps
+them in sync on insert. Run this once after upgrading, or whenever an index
+needs rebuilding. Only rows that exist when the run starts are touched, so
+messages sent meanwhile (indexed by send_message) are never duplicated.
+Users are re-indexed by id, so profile edits made meanwhile are kept.
+On MySQL with ENCRYPT_MESSAGES on, message_search is emptied instead.
+
+Usage: python database/rebuild_search_index.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import (
+    get_db,
+    get_db_dialect,
+    fulltext_available,
+    message_search_available,
+    index_message,
+    index_person,
+)
+from utils.encryption import decrypt_many
+
+
+def clear_index(db, dialect, name):
+    if dialect == "sqlite":
+        # Contentless FTS5 tables can't DELETE, but accept 'delete-all'
+        db.execute(text(f"INSERT INTO {name} ({name}) VALUES ('delete-all')"))
+    else:
+        db.execute(text(f"DELETE FROM {name}"))
+
+
+def rebuild_message_search(db, dialect, batch_size):
+    max_id = db.execute(text("SELECT MAX(id) FROM messages")).scalar() or 0
+    clear_index(db, dialect, "message_search")
+    db.commit()
+
+    last_id = 0
+    indexed = 0
+    while True:
+        result = db.execute(
+            text(
+                """
+            SELECT m.id, m.conversation_id, m.content, c.user1_id, c.user2_id
+            FROM messages m
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE m.id > :last_id AND m.id <= :max_id
+            ORDER BY m.id LIMIT :limit
+        """
+            ),
+            {"last_id": last_id, "max_id": max_id, "limit": batch_size},
+        )
+        rows = [row._mapping for row in result]
+        if not rows:
+            break
+
+        contents = decrypt_many([row["content"] for row in rows])
+        for row, content in zip(rows, contents):
+            index_message(
+                db,
+                row["id"],
+                row["conversation_id"],
+                row["user1_id"],
+                row["user2_id"],
+                content,
+            )
+
+        db.commit()
+        indexed += len(rows)
+        last_id = rows[-1]["id"]
+        print(f"message_search: indexed up to message {last_id}")
+
+    print(f"[OK] message_search rebuilt with {indexed} messages")
+
+
+def rebuild_people_search(db, dialect, batch_size):
+    max_id = db.execute(text("SELECT MAX(id) FROM users")).scalar() or 0
+    # people_search stores its columns (it isn't contentless), so a plain
+    # DELETE works on every dialect
+    db.execute(text("DELETE FROM people_search"))
+    db.commit()
+
+    last_id = 0
+    indexed = 0
+    while True:
+        result = db.execute(
+            text(
+                """
+            SELECT id, full_name, bio, location FROM users
+            WHERE id > :last_id AND id <= :max_id
+            ORDER BY id LIMIT :limit
+        """
+            ),
+            {"last_id": last_id, "max_id": max_id, "limit": batch_size},
+        )
+        rows = result.fetchall()
+        if not rows:
+            break
+
+        for user_id, full_name, bio, location in rows:
+            index_person(db, user_id, full_name, bio, location)
+
+        db.commit()
+        indexed += len(rows)
+        last_id = rows[-1][0]
+        print(f"people_search: indexed up to user {last_id}")
+
+    print(f"[OK] people_search rebuilt with {indexed} users")
+
+
+# Index name -> rebuild function
+REBUILDERS = {
+    "message_search": rebuild_message_search,
+    "people_search": rebuild_people_search,
+}
+
+
+def rebuild(batch_size=500):
+    dialect = get_db_dialect()
+    db = get_db()
+    try:
+        for name, rebuild_index in REBUILDERS.items():
+            if not fulltext_available(name):
+                print(f"Skipping {name}: full-text index not available")
+                continue
+            if name == "message_search" and not message_search_available():
+                # Drops plaintext indexed before ENCRYPT_MESSAGES was turned on
+                clear_index(db, dialect, name)
+                db.commit()
+                print(f"Cleared {name}: messages aren't indexed with ENCRYPT_MESSAGES on MySQL")
+                continue
+            rebuild_index(db, dialect, batch_size)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        rebuild(args.batch_size)
@@ -0,0 +1,60 @@
+"""
+Recompute skill_stats from user_skills and recent swap requests.
+
+The API keeps the table current, so this is needed once after upgrading
+(to fill it) and then periodically (e.g. nightly) to fix drift from
+concurrent edits or rows written outside the API.
+
+Usage: python database/rebuild_skill_stats.py [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.skill_stats import rebuild_skill_stats
+
+
+def rebuild(batch_size=500):
+    db = get_db()
+    last_id = 0
+    total = drifted = 0
+    try:
+        while True:
+            result = db.execute(
+                text("SELECT id FROM skills WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                {"last_id": last_id, "limit": batch_size},
+            )
+            skill_ids = [row[0] for row in result]
+            if not skill_ids:
+                break
+
+            drifted += rebuild_skill_stats(db, skill_ids)
+            db.commit()
+            total += len(skill_ids)
+            last_id = skill_ids[-1]
+            print(f"Rebuilt skill stats up to skill {last_id} ({drifted} drifted)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Rebuilt skill stats for {total} skills, fixed {drifted}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        rebuild(args.batch_size)
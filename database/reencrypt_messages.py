@@ -0,0 +1,219 @@
+"""
+Re-encrypt stored chat messages under the current ENCRYPTION_KEY.
+
+Walks messages.content (and conversations.last_message_preview) in id
+order, one keyset batch at a time:
+
+- plaintext rows are encrypted,
+- tokens under a retired key (ENCRYPTION_OLD_KEYS) are rotated,
+- tokens already under the primary key are left alone,
+- tokens no configured key can open are counted and skipped.
+
+Encryption runs in a process pool. Each batch is written back with a
+single executemany and committed on its own, so chat writes are only
+blocked for the length of one short transaction. Progress is checkpointed
+after every batch, so an interrupted run resumes where it stopped.
+
+Usage:
+    python database/reencrypt_messages.py [--batch-size 500] [--workers 4]
+        [--sleep 0.5] [--checkpoint reencrypt.checkpoint] [--restart] [--dry-run]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from sqlalchemy import text
+
+from utils.encryption import TOKEN_PREFIX
+
+# (table, text column) pairs holding encrypted chat content
+TARGETS = [
+    ("messages", "content"),
+    ("conversations", "last_message_preview"),
+]
+
+# Per-process ciphers, set up once by _init_worker
+_primary = None
+_key_ring = None
+
+
+def _init_worker(keys):
+    global _primary, _key_ring
+    fernets = [Fernet(k.encode() if isinstance(k, str) else k) for k in keys]
+    _primary = fernets[0]
+    _key_ring = MultiFernet(fernets)
+
+
+def _reencrypt_rows(rows):
+    """
+    Worker: return ([{"id", "content", "old"}, ...], stats) for rows that
+    need rewriting. rows are (id, value) tuples.
+    """
+    updates = []
+    stats = {"encrypted": 0, "rotated": 0, "current": 0, "failed": 0}
+
+    for row_id, value in rows:
+        if not value:
+            continue
+
+        if not value.startswith(TOKEN_PREFIX):
+            new_value = _primary.encrypt(value.encode()).decode()
+            stats["encrypted"] += 1
+        else:
+            try:
+                _primary.decrypt(value.encode())
+                stats["current"] += 1
+                continue
+            except InvalidToken:
+                pass
+            try:
+                new_value = _key_ring.rotate(value.encode()).decode()
+                stats["rotated"] += 1
+            except InvalidToken:
+                stats["failed"] += 1
+                continue
+
+        updates.append({"id": row_id, "content": new_value, "old": value})
+
+    return updates, stats
+
+
+def _load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_checkpoint(path, state):
+    # Write-then-rename so a crash never leaves a torn checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _split(rows, parts):
+    size = max(1, -(-len(rows) // parts))
+    return [rows[i : i + size] for i in range(0, len(rows), size)]
+
+
+def reencrypt_table(db, pool, table, column, state, args):
+    """Process one table from its checkpointed id onwards"""
+    progress = state.setdefault(
+        table,
+        {"last_id": 0, "encrypted": 0, "rotated": 0, "current": 0, "failed": 0},
+    )
+
+    while True:
+        result = db.execute(
+            text(
+                f"""
+            SELECT id, {column} FROM {table}
+            WHERE id > :last_id ORDER BY id LIMIT :limit
+        """
+            ),
+            {"last_id": progress["last_id"], "limit": args.batch_size},
+        )
+        rows = [tuple(row) for row in result]
+        db.commit()  # end the read transaction before the (slow) crypto
+        if not rows:
+            break
+
+        if pool:
+            results = pool.map(_reencrypt_rows, _split(rows, args.workers))
+        else:
+            results = [_reencrypt_rows(rows)]
+
+        updates = []
+        for chunk_updates, chunk_stats in results:
+            updates.extend(chunk_updates)
+            for key, count in chunk_stats.items():
+                progress[key] += count
+
+        if updates and not args.dry_run:
+            # Guard on the old value so a concurrent change is never clobbered
+            db.execute(
+                text(
+                    f"UPDATE {table} SET {column} = :content WHERE id = :id AND {column} = :old"
+                ),
+                updates,
+            )
+            db.commit()
+
+        progress["last_id"] = rows[-1][0]
+        if args.checkpoint and not args.dry_run:
+            _save_checkpoint(args.checkpoint, state)
+
+        print(
+            f"{table}: up to id {progress['last_id']} | "
+            f"encrypted {progress['encrypted']}, rotated {progress['rotated']}, "
+            f"current {progress['current']}, failed {progress['failed']}"
+        )
+
+        if args.sleep:
+            time.sleep(args.sleep)
+
+
+def reencrypt(args, keys):
+    from database.db import get_db
+
+    state = {} if args.restart else _load_checkpoint(args.checkpoint)
+    pool = None
+    if args.workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers, initializer=_init_worker, initargs=(keys,)
+        )
+    else:
+        _init_worker(keys)
+
+    db = get_db()
+    try:
+        for table, column in TARGETS:
+            reencrypt_table(db, pool, table, column, state, args)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        if pool:
+            pool.shutdown()
+
+    suffix = " (dry run, nothing written)" if args.dry_run else ""
+    print(f"[OK] Re-encryption complete{suffix}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--sleep", type=float, default=0.0, help="Seconds to pause between batches"
+    )
+    parser.add_argument("--checkpoint", default="reencrypt_messages.checkpoint")
+    parser.add_argument(
+        "--restart", action="store_true", help="Ignore an existing checkpoint"
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from app import create_app  # also loads .env
+    from utils.encryption import get_configured_keys
+
+    # A generated development key would make everything unreadable next boot
+    if not os.getenv("ENCRYPTION_KEY"):
+        sys.exit("ENCRYPTION_KEY must be set explicitly before re-encrypting messages")
+
+    app = create_app()
+    with app.app_context():
+        keys = get_configured_keys()
+
+    reencrypt(args, keys)
@@ -9,8 +9,16 @@ CREATE TABLE IF NOT EXISTS users (
     bio TEXT,
     profile_picture VARCHAR(255) DEFAULT 'default-avatar.png',
     location VARCHAR(255),
+    latitude REAL, -- Resolved from location against database/gazetteer.csv (utils/geo.py)
+    longitude REAL,
+    geohash VARCHAR(12), -- Of latitude/longitude, range-scanned by radius queries
     availability VARCHAR(255),
+    availability_slots VARCHAR(42), -- Weekly hourly bitmask in UTC, see utils/availability.py
+    utc_offset INTEGER, -- Hours east of UTC the availability was entered in
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_active_at TIMESTAMP, -- Touched on login, feeds recommendation recency
+    skills_updated_at TIMESTAMP, -- Touched by skill edits, drives incremental similarity refresh
+    scores_stale_at TIMESTAMP, -- Set while recommendation scores await a background refresh
     is_admin BOOLEAN DEFAULT 0
 );
 
@@ -19,6 +27,8 @@ CREATE TABLE IF NOT EXISTS skills (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name VARCHAR(255) UNIQUE NOT NULL,
     category VARCHAR(255) NOT NULL,
+    parent_id INTEGER, -- Broader skill in the taxonomy, mirrored by skill_closure
+    aliases VARCHAR(255), -- Other names separated by |, matched by autocomplete
     description TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -39,6 +49,7 @@ CREATE TABLE IF NOT EXISTS user_skills (
 
 -- Indexes for better query performance
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_users_name ON users(full_name, id);
 CREATE INDEX IF NOT EXISTS idx_skills_name ON skills(name);
 CREATE INDEX IF NOT EXISTS idx_skills_category ON skills(category);
 CREATE INDEX IF NOT EXISTS idx_user_skills_user ON user_skills(user_id);
@@ -46,6 +57,60 @@ CREATE INDEX IF NOT EXISTS idx_user_skills_skill ON user_skills(skill_id);
 CREATE INDEX IF NOT EXISTS idx_user_skills_teaching ON user_skills(is_teaching);
 CREATE INDEX IF NOT EXISTS idx_user_skills_learning ON user_skills(is_learning);
 
+-- Skill taxonomy as a closure table: one row per skill in it and each of
+-- its ancestors, the skill itself included at depth 0 (see
+-- utils/skill_taxonomy.py, seed with database/seed_taxonomy.py and edit
+-- with database/edit_taxonomy.py)
+CREATE TABLE IF NOT EXISTS skill_closure (
+    ancestor_id INTEGER NOT NULL,
+    descendant_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_id, descendant_id),
+    FOREIGN KEY (ancestor_id) REFERENCES skills(id) ON DELETE CASCADE,
+    FOREIGN KEY (descendant_id) REFERENCES skills(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_skill_closure_descendant ON skill_closure(descendant_id, ancestor_id);
+
+-- Per-skill supply/demand counters and trending score, maintained by the
+-- API (see utils/skill_stats.py, rebuild with database/rebuild_skill_stats.py)
+CREATE TABLE IF NOT EXISTS skill_stats (
+    skill_id INTEGER PRIMARY KEY,
+    teachers INTEGER NOT NULL DEFAULT 0,
+    teachers_beginner INTEGER NOT NULL DEFAULT 0,
+    teachers_intermediate INTEGER NOT NULL DEFAULT 0,
+    teachers_expert INTEGER NOT NULL DEFAULT 0,
+    learners INTEGER NOT NULL DEFAULT 0,
+    learners_beginner INTEGER NOT NULL DEFAULT 0,
+    learners_intermediate INTEGER NOT NULL DEFAULT 0,
+    learners_expert INTEGER NOT NULL DEFAULT 0,
+    trending_score DOUBLE PRECISION NOT NULL DEFAULT 0, -- Sum of exponentially growing request weights
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (skill_id) REFERENCES skills(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_skill_stats_trending ON skill_stats(trending_score);
+
+-- Version stamps of cached catalogs, bumped by whatever changes them
+-- (see utils/skill_catalog.py). A missing row reads as version 0.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- Processed profile pictures by content key (see utils/image_pipeline.py).
+-- ref_count is the number of users showing one, and released_at when that
+-- last dropped to 0. database/collect_avatars.py deletes the files of
+-- avatars released long enough ago.
+CREATE TABLE IF NOT EXISTS avatars (
+    avatar_key VARCHAR(64) PRIMARY KEY,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    released_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_avatars_released ON avatars(released_at);
+
 -- Insert some default skill categories
 INSERT OR IGNORE INTO skills (name, category, description) VALUES
 ('Python', 'Programming', 'Python programming language'),
@@ -61,6 +126,27 @@ INSERT OR IGNORE INTO skills (name, category, description) VALUES
 ('Spanish', 'Languages', 'Spanish language'),
 ('French', 'Languages', 'French language');
 
+-- Aliases of the default skills, for databases created before the column
+UPDATE skills SET aliases = CASE name
+    WHEN 'Python' THEN 'py'
+    WHEN 'JavaScript' THEN 'js|ecmascript|node'
+    WHEN 'Web Development' THEN 'html|css|frontend|web dev'
+    WHEN 'Data Science' THEN 'machine learning|ml|data analysis|statistics'
+    WHEN 'Graphic Design' THEN 'graphics|visual design'
+    WHEN 'UI/UX Design' THEN 'user interface|user experience|product design'
+    WHEN 'Public Speaking' THEN 'presentations|speech'
+    WHEN 'Photography' THEN 'photo|camera'
+    WHEN 'Video Editing' THEN 'video production|film editing'
+    WHEN 'Guitar' THEN 'acoustic guitar|electric guitar'
+    WHEN 'Spanish' THEN 'espanol|castellano'
+    WHEN 'French' THEN 'francais'
+END
+WHERE aliases IS NULL AND name IN (
+    'Python', 'JavaScript', 'Web Development', 'Data Science', 'Graphic Design',
+    'UI/UX Design', 'Public Speaking', 'Photography', 'Video Editing', 'Guitar',
+    'Spanish', 'French'
+);
+
 -- Swap Requests Table
 CREATE TABLE IF NOT EXISTS swap_requests (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,6 +155,7 @@ CREATE TABLE IF NOT EXISTS swap_requests (
     skill_id INTEGER NOT NULL,
     status VARCHAR(50) CHECK(status IN ('pending', 'accepted', 'rejected', 'completed')) DEFAULT 'pending',
     message TEXT,
+    ring_id INTEGER, -- Set when the request is one leg of a swap ring
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (receiver_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -95,6 +182,96 @@ CREATE INDEX IF NOT EXISTS idx_requests_receiver ON swap_requests(receiver_id);
 CREATE INDEX IF NOT EXISTS idx_requests_status ON swap_requests(status);
 CREATE INDEX IF NOT EXISTS idx_reviews_reviewed ON reviews(reviewed_id);
 
+-- Rating aggregates per reviewed user, maintained by create_review
+-- (rebuild with database/rebuild_rating_stats.py)
+CREATE TABLE IF NOT EXISTS user_rating_stats (
+    user_id INTEGER PRIMARY KEY,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    stars_1 INTEGER NOT NULL DEFAULT 0,
+    stars_2 INTEGER NOT NULL DEFAULT 0,
+    stars_3 INTEGER NOT NULL DEFAULT 0,
+    stars_4 INTEGER NOT NULL DEFAULT 0,
+    stars_5 INTEGER NOT NULL DEFAULT 0,
+    bayesian_score REAL, -- Average pulled towards a prior, see utils/rating_stats.py
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Recommendation Scores (see utils/recommendation_scores.py)
+-- Best-scoring teachers and skills per learner, up to MAX_SCORES_PER_LEARNER rows
+CREATE TABLE IF NOT EXISTS recommendation_scores (
+    learner_id INTEGER NOT NULL,
+    teacher_id INTEGER NOT NULL,
+    skill_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (learner_id, teacher_id, skill_id),
+    FOREIGN KEY (learner_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (teacher_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (skill_id) REFERENCES skills(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_recommendation_scores_rank ON recommendation_scores(learner_id, score, teacher_id, skill_id);
+CREATE INDEX IF NOT EXISTS idx_recommendation_scores_teacher ON recommendation_scores(teacher_id);
+
+-- "Users like you" results, computed by database/build_similarity.py
+CREATE TABLE IF NOT EXISTS similar_users (
+    user_id INTEGER NOT NULL,
+    similar_user_id INTEGER NOT NULL,
+    similarity REAL NOT NULL,
+    ordinal INTEGER NOT NULL,
+    computed_at TIMESTAMP,
+    PRIMARY KEY (user_id, similar_user_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (similar_user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS suggested_skills (
+    user_id INTEGER NOT NULL,
+    skill_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    ordinal INTEGER NOT NULL,
+    computed_at TIMESTAMP,
+    PRIMARY KEY (user_id, skill_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (skill_id) REFERENCES skills(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_similar_users_ordinal ON similar_users(user_id, ordinal);
+CREATE INDEX IF NOT EXISTS idx_similar_users_computed ON similar_users(computed_at);
+CREATE INDEX IF NOT EXISTS idx_suggested_skills_ordinal ON suggested_skills(user_id, ordinal);
+CREATE INDEX IF NOT EXISTS idx_users_skills_updated ON users(skills_updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_scores_stale ON users(scores_stale_at);
+CREATE INDEX IF NOT EXISTS idx_users_geohash ON users(geohash);
+
+-- Multi-party swap rings proposed by database/find_swap_rings.py
+CREATE TABLE IF NOT EXISTS swap_rings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ring_key VARCHAR(255) NOT NULL UNIQUE, -- Member ids from the smallest, e.g. 3-17-42
+    size INTEGER NOT NULL,
+    status VARCHAR(50) CHECK(status IN ('proposed', 'requested')) DEFAULT 'proposed',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Member at ordinal i teaches skill_id to the member at ordinal i + 1 (the last one to the first)
+CREATE TABLE IF NOT EXISTS swap_ring_members (
+    ring_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    skill_id INTEGER NOT NULL,
+    accepted_at TIMESTAMP, -- The ring's requests are created once every member has accepted
+    note TEXT, -- Message for the request this member sends
+    PRIMARY KEY (ring_id, ordinal),
+    FOREIGN KEY (ring_id) REFERENCES swap_rings(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (skill_id) REFERENCES skills(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_swap_ring_members_user ON swap_ring_members(user_id);
+CREATE INDEX IF NOT EXISTS idx_swap_rings_status ON swap_rings(status);
+CREATE INDEX IF NOT EXISTS idx_requests_ring ON swap_requests(ring_id);
+
 -- Chat System Tables
 
 -- Conversations Table
@@ -104,6 +281,15 @@ CREATE TABLE IF NOT EXISTS conversations (
     user2_id INTEGER NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Summary maintained by send_message (rebuild with database/backfill_conversations.py)
+    last_message_id INTEGER,
+    last_message_preview TEXT, -- Encrypted like messages.content
+    last_message_at TIMESTAMP,
+    user1_unread_count INTEGER DEFAULT 0,
+    user2_unread_count INTEGER DEFAULT 0,
+    -- Read watermarks: highest message id each participant has read
+    user1_last_read_id INTEGER DEFAULT 0,
+    user2_last_read_id INTEGER DEFAULT 0,
     FOREIGN KEY (user1_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (user2_id) REFERENCES users(id) ON DELETE CASCADE,
     UNIQUE(user1_id, user2_id)
@@ -115,7 +301,7 @@ CREATE TABLE IF NOT EXISTS messages (
     conversation_id INTEGER NOT NULL,
     sender_id INTEGER NOT NULL,
     content TEXT NOT NULL, -- Encrypted content
-    is_read BOOLEAN DEFAULT 0,
+    is_read BOOLEAN DEFAULT 0, -- Legacy: read state now comes from conversations.userN_last_read_id
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE,
     FOREIGN KEY (sender_id) REFERENCES users(id) ON DELETE CASCADE
@@ -125,5 +311,8 @@ CREATE TABLE IF NOT EXISTS messages (
 CREATE INDEX IF NOT EXISTS idx_conversations_user1 ON conversations(user1_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_user2 ON conversations(user2_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_user1_updated ON conversations(user1_id, updated_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_user2_updated ON conversations(user2_id, updated_at);
 CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_messages_created ON messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_id ON messages(conversation_id, id);
@@ -20,8 +20,8 @@ password_hash = hash_password(password)
 existing = db.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
 if not existing:
     db.execute(
-        'INSERT INTO users (email, password_hash, full_name, profile_picture) VALUES (?, ?, ?, ?)',
-        (email, password_hash, full_name, "https://ui-avatars.com/api/?name=RT")
+        'INSERT INTO users (email, password_hash, full_name) VALUES (?, ?, ?)',
+        (email, password_hash, full_name)
     )
     db.commit()
     print("✅ Test user created")
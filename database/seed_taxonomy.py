@@ -0,0 +1,69 @@
+"""
+Set up the default skill taxonomy on a database that has none yet.
+
+Places each child skill of DEFAULT_TAXONOMY under its parent, the same
+way as database/edit_taxonomy.py. Once the database holds any hierarchy
+it is left alone, so an admin's edits (flattening it included) survive.
+Pass --force to apply the defaults anyway.
+
+Usage: python database/seed_taxonomy.py [--force]
+"""
+
+import argparse
+import os
+import sys
+
+# Ensure parent directory is in path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import create_app
+from database.db import get_db
+from utils.skill_taxonomy import set_parent
+
+# (parent, child) skill names, parents first
+DEFAULT_TAXONOMY = [
+    ("Web Development", "JavaScript"),
+]
+
+
+def seed(force=False):
+    db = get_db()
+    placed = 0
+    try:
+        if not force and db.execute(text("SELECT 1 FROM skill_closure WHERE depth > 0")).first():
+            print("[OK] The skill taxonomy is already set up; nothing to do")
+            return
+
+        ids = dict(db.execute(text("SELECT name, id FROM skills")).fetchall())
+        for parent, child in DEFAULT_TAXONOMY:
+            if parent not in ids or child not in ids:
+                print(f"[WARN] Skipped {child} under {parent}: no such skill")
+                continue
+            try:
+                set_parent(db, ids[child], ids[parent])
+            except ValueError as e:
+                print(f"[WARN] Skipped {child} under {parent}: {e}")
+                continue
+            placed += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"[OK] Placed {placed} skills in the default taxonomy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="apply the defaults over an existing hierarchy"
+    )
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        seed(args.force)
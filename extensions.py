@@ -1,8 +1,32 @@
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from utils.pubsub import Broker
+from utils.skill_index import SkillIndex
+from utils.people_search import PeopleIndex
+from utils.skill_catalog import SkillCatalog
+from utils.image_pipeline import ImagePipeline
+from utils.recommendation_scores import ScoreRefresher
 
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["200 per day", "50 per hour"],
     storage_uri="memory://"
 )
+
+# Chat event fan-out (see utils/pubsub.py for backends)
+broker = Broker()
+
+# Per-worker inverted index of user_skills for swap matching
+skill_index = SkillIndex()
+
+# Per-worker people search index, used when people_search isn't available
+people_index = PeopleIndex()
+
+# Per-worker cache of the skills catalog, see utils/skill_catalog.py
+skill_catalog = SkillCatalog()
+
+# Avatar upload processing, see utils/image_pipeline.py
+image_pipeline = ImagePipeline()
+
+# Background refresh of recommendation scores, see utils/recommendation_scores.py
+score_refresher = ScoreRefresher()
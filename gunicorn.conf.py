@@ -0,0 +1,30 @@
+"""
+Gunicorn settings, shared by the Procfile, Dockerfile and render.yaml.
+
+Sizing: every open chat tab keeps a Server-Sent Events stream, and so a
+thread, busy for up to STREAM_MAX_SECONDS (routes/chat.py). A worker
+serves at most `threads` requests at once, streams included, so
+
+    concurrent chat tabs + ordinary requests <= workers * threads
+
+Threads are what run out, not CPU, so grow GUNICORN_THREADS first. More
+workers (WEB_CONCURRENCY) need CHAT_BROKER_URL set to a file:// spool or
+redis://, otherwise a message only reaches tabs connected to the worker
+that sent it.
+"""
+
+import os
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "64"))
+
+
+def on_starting(server):
+    broker_url = os.getenv("CHAT_BROKER_URL", "memory://")
+    if workers > 1 and broker_url.startswith("memory://"):
+        server.log.warning(
+            "%d workers share no chat broker; set CHAT_BROKER_URL to a "
+            "file:// spool or redis:// so pushes reach every worker",
+            workers,
+        )
@@ -6,5 +6,6 @@ from .matching import matching_bp
 from .requests import requests_bp
 from .reviews import reviews_bp
 from .chat import chat_bp
+from .media import media_bp
 
-__all__ = ['auth_bp', 'profile_bp', 'skills_bp', 'matching_bp', 'requests_bp', 'reviews_bp', 'chat_bp']
+__all__ = ['auth_bp', 'profile_bp', 'skills_bp', 'matching_bp', 'requests_bp', 'reviews_bp', 'chat_bp', 'media_bp']
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from database.db import get_db
+from database.db import get_db, insert_returning_id
 from utils import (
     hash_password,
     verify_password,
@@ -8,8 +8,10 @@ from utils import (
     validate_password,
     sanitize_input,
     token_required,
+    get_profile_picture_url,
 )
-from extensions import limiter
+from extensions import limiter, people_index
+from utils.people_search import person_changed
 from sqlalchemy import text
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
@@ -67,45 +69,23 @@ def signup():
             # Hash password
             password_hash = hash_password(password)
 
-            # Generate default profile picture URL
-            names = full_name.strip().split()
-            if len(names) >= 2:
-                initials = f"{names[0][0]}{names[-1][0]}"
-            elif names:
-                initials = names[0][:2]
-            else:
-                initials = "SS"
-
-            default_pic = (
-                f"https://ui-avatars.com/api/?name={initials}&background=random"
-            )
-
-            # Insert new user
-            db.execute(
-                text(
-                    """
-                    INSERT INTO users (email, password_hash, full_name, profile_picture)
-                    VALUES (:email, :password_hash, :full_name, :profile_picture)
+            # Insert new user, without a picture until they upload one
+            # (get_profile_picture_url then gives their initials avatar)
+            user_id = insert_returning_id(
+                db,
                 """
-                ),
+                    INSERT INTO users (email, password_hash, full_name)
+                    VALUES (:email, :password_hash, :full_name)
+                """,
                 {
                     "email": email,
                     "password_hash": password_hash,
                     "full_name": full_name,
-                    "profile_picture": default_pic,
                 },
             )
+            person = person_changed(db, user_id)
             db.commit()
-
-            # Retrieve the created user
-            result = db.execute(
-                text("SELECT id FROM users WHERE email = :email"), {"email": email}
-            )
-            user = result.fetchone()
-            user_id = _get_user_row_dict(user)["id"] if user else None
-
-            if not user_id:
-                return jsonify({"error": "Failed to retrieve user ID"}), 500
+            people_index.update(user_id, *person)
 
             # Generate authentication token
             token = generate_token(user_id, email)
@@ -178,6 +158,13 @@ def login():
             if not verify_password(password, user_dict["password_hash"]):
                 return jsonify({"error": "Invalid email or password"}), 401
 
+            # Activity recency feeds recommendation scores
+            db.execute(
+                text("UPDATE users SET last_active_at = CURRENT_TIMESTAMP WHERE id = :id"),
+                {"id": user_dict["id"]},
+            )
+            db.commit()
+
             # Generate authentication token
             token = generate_token(user_dict["id"], user_dict["email"])
 
@@ -191,7 +178,9 @@ def login():
                             "email": user_dict["email"],
                             "full_name": user_dict["full_name"],
                             "bio": user_dict["bio"],
-                            "profile_picture": user_dict["profile_picture"],
+                            "profile_picture": get_profile_picture_url(
+                                user_dict["profile_picture"], user_dict["full_name"]
+                            ),
                         },
                     }
                 ),
@@ -243,7 +232,9 @@ def get_current_user(current_user):
                         "email": user_dict["email"],
                         "full_name": user_dict["full_name"],
                         "bio": user_dict["bio"],
-                        "profile_picture": user_dict["profile_picture"],
+                        "profile_picture": get_profile_picture_url(
+                            user_dict["profile_picture"], user_dict["full_name"]
+                        ),
                         "location": user_dict["location"],
                         "availability": user_dict["availability"],
                     }
@@ -1,52 +1,496 @@
-from flask import Blueprint, request, jsonify
-from database.db import get_db
-from utils import token_required, sanitize_input, get_profile_picture_url
-from utils.encryption import encrypt_message, decrypt_message
-from extensions import limiter
+from flask import Blueprint, request, jsonify, Response, current_app
+from database.db import (
+    get_db,
+    get_db_dialect,
+    insert_returning_id,
+    message_search_available,
+    index_message,
+)
+from utils import (
+    token_required,
+    sanitize_input,
+    get_profile_picture_url,
+    decode_token,
+    generate_stream_ticket,
+    decode_stream_ticket,
+)
+from utils.encryption import encrypt_message, decrypt_many
+from extensions import limiter, broker
 from sqlalchemy import text
+import json
+import re
+import sqlite3
+import time
 
 chat_bp = Blueprint("chat", __name__, url_prefix="/api/chat")
 
+# Page sizes for keyset-paginated message and conversation fetches
+MESSAGES_PAGE_SIZE = 50
+MAX_MESSAGES_PAGE_SIZE = 200
+CONVERSATIONS_PAGE_SIZE = 50
+MAX_CONVERSATIONS_PAGE_SIZE = 100
+
+# Characters of the last message kept on the conversation row
+PREVIEW_LENGTH = 100
+
+# Push channel timings. Streams are recycled so a worker thread is never
+# held forever and proxies with idle timeouts don't cut the connection.
+# Each open stream still takes a thread; gunicorn.conf.py sizes for that.
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 55
+LONG_POLL_MAX_SECONDS = 25
+
+# Message search limits
+SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 50
+MAX_SEARCH_TERMS = 8
+SNIPPET_LENGTH = 120
+
+# Conversations stored as (larger id, smaller id) before the canonical
+# ordering, until database/canonicalize_conversations.py has flipped them.
+# Checked at most this often while any are left, never again after.
+LEGACY_PAIRS_CHECK_SECONDS = 300
+_legacy_pairs = {"remaining": True, "checked_at": 0.0}
+
+
+def _parse_cursor(value):
+    """Parse an optional message id cursor, raising ValueError if invalid"""
+    if value in (None, ""):
+        return None
+    cursor = int(value)
+    if cursor < 0:
+        raise ValueError("Cursor must be positive")
+    return cursor
+
+
+def _parse_conversation_cursor(value):
+    """Split a conversation list cursor ("<updated_at>|<id>") into its parts"""
+    if not value:
+        return None, None
+    updated_at, _, conv_id = value.rpartition("|")
+    if not updated_at:
+        raise ValueError("Malformed cursor")
+    return updated_at, int(conv_id)
+
+
+def _conversation_pair(user_a, user_b):
+    """Conversations are keyed by the canonical (smaller id, larger id) pair"""
+    return min(user_a, user_b), max(user_a, user_b)
+
+
+def _legacy_conversation_id(db, user1_id, user2_id):
+    """
+    The id of a not yet canonicalized (user2_id, user1_id) conversation
+    row, or None. Messages go there rather than into a second row for the
+    same pair.
+    """
+    if not _legacy_pairs["remaining"]:
+        return None
+    now = time.monotonic()
+    if now - _legacy_pairs["checked_at"] >= LEGACY_PAIRS_CHECK_SECONDS:
+        _legacy_pairs["checked_at"] = now
+        _legacy_pairs["remaining"] = (
+            db.execute(
+                text("SELECT 1 FROM conversations WHERE user1_id > user2_id LIMIT 1")
+            ).first()
+            is not None
+        )
+        if not _legacy_pairs["remaining"]:
+            return None
+    return db.execute(
+        text("SELECT id FROM conversations WHERE user1_id = :user2_id AND user2_id = :user1_id"),
+        {"user1_id": user1_id, "user2_id": user2_id},
+    ).scalar()
+
+
+def _touch_conversation(db, conversation_id, preview, user1_unread, user2_unread):
+    """Record a new message on a conversation row; False if the row is gone"""
+    result = db.execute(
+        text(
+            """
+        UPDATE conversations SET
+            updated_at = CURRENT_TIMESTAMP,
+            last_message_preview = :preview,
+            last_message_at = CURRENT_TIMESTAMP,
+            user1_unread_count = COALESCE(user1_unread_count, 0) + :user1_unread,
+            user2_unread_count = COALESCE(user2_unread_count, 0) + :user2_unread
+        WHERE id = :id
+    """
+        ),
+        {
+            "id": conversation_id,
+            "preview": preview,
+            "user1_unread": user1_unread,
+            "user2_unread": user2_unread,
+        },
+    )
+    return result.rowcount == 1
+
+
+def _upsert_conversation(db, dialect, params):
+    """
+    Create the pair's conversation with the message summary, or update it
+    if another request created it meanwhile. Returns its id.
+    """
+    summary_columns = """
+        user1_id, user2_id, updated_at, last_message_preview, last_message_at,
+        user1_unread_count, user2_unread_count
+    """
+    summary_values = """
+        :user1_id, :user2_id, CURRENT_TIMESTAMP, :preview, CURRENT_TIMESTAMP,
+        :user1_unread, :user2_unread
+    """
+
+    if dialect == "mysql":
+        # LAST_INSERT_ID(id) makes lastrowid report the existing row on conflict
+        return db.execute(
+            text(
+                f"""
+            INSERT INTO conversations ({summary_columns}) VALUES ({summary_values})
+            ON DUPLICATE KEY UPDATE
+                id = LAST_INSERT_ID(id),
+                updated_at = VALUES(updated_at),
+                last_message_preview = VALUES(last_message_preview),
+                last_message_at = VALUES(last_message_at),
+                user1_unread_count = COALESCE(user1_unread_count, 0) + VALUES(user1_unread_count),
+                user2_unread_count = COALESCE(user2_unread_count, 0) + VALUES(user2_unread_count)
+        """
+            ),
+            params,
+        ).lastrowid
+
+    upsert = f"""
+        INSERT INTO conversations ({summary_columns}) VALUES ({summary_values})
+        ON CONFLICT (user1_id, user2_id) DO UPDATE SET
+            updated_at = excluded.updated_at,
+            last_message_preview = excluded.last_message_preview,
+            last_message_at = excluded.last_message_at,
+            user1_unread_count = COALESCE(user1_unread_count, 0) + excluded.user1_unread_count,
+            user2_unread_count = COALESCE(user2_unread_count, 0) + excluded.user2_unread_count
+    """
+    if dialect == "sqlite" and sqlite3.sqlite_version_info >= (3, 35, 0):
+        return db.execute(text(f"{upsert} RETURNING id"), params).scalar()
+    db.execute(text(upsert), params)
+    return db.execute(
+        text("SELECT id FROM conversations WHERE user1_id = :user1_id AND user2_id = :user2_id"),
+        params,
+    ).scalar()
+
+
+def _store_message(db, sender_id, receiver_id, content, preview, search_text):
+    """
+    Create/touch the conversation, insert the message, update the
+    conversation summary and index the plaintext for search, all inside
+    the caller's transaction.
+
+    PostgreSQL does all of it in one statement: the message id is taken
+    from its sequence up front so the conversation upsert can carry the
+    whole summary. Other dialects update an existing conversation by id,
+    upserting only when there is none yet, then insert the message, still
+    without any commit in between. A legacy reversed row for the pair is
+    updated in place instead (see _legacy_conversation_id).
+
+    Returns (conversation_id, message_id).
+    """
+    user1_id, user2_id = _conversation_pair(sender_id, receiver_id)
+    params = {
+        "user1_id": user1_id,
+        "user2_id": user2_id,
+        "sender_id": sender_id,
+        "content": content,
+        "preview": preview,
+        "user1_unread": 1 if receiver_id == user1_id else 0,
+        "user2_unread": 1 if receiver_id == user2_id else 0,
+        "search_text": search_text,
+    }
+    dialect = get_db_dialect()
+    indexed = message_search_available()
+    legacy_id = _legacy_conversation_id(db, user1_id, user2_id)
+
+    if legacy_id is None and dialect == "postgresql":
+        index_cte = ""
+        if indexed:
+            index_cte = """, indexed AS (
+                INSERT INTO message_search (message_id, conversation_id, body)
+                SELECT id, conversation_id, to_tsvector('simple', :search_text)
+                FROM msg
+            )"""
+        row = db.execute(
+            text(
+                f"""
+            WITH next_message AS (
+                SELECT nextval(pg_get_serial_sequence('messages', 'id')) AS id
+            ), conv AS (
+                INSERT INTO conversations (
+                    user1_id, user2_id, updated_at, last_message_id, last_message_preview,
+                    last_message_at, user1_unread_count, user2_unread_count
+                )
+                SELECT :user1_id, :user2_id, CURRENT_TIMESTAMP, id, :preview,
+                       CURRENT_TIMESTAMP, :user1_unread, :user2_unread
+                FROM next_message
+                ON CONFLICT (user1_id, user2_id) DO UPDATE SET
+                    updated_at = EXCLUDED.updated_at,
+                    last_message_id = EXCLUDED.last_message_id,
+                    last_message_preview = EXCLUDED.last_message_preview,
+                    last_message_at = EXCLUDED.last_message_at,
+                    user1_unread_count = COALESCE(conversations.user1_unread_count, 0)
+                        + EXCLUDED.user1_unread_count,
+                    user2_unread_count = COALESCE(conversations.user2_unread_count, 0)
+                        + EXCLUDED.user2_unread_count
+                RETURNING id
+            ), msg AS (
+                INSERT INTO messages (id, conversation_id, sender_id, content)
+                SELECT next_message.id, conv.id, :sender_id, :content
+                FROM next_message, conv
+                RETURNING conversation_id, id
+            ){index_cte}
+            SELECT conversation_id, id FROM msg
+        """
+            ),
+            params,
+        ).fetchone()
+        return row[0], row[1]
+
+    if legacy_id is not None:
+        # Flipped row: its user1 is this pair's user2
+        _touch_conversation(db, legacy_id, preview, params["user2_unread"], params["user1_unread"])
+        conversation_id = legacy_id
+    else:
+        # Update an existing row by id: an upsert that hits it would still
+        # use up an auto-increment id
+        conversation_id = db.execute(
+            text(
+                "SELECT id FROM conversations WHERE user1_id = :user1_id AND user2_id = :user2_id"
+            ),
+            params,
+        ).scalar()
+        if conversation_id is None or not _touch_conversation(
+            db, conversation_id, preview, params["user1_unread"], params["user2_unread"]
+        ):
+            conversation_id = _upsert_conversation(db, dialect, params)
+
+    message_id = insert_returning_id(
+        db,
+        "INSERT INTO messages (conversation_id, sender_id, content) VALUES (:conv_id, :sender_id, :content)",
+        {"conv_id": conversation_id, "sender_id": sender_id, "content": content},
+    )
+    db.execute(
+        text("UPDATE conversations SET last_message_id = :message_id WHERE id = :id"),
+        {"message_id": message_id, "id": conversation_id},
+    )
+    if indexed:
+        index_message(db, message_id, conversation_id, user1_id, user2_id, search_text)
+    return conversation_id, message_id
+
+
+def _event_user():
+    """
+    Resolve the JWT payload for the event stream. EventSource can't set
+    headers, so it passes a stream ticket as ?ticket= instead; the login
+    token itself never goes in a URL.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if " " in auth_header:
+        return decode_token(auth_header.split(" ")[1])
+    ticket = request.args.get("ticket")
+    return decode_stream_ticket(ticket) if ticket else None
+
+
+def _parse_since(value):
+    """Parse a Last-Event-ID / since timestamp, ignoring garbage"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _search_terms(query):
+    """Split a search box query into plain word tokens safe for every dialect"""
+    return re.findall(r"\w+", query.lower())[:MAX_SEARCH_TERMS]
+
+
+def _search_messages(db, user_id, terms, conversation_id, limit):
+    """
+    Rank the user's messages matching all terms (the last one as a prefix,
+    for search-as-you-type) through the dialect's full-text index.
+    """
+    dialect = get_db_dialect()
+    params = {"user_id": user_id, "limit": limit}
+    conv_filter = ""
+    if conversation_id is not None:
+        conv_filter = "AND m.conversation_id = :conv_id"
+        params["conv_id"] = conversation_id
+
+    select = """
+        SELECT m.id, m.conversation_id, m.sender_id, m.content, m.created_at,
+               u.id AS other_user_id, u.full_name, u.profile_picture
+    """
+    other_user_join = """
+        JOIN conversations c ON c.id = m.conversation_id
+        JOIN users u ON u.id = CASE WHEN c.user1_id = :user_id THEN c.user2_id ELSE c.user1_id END
+    """
+
+    if dialect == "sqlite":
+        # The members column restricts the match to the user's conversations
+        # inside the index itself
+        phrases = [f'"{term}"' for term in terms]
+        phrases[-1] += " *"
+        params["match"] = f'members : "u{user_id}" AND body : ({" AND ".join(phrases)})'
+        query = f"""
+            {select}
+            FROM message_search
+            JOIN messages m ON m.id = message_search.rowid
+            {other_user_join}
+            WHERE message_search MATCH :match {conv_filter}
+            ORDER BY bm25(message_search), m.id DESC
+            LIMIT :limit
+        """
+    elif dialect == "postgresql":
+        params["tsquery"] = " & ".join(terms) + ":*"
+        query = f"""
+            {select}
+            FROM message_search s
+            JOIN messages m ON m.id = s.message_id
+            {other_user_join}
+            WHERE s.body @@ to_tsquery('simple', :tsquery)
+              AND (c.user1_id = :user_id OR c.user2_id = :user_id) {conv_filter}
+            ORDER BY ts_rank(s.body, to_tsquery('simple', :tsquery)) DESC, m.id DESC
+            LIMIT :limit
+        """
+    else:
+        params["against"] = " ".join(f"+{term}" for term in terms) + "*"
+        query = f"""
+            {select}
+            FROM message_search s
+            JOIN messages m ON m.id = s.message_id
+            {other_user_join}
+            WHERE MATCH(s.body) AGAINST (:against IN BOOLEAN MODE)
+              AND (c.user1_id = :user_id OR c.user2_id = :user_id) {conv_filter}
+            ORDER BY MATCH(s.body) AGAINST (:against IN BOOLEAN MODE) DESC, m.id DESC
+            LIMIT :limit
+        """
+
+    return db.execute(text(query), params).fetchall()
+
+
+def _snippet(content, terms):
+    """A SNIPPET_LENGTH window of content around the first matched term"""
+    if len(content) <= SNIPPET_LENGTH:
+        return content
+    lowered = content.lower()
+    positions = [p for p in (lowered.find(term) for term in terms) if p >= 0]
+    start = max(0, min(positions, default=0) - SNIPPET_LENGTH // 4)
+    end = start + SNIPPET_LENGTH
+    return (
+        ("…" if start > 0 else "")
+        + content[start:end]
+        + ("…" if end < len(content) else "")
+    )
+
+
+def _participant_columns(conv_dict, user_id):
+    """Column names holding the given participant's unread count and watermark"""
+    if conv_dict["user1_id"] == user_id:
+        return "user1_unread_count", "user1_last_read_id"
+    return "user2_unread_count", "user2_last_read_id"
+
+
+def _serialize_message(
+    msg_dict, decrypted_content, user_id, my_last_read_id=0, other_last_read_id=0
+):
+    """
+    Convert a messages row into the JSON shape used by the chat UI.
+    is_read means the recipient's watermark has reached the message.
+    """
+    is_me = msg_dict["sender_id"] == user_id
+    return {
+        "id": msg_dict["id"],
+        "sender_id": msg_dict["sender_id"],
+        "content": decrypted_content,
+        "created_at": str(msg_dict["created_at"]) if msg_dict["created_at"] else None,
+        "is_read": msg_dict["id"]
+        <= (other_last_read_id if is_me else my_last_read_id),
+        "is_me": is_me,
+    }
+
 
 @chat_bp.route("/conversations", methods=["GET"])
 @token_required
 @limiter.limit("1 per second")
 def get_conversations(current_user):
-    """Get all conversations for the current user"""
+    """Get the current user's conversations, most recently active first
+
+    Query params (all optional):
+        before: next_cursor from the previous page
+        limit: page size, defaults to CONVERSATIONS_PAGE_SIZE
+    """
     try:
         user_id = current_user["user_id"]
+
+        try:
+            limit = min(
+                int(request.args.get("limit", CONVERSATIONS_PAGE_SIZE)),
+                MAX_CONVERSATIONS_PAGE_SIZE,
+            )
+            if limit < 1:
+                raise ValueError
+            before_ts, before_id = _parse_conversation_cursor(request.args.get("before"))
+        except ValueError:
+            return jsonify({"error": "Invalid cursor or limit parameter"}), 400
+
+        # One extra row tells whether another page exists
+        params = {"user_id": user_id, "limit": limit + 1}
+        keyset = ""
+        if before_id is not None:
+            keyset = "AND (c.updated_at < :before_ts OR (c.updated_at = :before_ts AND c.id < :before_id))"
+            params.update({"before_ts": before_ts, "before_id": before_id})
+
         db = get_db()
 
-        # Fetch conversations with the other user's details
-        # Note: SQLAlchemy execute returns rows, which can be accessed by mapping
-        query = """
-            SELECT c.id, c.updated_at,
-                   u.id as other_user_id, u.full_name, u.profile_picture,
-                   (SELECT content FROM messages WHERE conversation_id = c.id ORDER BY created_at DESC LIMIT 1) as last_message,
-                   (SELECT created_at FROM messages WHERE conversation_id = c.id ORDER BY created_at DESC LIMIT 1) as last_message_time,
-                   (SELECT COUNT(*) FROM messages WHERE conversation_id = c.id AND sender_id != :user_id AND is_read = 0) as unread_count
-            FROM conversations c
-            JOIN users u ON (c.user1_id = u.id OR c.user2_id = u.id)
-            WHERE (c.user1_id = :user_id OR c.user2_id = :user_id) AND u.id != :user_id
-            ORDER BY c.updated_at DESC
+        # The summary columns are maintained by send_message, so each side of
+        # the conversation is one range scan on (userN_id, updated_at) and no
+        # messages rows are touched.
+        query = f"""
+            SELECT * FROM (
+                SELECT * FROM (
+                    SELECT c.id, c.updated_at, c.last_message_preview, c.last_message_at,
+                           c.user1_unread_count AS unread_count,
+                           u.id AS other_user_id, u.full_name, u.profile_picture
+                    FROM conversations c
+                    JOIN users u ON u.id = c.user2_id
+                    WHERE c.user1_id = :user_id {keyset}
+                    ORDER BY c.updated_at DESC, c.id DESC
+                    LIMIT :limit
+                ) AS as_user1
+                UNION ALL
+                SELECT * FROM (
+                    SELECT c.id, c.updated_at, c.last_message_preview, c.last_message_at,
+                           c.user2_unread_count AS unread_count,
+                           u.id AS other_user_id, u.full_name, u.profile_picture
+                    FROM conversations c
+                    JOIN users u ON u.id = c.user1_id
+                    WHERE c.user2_id = :user_id AND c.user1_id != c.user2_id {keyset}
+                    ORDER BY c.updated_at DESC, c.id DESC
+                    LIMIT :limit
+                ) AS as_user2
+            ) AS page
+            ORDER BY updated_at DESC, id DESC
+            LIMIT :limit
         """
 
-        result = db.execute(text(query), {"user_id": user_id})
+        result = db.execute(text(query), params)
         conversations = result.fetchall()
+        has_more = len(conversations) > limit
+        conversations = conversations[:limit]
+
+        # Decrypt last message previews in one batch
+        previews = decrypt_many(
+            [conv._mapping["last_message_preview"] for conv in conversations]
+        )
 
         result_list = []
-        for conv in conversations:
+        for conv, decrypted_msg in zip(conversations, previews):
             conv_dict = conv._mapping
-            # Decrypt last message
-            last_msg = conv_dict["last_message"]
-            if last_msg:
-                try:
-                    decrypted_msg = decrypt_message(last_msg)
-                except Exception as dec_err:
-                    print(f"Decrypt error: {dec_err}")
-                    decrypted_msg = last_msg[:50] + "..." if len(last_msg) > 50 else last_msg
-            else:
-                decrypted_msg = ""
 
             # Get profile picture URL using utility
             profile_pic = get_profile_picture_url(conv_dict["profile_picture"], conv_dict["full_name"])
@@ -60,33 +504,78 @@ def get_conversations(current_user):
                         "profile_picture": profile_pic,
                     },
                     "last_message": decrypted_msg,
-                    "last_message_time": conv_dict["last_message_time"],
+                    "last_message_time": conv_dict["last_message_at"],
                     "unread_count": conv_dict["unread_count"] or 0,
                 }
             )
 
-        return jsonify({"conversations": result_list}), 200
+        next_cursor = None
+        if has_more:
+            last = conversations[-1]._mapping
+            next_cursor = f"{last['updated_at']}|{last['id']}"
+
+        return (
+            jsonify(
+                {"conversations": result_list, "next_cursor": next_cursor, "has_more": has_more}
+            ),
+            200,
+        )
 
     except Exception as e:
         import traceback
 
         traceback.print_exc()
         return jsonify({"error": f"Failed to fetch conversations: {str(e)}"}), 500
+    finally:
+        try:
+            if "db" in locals():
+                db.close()
+        except:
+            pass
 
 
 @chat_bp.route("/<int:conversation_id>/messages", methods=["GET"])
 @token_required
 @limiter.limit("1 per second")
 def get_messages(current_user, conversation_id):
-    """Get messages for a specific conversation"""
+    """Get a page of messages for a specific conversation
+
+    Query params (all optional):
+        after_id: only return messages newer than this id (polling)
+        before_id: only return messages older than this id (scroll-back)
+        limit: page size, defaults to MESSAGES_PAGE_SIZE
+
+    Without a cursor the most recent page is returned. Messages are always
+    returned oldest first.
+    """
     try:
         user_id = current_user["user_id"]
+
+        try:
+            after_id = _parse_cursor(request.args.get("after_id"))
+            before_id = _parse_cursor(request.args.get("before_id"))
+            limit = min(
+                int(request.args.get("limit", MESSAGES_PAGE_SIZE)),
+                MAX_MESSAGES_PAGE_SIZE,
+            )
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "Invalid cursor or limit parameter"}), 400
+
+        if after_id is not None and before_id is not None:
+            return jsonify({"error": "Use either after_id or before_id, not both"}), 400
+
         db = get_db()
 
         # Verify user is part of the conversation
         result = db.execute(
             text(
-                "SELECT id FROM conversations WHERE id = :conv_id AND (user1_id = :user_id OR user2_id = :user_id)"
+                """
+                SELECT id, user1_id, user1_last_read_id, user2_last_read_id
+                FROM conversations
+                WHERE id = :conv_id AND (user1_id = :user_id OR user2_id = :user_id)
+            """
             ),
             {"conv_id": conversation_id, "user_id": user_id},
         )
@@ -95,61 +584,292 @@ def get_messages(current_user, conversation_id):
         if not conv:
             return jsonify({"error": "Conversation not found or access denied"}), 404
 
-        # Mark messages as read
-        try:
-            db.execute(
-                text(
-                    "UPDATE messages SET is_read = 1 WHERE conversation_id = :conv_id AND sender_id != :user_id"
-                ),
-                {"conv_id": conversation_id, "user_id": user_id},
+        # Reading is side-effect free; clients advance their watermark via
+        # POST /<id>/read once messages are actually on screen
+        conv_dict = conv._mapping
+        _, my_read_column = _participant_columns(conv_dict, user_id)
+        other_read_column = (
+            "user2_last_read_id" if my_read_column == "user1_last_read_id" else "user1_last_read_id"
+        )
+        my_last_read_id = conv_dict[my_read_column] or 0
+        other_last_read_id = conv_dict[other_read_column] or 0
+
+        # Fetch one extra row to know whether another page exists.
+        # Keyset on id uses idx_messages_conversation_id, so the cost is
+        # bounded by the page size rather than the conversation length.
+        params = {"conv_id": conversation_id, "limit": limit + 1}
+        if after_id is not None:
+            params["after_id"] = after_id
+            query = """
+                SELECT id, sender_id, content, created_at FROM messages
+                WHERE conversation_id = :conv_id AND id > :after_id
+                ORDER BY id ASC LIMIT :limit
+            """
+        elif before_id is not None:
+            params["before_id"] = before_id
+            query = """
+                SELECT id, sender_id, content, created_at FROM messages
+                WHERE conversation_id = :conv_id AND id < :before_id
+                ORDER BY id DESC LIMIT :limit
+            """
+        else:
+            query = """
+                SELECT id, sender_id, content, created_at FROM messages
+                WHERE conversation_id = :conv_id
+                ORDER BY id DESC LIMIT :limit
+            """
+
+        messages = db.execute(text(query), params).fetchall()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if after_id is None:
+            # Newest-first pages are flipped back to chronological order
+            messages.reverse()
+
+        # One key ring lookup for the whole page
+        contents = decrypt_many([msg._mapping["content"] for msg in messages])
+        result_list = [
+            _serialize_message(
+                msg._mapping, content, user_id, my_last_read_id, other_last_read_id
             )
-            db.commit()
+            for msg, content in zip(messages, contents)
+        ]
+
+        return (
+            jsonify(
+                {
+                    "messages": result_list,
+                    "has_more": has_more,
+                    "oldest_id": result_list[0]["id"] if result_list else before_id,
+                    "newest_id": result_list[-1]["id"] if result_list else after_id,
+                    "last_read_id": my_last_read_id,
+                    "other_last_read_id": other_last_read_id,
+                }
+            ),
+            200,
+        )
+
+    except Exception as e:
+        import traceback
+
+        traceback.print_exc()
+        return jsonify({"error": f"Failed to fetch messages: {str(e)}"}), 500
+    finally:
+        try:
+            if "db" in locals():
+                db.close()
         except:
-            db.rollback()
+            pass
+
+
+@chat_bp.route("/<int:conversation_id>/read", methods=["POST"])
+@token_required
+@limiter.limit("60 per minute")
+def mark_read(current_user, conversation_id):
+    """
+    Advance the current user's read watermark.
+
+    Body (optional): {"message_id": N}. Defaults to the latest message.
+    The watermark never moves backwards, and nothing is written if it
+    wouldn't move.
+    """
+    db = None
+    try:
+        user_id = current_user["user_id"]
+        data = request.get_json(silent=True) or {}
+
+        message_id = data.get("message_id")
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return jsonify({"error": "Invalid message_id"}), 400
+
+        db = get_db()
+
+        result = db.execute(
+            text(
+                """
+                SELECT id, user1_id, user2_id, last_message_id,
+                       user1_last_read_id, user2_last_read_id
+                FROM conversations
+                WHERE id = :conv_id AND (user1_id = :user_id OR user2_id = :user_id)
+            """
+            ),
+            {"conv_id": conversation_id, "user_id": user_id},
+        )
+        conv = result.fetchone()
+
+        if not conv:
+            return jsonify({"error": "Conversation not found or access denied"}), 404
+
+        conv_dict = conv._mapping
+        unread_column, read_column = _participant_columns(conv_dict, user_id)
+        current = conv_dict[read_column] or 0
+        latest = conv_dict["last_message_id"] or 0
+        target = latest if message_id is None else min(message_id, latest)
+
+        if target <= current:
+            return jsonify({"last_read_id": current, "updated": False}), 200
+
+        # Unread = messages from the other side above the new watermark;
+        # the (conversation_id, id) index bounds this to the unread tail
+        db.execute(
+            text(
+                f"""
+            UPDATE conversations
+            SET {read_column} = :target,
+                {unread_column} = (
+                    SELECT COUNT(*) FROM messages
+                    WHERE conversation_id = :conv_id AND id > :target AND sender_id != :user_id
+                )
+            WHERE id = :conv_id AND COALESCE({read_column}, 0) < :target
+        """
+            ),
+            {"conv_id": conversation_id, "target": target, "user_id": user_id},
+        )
+        db.commit()
+
+        broker.publish(
+            [conv_dict["user1_id"], conv_dict["user2_id"]],
+            "read",
+            {
+                "conversation_id": conversation_id,
+                "user_id": user_id,
+                "last_read_id": target,
+            },
+        )
+
+        return jsonify({"last_read_id": target, "updated": True}), 200
+
+    except Exception as e:
+        if db:
+            try:
+                db.rollback()
+            except:
+                pass
+        return jsonify({"error": f"Failed to mark messages as read: {str(e)}"}), 500
+    finally:
+        if db:
+            try:
+                db.close()
+            except:
+                pass
 
-        # Fetch messages
+
+@chat_bp.route("/unread", methods=["GET"])
+@token_required
+@limiter.limit("60 per minute")
+def get_unread_total(current_user):
+    """Total unread messages across conversations, for the nav bar badge"""
+    db = None
+    try:
+        user_id = current_user["user_id"]
+        db = get_db()
+
+        # Two index range scans over the maintained counters
         result = db.execute(
             text(
-                "SELECT id, sender_id, content, created_at, is_read FROM messages WHERE conversation_id = :conv_id ORDER BY created_at ASC"
+                """
+            SELECT
+                (SELECT COALESCE(SUM(user1_unread_count), 0) FROM conversations
+                 WHERE user1_id = :user_id)
+                + (SELECT COALESCE(SUM(user2_unread_count), 0) FROM conversations
+                   WHERE user2_id = :user_id AND user1_id != user2_id) AS total
+        """
             ),
-            {"conv_id": conversation_id},
+            {"user_id": user_id},
         )
-        messages = result.fetchall()
+        total = result.scalar() or 0
 
-        result_list = []
-        for msg in messages:
-            msg_dict = msg._mapping
-            content = msg_dict["content"]
-            
-            if content and content.startswith("gAAAA"):
-                try:
-                    decrypted_content = decrypt_message(content)
-                except Exception as dec_err:
-                    print(f"Decrypt error: {dec_err}")
-                    decrypted_content = content
-            else:
-                decrypted_content = content
+        return jsonify({"unread": int(total)}), 200
 
-            result_list.append(
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch unread count: {str(e)}"}), 500
+    finally:
+        if db:
+            try:
+                db.close()
+            except:
+                pass
+
+
+@chat_bp.route("/search", methods=["GET"])
+@token_required
+@limiter.limit("30 per minute")
+def search_messages(current_user):
+    """Full-text search over the current user's messages
+
+    Query params:
+        q: search text (required), every word must match
+        conversation_id: restrict to one conversation (optional)
+        limit: number of hits, defaults to SEARCH_RESULTS
+
+    Hits are best match first. To show a hit in context, fetch
+    /<conversation_id>/messages?after_id=<message_id - 1>, the page that
+    starts at the hit, and page outward with the usual cursors.
+    """
+    try:
+        user_id = current_user["user_id"]
+
+        terms = _search_terms(request.args.get("q", ""))
+        if not terms:
+            return jsonify({"error": "Search query is required"}), 400
+
+        try:
+            conversation_id = _parse_cursor(request.args.get("conversation_id"))
+            limit = min(
+                int(request.args.get("limit", SEARCH_RESULTS)), MAX_SEARCH_RESULTS
+            )
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "Invalid conversation_id or limit parameter"}), 400
+
+        # Also off on MySQL with encrypted messages, see message_search_available
+        if not message_search_available():
+            return jsonify({"error": "Message search is not available"}), 503
+
+        db = get_db()
+        rows = _search_messages(db, user_id, terms, conversation_id, limit)
+
+        contents = decrypt_many([row._mapping["content"] for row in rows])
+        results = []
+        for row, content in zip(rows, contents):
+            row_dict = row._mapping
+            results.append(
                 {
-                    "id": msg_dict["id"],
-                    "sender_id": msg_dict["sender_id"],
-                    "content": decrypted_content,
-                    "created_at": (
-                        str(msg_dict["created_at"]) if msg_dict["created_at"] else None
-                    ),
-                    "is_read": bool(msg_dict["is_read"]),
-                    "is_me": msg_dict["sender_id"] == user_id,
+                    "message_id": row_dict["id"],
+                    "conversation_id": row_dict["conversation_id"],
+                    "sender_id": row_dict["sender_id"],
+                    "is_me": row_dict["sender_id"] == user_id,
+                    "snippet": _snippet(content, terms),
+                    "created_at": str(row_dict["created_at"])
+                    if row_dict["created_at"]
+                    else None,
+                    "other_user": {
+                        "id": row_dict["other_user_id"],
+                        "full_name": row_dict["full_name"],
+                        "profile_picture": get_profile_picture_url(
+                            row_dict["profile_picture"], row_dict["full_name"]
+                        ),
+                    },
                 }
             )
 
-        return jsonify({"messages": result_list}), 200
+        return jsonify({"results": results, "terms": terms}), 200
 
     except Exception as e:
         import traceback
 
         traceback.print_exc()
-        return jsonify({"error": f"Failed to fetch messages: {str(e)}"}), 500
+        return jsonify({"error": f"Failed to search messages: {str(e)}"}), 500
+    finally:
+        try:
+            if "db" in locals():
+                db.close()
+        except:
+            pass
 
 
 @chat_bp.route("/send", methods=["POST"])
@@ -167,80 +887,47 @@ def send_message(current_user):
         if not receiver_id or not content:
             return jsonify({"error": "Receiver ID and content are required"}), 400
 
-        db = get_db()
-
-        # Check if conversation exists
-        result = db.execute(
-            text(
-                """
-            SELECT id FROM conversations 
-            WHERE (user1_id = :sender_id AND user2_id = :receiver_id) OR (user1_id = :receiver_id AND user2_id = :sender_id)
-        """
-            ),
-            {"sender_id": sender_id, "receiver_id": receiver_id},
-        )
-        conv = result.fetchone()
+        try:
+            receiver_id = int(receiver_id)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid receiver ID"}), 400
 
-        if conv:
-            conv_dict = conv._mapping
-            conversation_id = conv_dict["id"]
-            # Update timestamp
-            db.execute(
-                text(
-                    "UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = :id"
-                ),
-                {"id": conversation_id},
-            )
-            db.commit()
-        else:
-            # Create new conversation
-            db.execute(
-                text(
-                    "INSERT INTO conversations (user1_id, user2_id) VALUES (:sender_id, :receiver_id)"
-                ),
-                {"sender_id": sender_id, "receiver_id": receiver_id},
-            )
-            db.commit()
-
-            # Get ID of created conversation
-            result = db.execute(
-                text(
-                    """
-                SELECT id FROM conversations 
-                WHERE (user1_id = :sender_id AND user2_id = :receiver_id) OR (user1_id = :receiver_id AND user2_id = :sender_id)
-                ORDER BY id DESC LIMIT 1
-            """
-                ),
-                {"sender_id": sender_id, "receiver_id": receiver_id},
-            )
-            new_conv = result.fetchone()
-            if new_conv:
-                conversation_id = new_conv._mapping["id"]
-            else:
-                return jsonify({"error": "Failed to create conversation"}), 500
+        # Encrypted under the primary key when ENCRYPT_MESSAGES is on; older
+        # rows are rotated by database/reencrypt_messages.py
+        message_content = encrypt_message(content)
 
-        # Store message as plaintext (encryption causing key consistency issues)
-        # TODO: Implement proper key rotation/management for production encryption
-        message_content = content
+        db = get_db()
+        conversation_id, message_id = _store_message(
+            db,
+            sender_id,
+            receiver_id,
+            message_content,
+            encrypt_message(content[:PREVIEW_LENGTH]),
+            content,
+        )
+        db.commit()
 
-        # Insert message
-        db.execute(
-            text(
-                "INSERT INTO messages (conversation_id, sender_id, content) VALUES (:conv_id, :sender_id, :content)"
-            ),
+        # Push to both participants; the sender may have other tabs open
+        participants = [sender_id, receiver_id]
+        broker.publish(
+            participants,
+            "message",
             {
-                "conv_id": conversation_id,
+                "conversation_id": conversation_id,
+                "message_id": message_id,
                 "sender_id": sender_id,
-                "content": message_content,
             },
         )
-        db.commit()
+        broker.publish(
+            participants, "conversation", {"conversation_id": conversation_id}
+        )
 
         return (
             jsonify(
                 {
                     "message": "Message sent",
                     "conversation_id": conversation_id,
+                    "message_id": message_id,
                     "content": content,
                     "created_at": "Just now",
                 }
@@ -258,3 +945,132 @@ def send_message(current_user):
 
         traceback.print_exc()
         return jsonify({"error": f"Failed to send message: {str(e)}"}), 500
+    finally:
+        if db:
+            try:
+                db.close()
+            except:
+                pass
+
+
+@chat_bp.route("/stream-ticket", methods=["POST"])
+@token_required
+@limiter.limit("10 per minute")
+def create_stream_ticket(current_user):
+    """Short-lived ticket for opening the event stream"""
+    return (
+        jsonify(
+            {
+                "ticket": generate_stream_ticket(current_user["user_id"]),
+                "expires_in": current_app.config["STREAM_TICKET_EXPIRES"],
+            }
+        ),
+        200,
+    )
+
+
+@chat_bp.route("/stream", methods=["GET"])
+@limiter.limit("10 per minute")
+def stream_events():
+    """
+    Server-Sent Events stream of chat events for the current user.
+    Idle connections only cost heartbeats; no database queries are made.
+    """
+    current_user = _event_user()
+    if not current_user:
+        return jsonify({"error": "Invalid or expired token"}), 401
+
+    user_id = current_user["user_id"]
+    since = _parse_since(
+        request.headers.get("Last-Event-ID") or request.args.get("since")
+    )
+
+    def format_event(event):
+        data = json.dumps(event["data"])
+        return f"id: {event['ts']:.6f}\nevent: {event['event']}\ndata: {data}\n\n"
+
+    def generate():
+        # Subscribe before replaying so nothing published in between is lost
+        subscription = broker.subscribe(user_id)
+        # Taken after subscribing: everything from here on is buffered
+        started = time.time()
+        backlog = broker.recent(user_id, since) if since is not None else []
+        seen = set()
+        try:
+            # The initial id lets EventSource resume from here via Last-Event-ID
+            resume = since if since is not None and backlog is not None else started
+            yield f"retry: 3000\nid: {resume:.6f}\n\n"
+            if backlog is None:
+                # The gap can't be filled from this worker's memory
+                yield "event: resync\ndata: {}\n\n"
+                backlog = []
+            for event in backlog:
+                seen.add(event["id"])
+                yield format_event(event)
+
+            deadline = time.time() + STREAM_MAX_SECONDS
+            while time.time() < deadline:
+                event = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if subscription.overflowed:
+                    # Client fell behind; tell it to refetch from the database,
+                    # and not to replay what it missed on reconnecting
+                    yield f"id: {time.time():.6f}\nevent: resync\ndata: {{}}\n\n"
+                    return
+                if event is None:
+                    yield ": ping\n\n"
+                elif event["id"] not in seen:
+                    yield format_event(event)
+        finally:
+            subscription.close()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@chat_bp.route("/poll", methods=["GET"])
+@token_required
+@limiter.limit("10 per minute")
+def poll_events(current_user):
+    """Long-poll fallback for clients without EventSource support"""
+    user_id = current_user["user_id"]
+    since = _parse_since(request.args.get("since"))
+    try:
+        timeout = min(
+            float(request.args.get("timeout", LONG_POLL_MAX_SECONDS)),
+            LONG_POLL_MAX_SECONDS,
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid timeout parameter"}), 400
+
+    with broker.subscribe(user_id) as subscription:
+        started = time.time()
+        events = broker.recent(user_id, since) if since is not None else []
+        stale = events is None
+        if stale:
+            events = []
+        elif not events:
+            event = subscription.get(timeout=max(timeout, 0))
+            if event is not None:
+                events.append(event)
+                # Collect anything published in the same burst
+                while True:
+                    event = subscription.get(timeout=0.05)
+                    if event is None:
+                        break
+                    events.append(event)
+
+    # After a resync the client starts over from now
+    cursor = max([e["ts"] for e in events], default=started if stale else since or started)
+    return (
+        jsonify(
+            {
+                "events": [{"event": e["event"], "data": e["data"]} for e in events],
+                "since": f"{cursor:.6f}",
+                "resync": stale or subscription.overflowed,
+            }
+        ),
+        200,
+    )
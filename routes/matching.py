@@ -1,105 +1,375 @@
 from flask import Blueprint, request, jsonify
-from database.db import get_db
-from utils import get_profile_picture_url
+from database.db import get_db, build_in_clause, fulltext_available
+from utils import get_profile_picture_url, token_required
+from utils.availability import OverlapFilter, decode_mask, overlap_filter_from_args
+from utils.geo import radius_filter_from_args, filtered_page
+from extensions import skill_catalog, skill_index, people_index
+from utils.people_search import search_terms, search_people, parse_cursor, make_cursor
+from utils.rating_stats import PRIOR_RATING
 from sqlalchemy import text
 
 matching_bp = Blueprint("matching", __name__, url_prefix="/api/matching")
 
+RECOMMENDATIONS_PAGE_SIZE = 20
+MAX_RECOMMENDATIONS_PAGE_SIZE = 100
+
+
+# find-teachers / find-learners: role -> user_skills flag
+MATCH_ROLES = {"teachers": "is_teaching", "learners": "is_learning"}
+MATCHES_PAGE_SIZE = 20
+MAX_MATCHES_PAGE_SIZE = 100
+MAX_BATCH_SKILLS = 20
+
+PROFICIENCY_ORDINAL_SQL = (
+    "CASE us.proficiency_level WHEN 'Expert' THEN 3 "
+    "WHEN 'Intermediate' THEN 2 ELSE 1 END"
+)
+MAX_PROFICIENCY_ORDINAL = 3
+
+MATCH_COLUMNS = f"""
+    u.id, u.full_name, u.bio, u.profile_picture, u.location, u.availability,
+    u.latitude, u.longitude, u.availability_slots,
+    us.proficiency_level, {PROFICIENCY_ORDINAL_SQL} as proficiency_ordinal,
+    s.id as skill_id, s.name as skill_name, s.category
+"""
+
+MATCH_ORDER = f"{PROFICIENCY_ORDINAL_SQL} DESC, u.full_name, u.id"
+
+
+def _match_cursor(row, expand):
+    # The expand mode travels with the cursor, so a page continues the same
+    # result set; name last, so it may contain the separator
+    return f"{row['proficiency_ordinal']}|{row['id']}|{int(expand)}|{row['full_name']}"
+
+
+def _row_filter(radius=None, overlap=None):
+    """
+    keep() for filtered_page: rows inside radius and sharing enough
+    available hours, tagged with distance_km / overlap_hours.
+    """
+
+    def keep(row):
+        if radius is not None:
+            km = radius.distance(row)
+            if km is None:
+                return False
+            row["distance_km"] = round(km, 1)
+        if overlap is not None:
+            hours = overlap.overlap(row)
+            if hours is None:
+                return False
+            row["overlap_hours"] = hours
+        return True
+
+    return keep
+
+
+def _sql_filters(radius=None, overlap=None):
+    """SQL narrowing for _row_filter, as (condition, params)"""
+    conditions, params = ["1=1"], {}
+    if radius is not None:
+        condition, params = radius.sql()
+        conditions.append(condition)
+    if overlap is not None and overlap.min_hours > 0:
+        conditions.append("u.availability_slots IS NOT NULL")
+    return " AND ".join(conditions), params
+
+
+def _present(rows):
+    """Picture URLs instead of stored paths, and no raw coordinates or masks"""
+    for row in rows:
+        row["profile_picture"] = get_profile_picture_url(
+            row["profile_picture"], row["full_name"]
+        )
+        row.pop("latitude", None)
+        row.pop("longitude", None)
+        row.pop("availability_slots", None)
+    return rows
 
-@matching_bp.route("/find-teachers", methods=["GET"])
-def find_teachers():
-    """Find users who teach a specific skill"""
-    try:
-        skill_id = request.args.get("skill_id")
-
-        if not skill_id:
-            return jsonify({"error": "skill_id parameter is required"}), 400
 
-        db = get_db()
-
-        # Find teachers for this skill
+def _count_estimate(skill_ids, role):
+    """Users with any of skill_ids; someone with several of them counts more than once"""
+    try:
+        return sum(skill_index.count(sid, teaching=role == "teachers") for sid in skill_ids)
+    except Exception:
+        return None
+
+
+def _related_skills(skill_id, role):
+    """
+    Skills whose teachers (or learners) match skill_id in the taxonomy:
+    a teacher of any skill under it, or a learner of any skill above it
+    """
+    taxonomy = skill_catalog.snapshot().taxonomy
+    if role == "teachers":
+        return taxonomy.descendants(skill_id)
+    return taxonomy.ancestors(skill_id)
+
+
+def _expanded_page(db, role, skill_id, related, after, limit, filter_condition, filter_params):
+    """
+    Up to limit users with any of the related skills, after `after` in
+    (best proficiency DESC, name, id) order, each once with their best
+    matching skill (then the closest in the taxonomy).
+
+    Users are sought one proficiency level at a time: those whose best
+    related skill is at that level, by name from the keyset on, with
+    LIMIT applied inside the query. A page costs a few index seeks plus
+    one lookup of the page's skills, whatever the number of matches.
+
+    A user whose skills changed in between keeps their place as a row
+    marked skipped, so the batch is still paginated on what was scanned.
+    """
+    flag = MATCH_ROLES[role]
+    placeholders, skill_params = build_in_clause("r", sorted(related))
+    base = {**skill_params, **filter_params}
+
+    scanned = []
+    top = after["proficiency_ordinal"] if after else MAX_PROFICIENCY_ORDINAL
+    for ordinal in range(top, 0, -1):
+        params = {**base, "ordinal": ordinal, "limit": limit - len(scanned)}
+        keyset = ""
+        if after and ordinal == after["proficiency_ordinal"]:
+            keyset = "AND (u.full_name > :name OR (u.full_name = :name AND u.id > :user_id))"
+            params.update({"name": after["full_name"], "user_id": after["id"]})
         result = db.execute(
             text(
-                """
-            SELECT DISTINCT
-                u.id, u.full_name, u.bio, u.profile_picture, u.location, u.availability,
-                us.proficiency_level,
-                s.name as skill_name, s.category
-            FROM users u
-            JOIN user_skills us ON u.id = us.user_id
-            JOIN skills s ON us.skill_id = s.id
-            WHERE us.skill_id = :skill_id AND us.is_teaching = 1
-            ORDER BY us.proficiency_level DESC, u.full_name
+                f"""
+            SELECT u.id, u.full_name FROM users u
+            WHERE u.id IN (
+                SELECT us.user_id FROM user_skills us
+                WHERE us.skill_id IN ({placeholders}) AND us.{flag} = 1
+                AND {PROFICIENCY_ORDINAL_SQL} = :ordinal
+            )
+            AND u.id NOT IN (
+                SELECT us.user_id FROM user_skills us
+                WHERE us.skill_id IN ({placeholders}) AND us.{flag} = 1
+                AND {PROFICIENCY_ORDINAL_SQL} > :ordinal
+            )
+            AND {filter_condition} {keyset}
+            ORDER BY u.full_name, u.id
+            LIMIT :limit
         """
             ),
-            {"skill_id": skill_id},
+            params,
         )
-        teachers = result.fetchall()
-
-        # Process profile pictures
-        teachers_list = []
-        for teacher in teachers:
-            teacher_dict = dict(teacher._mapping)
-            teacher_dict["profile_picture"] = get_profile_picture_url(
-                teacher_dict["profile_picture"], teacher_dict["full_name"]
-            )
-            teachers_list.append(teacher_dict)
+        scanned.extend(
+            {"id": row[0], "full_name": row[1], "proficiency_ordinal": ordinal} for row in result
+        )
+        if len(scanned) == limit:
+            break
+    if not scanned:
+        return []
+
+    if role == "teachers":
+        closure = "sc.ancestor_id = :skill_id AND sc.descendant_id = us.skill_id"
+    else:
+        closure = "sc.descendant_id = :skill_id AND sc.ancestor_id = us.skill_id"
+    placeholders, params = build_in_clause("u", [row["id"] for row in scanned])
+    result = db.execute(
+        text(
+            f"""
+        SELECT {MATCH_COLUMNS}, sc.depth
+        FROM skill_closure sc
+        JOIN user_skills us ON {closure}
+        JOIN users u ON u.id = us.user_id
+        JOIN skills s ON s.id = us.skill_id
+        WHERE us.user_id IN ({placeholders}) AND us.{flag} = 1
+    """
+        ),
+        {**params, "skill_id": skill_id},
+    )
+    best = {}
+    for row in result:
+        row = dict(row._mapping)
+        rank = (-row["proficiency_ordinal"], row.pop("depth"), row["skill_id"])
+        if row["id"] not in best or rank < best[row["id"]][0]:
+            best[row["id"]] = (rank, row)
+    return [
+        best[row["id"]][1] if row["id"] in best else {**row, "skipped": True} for row in scanned
+    ]
+
+
+def _find_by_skill(role):
+    """
+    Users who teach (or learn) a skill, best proficiency first, then by
+    name. Pages are keyset-paginated on (proficiency, name, id).
+
+    A skill_id lookup follows the skill taxonomy (utils/skill_taxonomy.py):
+    teachers of Web Development include teachers of JavaScript, and
+    learners of JavaScript include learners of Web Development. Each user
+    is listed once, with their best matching skill in skill_id/skill_name.
+    skill_ids lookups match exactly.
+
+    Query params:
+        skill_id: one skill, paginated with cursor
+        expand: 0 to match skill_id exactly, without the taxonomy
+        skill_ids: comma-separated skills, first page of each in one query
+        cursor: next_cursor from the previous page, with skill_id (a
+            skill_ids group's cursor pages that skill exactly, as expand=0)
+        limit: page size, defaults to MATCHES_PAGE_SIZE
+        near or lat & lon, radius_km: only users within radius_km
+            (default DEFAULT_RADIUS_KM) of a place or point, see utils/geo.py
+        slots, min_overlap: only users free at least min_overlap (default 1)
+            of the hours in slots, a weekly mask (see utils/availability.py)
+    """
+    flag = MATCH_ROLES[role]
+    try:
+        skill_id = request.args.get("skill_id")
+        skill_ids = request.args.get("skill_ids")
 
-        return jsonify({"teachers": teachers_list}), 200
+        if not skill_id and not skill_ids:
+            return jsonify({"error": "skill_id or skill_ids parameter is required"}), 400
 
-    except Exception as e:
-        return jsonify({"error": f"Failed to find teachers: {str(e)}"}), 500
-    finally:
         try:
-            if "db" in locals():
-                db.close()
-        except:
-            pass
-
+            limit = min(
+                int(request.args.get("limit", MATCHES_PAGE_SIZE)), MAX_MATCHES_PAGE_SIZE
+            )
+            if limit < 1:
+                raise ValueError
+            if skill_ids:
+                skill_ids = list(dict.fromkeys(int(v) for v in skill_ids.split(",") if v.strip()))
+                if not skill_ids or len(skill_ids) > MAX_BATCH_SKILLS:
+                    raise ValueError
+            else:
+                skill_id = int(skill_id)
+            expand = request.args.get("expand")
+            if expand is not None:
+                expand = expand.lower() not in ("0", "false")
+            cursor = request.args.get("cursor")
+            if cursor:
+                ordinal, user_id, cursor_expand, name = cursor.split("|", 3)
+                cursor = {"proficiency_ordinal": int(ordinal), "id": int(user_id), "full_name": name}
+                cursor_expand = cursor_expand == "1"
+                # Continuing a page in the other mode would skip or repeat users
+                if expand is not None and expand != cursor_expand:
+                    raise ValueError
+                expand = cursor_expand
+        except ValueError:
+            return jsonify({"error": "Invalid skill_ids, cursor or limit parameter"}), 400
 
-@matching_bp.route("/find-learners", methods=["GET"])
-def find_learners():
-    """Find users who want to learn a specific skill"""
-    try:
-        skill_id = request.args.get("skill_id")
+        try:
+            radius = radius_filter_from_args(request.args)
+            overlap = overlap_filter_from_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        if not skill_id:
-            return jsonify({"error": "skill_id parameter is required"}), 400
+        filter_condition, filter_params = _sql_filters(radius, overlap)
+        keep = _row_filter(radius, overlap)
 
         db = get_db()
 
-        # Find learners for this skill
-        result = db.execute(
-            text(
+        if skill_ids:
+            # One LIMITed select per skill, so each costs no more than a
+            # single-skill page however many users have it
+            selects, params = [], {**filter_params, "limit": limit}
+            for i, sid in enumerate(skill_ids):
+                params[f"s{i}"] = sid
+                selects.append(
+                    f"""
+                SELECT * FROM (
+                    SELECT {MATCH_COLUMNS}
+                    FROM user_skills us
+                    JOIN users u ON u.id = us.user_id
+                    JOIN skills s ON s.id = us.skill_id
+                    WHERE us.skill_id = :s{i} AND us.{flag} = 1 AND {filter_condition}
+                    ORDER BY {MATCH_ORDER}
+                    LIMIT :limit
+                ) AS g{i}
+            """
+                )
+            result = db.execute(
+                text(
+                    f"""
+                SELECT * FROM ({" UNION ALL ".join(selects)}) AS grouped
+                ORDER BY skill_id, proficiency_ordinal DESC, full_name, id
+            """
+                ),
+                params,
+            )
+
+            by_skill = {sid: [] for sid in skill_ids}
+            for row in result:
+                row_dict = dict(row._mapping)
+                by_skill[row_dict["skill_id"]].append(row_dict)
+
+            groups = []
+            for sid in skill_ids:
+                scanned = by_skill[sid]
+                rows = [row for row in scanned if keep(row)]
+                # Paged on what was scanned, so a short page can still have more
+                next_cursor = _match_cursor(scanned[-1], False) if len(scanned) == limit else None
+                groups.append(
+                    {
+                        "skill_id": sid,
+                        role: _present(rows),
+                        "next_cursor": next_cursor,
+                        "total_estimate": (
+                            None if radius or overlap else _count_estimate([sid], role)
+                        ),
+                    }
+                )
+            return jsonify({"groups": groups}), 200
+
+        if expand is None:
+            expand = True
+        related = _related_skills(skill_id, role) if expand else [skill_id]
+        # Relatives need the closure; the cached taxonomy says so without a query
+        expanded = len(related) > 1
+
+        def fetch(after):
+            after = after or cursor
+            if expanded:
+                return _expanded_page(
+                    db, role, skill_id, related, after, limit, filter_condition, filter_params
+                )
+
+            params = {"skill_id": skill_id, "limit": limit, **filter_params}
+            keyset = ""
+            if after:
+                # Rows strictly after `after` in (proficiency DESC, name, id) order
+                keyset = f"""
+                    AND ({PROFICIENCY_ORDINAL_SQL} < :ordinal
+                         OR ({PROFICIENCY_ORDINAL_SQL} = :ordinal AND u.full_name > :name)
+                         OR ({PROFICIENCY_ORDINAL_SQL} = :ordinal AND u.full_name = :name
+                             AND u.id > :user_id))
                 """
-            SELECT DISTINCT
-                u.id, u.full_name, u.bio, u.profile_picture, u.location, u.availability,
-                us.proficiency_level,
-                s.name as skill_name, s.category
-            FROM users u
-            JOIN user_skills us ON u.id = us.user_id
-            JOIN skills s ON us.skill_id = s.id
-            WHERE us.skill_id = :skill_id AND us.is_learning = 1
-            ORDER BY u.full_name
-        """
+                params.update(
+                    {
+                        "ordinal": after["proficiency_ordinal"],
+                        "name": after["full_name"],
+                        "user_id": after["id"],
+                    }
+                )
+
+            query = f"""
+                SELECT {MATCH_COLUMNS}
+                FROM user_skills us
+                JOIN users u ON u.id = us.user_id
+                JOIN skills s ON s.id = us.skill_id
+                WHERE us.skill_id = :skill_id AND us.{flag} = 1 AND {filter_condition} {keyset}
+                ORDER BY {MATCH_ORDER}
+                LIMIT :limit
+            """
+            return [dict(row._mapping) for row in db.execute(text(query), params)]
+
+        rows, last = filtered_page(fetch, lambda row: not row.get("skipped") and keep(row), limit)
+
+        return (
+            jsonify(
+                {
+                    role: _present(rows),
+                    "next_cursor": _match_cursor(last, expand) if last else None,
+                    "total_estimate": (
+                        None if radius or overlap else _count_estimate(related, role)
+                    ),
+                }
             ),
-            {"skill_id": skill_id},
+            200,
         )
-        learners = result.fetchall()
-
-        # Process profile pictures
-        learners_list = []
-        for learner in learners:
-            learner_dict = dict(learner._mapping)
-            learner_dict["profile_picture"] = get_profile_picture_url(
-                learner_dict["profile_picture"], learner_dict["full_name"]
-            )
-            learners_list.append(learner_dict)
-
-        return jsonify({"learners": learners_list}), 200
 
     except Exception as e:
-        return jsonify({"error": f"Failed to find learners: {str(e)}"}), 500
+        return jsonify({"error": f"Failed to find {role}: {str(e)}"}), 500
     finally:
         try:
             if "db" in locals():
@@ -108,74 +378,126 @@ def find_learners():
             pass
 
 
+@matching_bp.route("/find-teachers", methods=["GET"])
+def find_teachers():
+    """Find users who teach a specific skill (see _find_by_skill)"""
+    return _find_by_skill("teachers")
+
+
+@matching_bp.route("/find-learners", methods=["GET"])
+def find_learners():
+    """Find users who want to learn a specific skill (see _find_by_skill)"""
+    return _find_by_skill("learners")
+
+
 @matching_bp.route("/search-users", methods=["GET"])
 def search_users():
-    """Search users by name or location"""
+    """Search users by name, bio or location
+
+    Ranked by relevance through the people_search index (or the in-process
+    fallback, see utils/people_search.py). A query containing "@" is an
+    exact email lookup instead.
+
+    Query params:
+        q: words to find in name, bio or location (each matched as a prefix)
+        location: words that must match the location
+        near or lat & lon, radius_km: only users within radius_km of a
+            place or point, see utils/geo.py
+        cursor: next_cursor from the previous page
+        limit: page size, defaults to 20
+    """
     db = None
     try:
         query = request.args.get("q", "").strip()
         location = request.args.get("location", "").strip()
         limit = min(int(request.args.get("limit", 20)), 100)
+        if limit < 1:
+            raise ValueError
+        cursor = request.args.get("cursor")
+        cursor = parse_cursor(cursor) if cursor else None
 
-        if not query and not location:
-            return jsonify({"error": "Search query or location is required"}), 400
-
-        db = get_db()
-
-        # Build dynamic query
-        where_conditions = []
-        params = {}
+        terms = [] if "@" in query else search_terms(query)
+        location_terms = search_terms(location)
 
-        if query:
-            where_conditions.append("(u.full_name LIKE :query OR u.email LIKE :query)")
-            params["query"] = f"%{query}%"
+        if not terms and not location_terms and "@" not in query:
+            return jsonify({"error": "Search query or location is required"}), 400
 
-        if location:
-            where_conditions.append("u.location LIKE :location")
-            params["location"] = f"%{location}%"
+        try:
+            radius = radius_filter_from_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
+        db = get_db()
 
-        # Find users
-        result = db.execute(
-            text(
-                f"""
-            SELECT DISTINCT
-                u.id, u.full_name, u.email, u.bio, u.profile_picture, u.location,
-                u.availability, u.created_at,
-                (SELECT COUNT(*) FROM reviews WHERE reviewed_id = u.id) as review_count,
-                (SELECT AVG(rating) FROM reviews WHERE reviewed_id = u.id) as avg_rating
-            FROM users u
-            WHERE {where_clause}
-            ORDER BY u.created_at DESC
-            LIMIT :limit
-        """
-            ),
-            {**params, "limit": limit},
+        def fetch(after):
+            position = (after["relevance"], after["id"]) if after else cursor
+            if "@" in query:
+                if position:
+                    return []
+                result = db.execute(
+                    text("SELECT id FROM users WHERE email = :email"), {"email": query}
+                )
+                page = [(row[0], 0.0) for row in result]
+            elif fulltext_available("people_search"):
+                geo = radius.sql() if radius else None
+                page = search_people(db, terms, location_terms, position, limit, geo)
+            else:
+                page = people_index.search(terms, location_terms, position, limit)
+            if not page:
+                return []
+
+            placeholders, params = build_in_clause("u", [user_id for user_id, _ in page])
+            result = db.execute(
+                text(
+                    f"""
+                SELECT
+                    u.id, u.full_name, u.email, u.bio, u.profile_picture, u.location,
+                    u.availability, u.created_at, u.latitude, u.longitude,
+                    rs.review_count, rs.rating_sum, rs.bayesian_score as rating_score
+                FROM users u
+                LEFT JOIN user_rating_stats rs ON rs.user_id = u.id
+                WHERE u.id IN ({placeholders})
+            """
+                ),
+                params,
+            )
+            users_by_id = {row._mapping["id"]: dict(row._mapping) for row in result}
+
+            # In relevance order; users deleted since they were indexed keep
+            # their place, so the page is still paginated on what was scanned
+            rows = []
+            for user_id, score in page:
+                user_dict = users_by_id.get(user_id) or {"id": user_id, "deleted": True}
+                user_dict["relevance"] = score
+                rows.append(user_dict)
+            return rows
+
+        within = _row_filter(radius)
+        page, last = filtered_page(
+            fetch, lambda user_dict: not user_dict.get("deleted") and within(user_dict), limit
         )
 
-        users = result.fetchall()
-
-        # Process results
         users_list = []
-        for user in users:
-            user_dict = dict(user._mapping)
-            user_dict["profile_picture"] = get_profile_picture_url(
-                user_dict["profile_picture"], user_dict["full_name"]
-            )
-            # Handle null ratings
-            user_dict["avg_rating"] = (
-                float(user_dict["avg_rating"]) if user_dict["avg_rating"] else 0
-            )
-            user_dict["review_count"] = (
-                int(user_dict["review_count"]) if user_dict["review_count"] else 0
-            )
+        for user_dict in _present(page):
+            # Users without reviews have no user_rating_stats row
+            review_count = int(user_dict["review_count"] or 0)
+            rating_sum = user_dict.pop("rating_sum") or 0
+            user_dict["review_count"] = review_count
+            user_dict["avg_rating"] = rating_sum / review_count if review_count else 0
+            user_dict["rating_score"] = float(user_dict["rating_score"] or PRIOR_RATING)
             users_list.append(user_dict)
 
-        return jsonify({"users": users_list, "count": len(users_list)}), 200
+        next_cursor = make_cursor(last["relevance"], last["id"]) if last else None
+
+        return (
+            jsonify(
+                {"users": users_list, "count": len(users_list), "next_cursor": next_cursor}
+            ),
+            200,
+        )
 
     except ValueError:
-        return jsonify({"error": "Invalid limit parameter"}), 400
+        return jsonify({"error": "Invalid limit or cursor parameter"}), 400
     except Exception as e:
         return jsonify({"error": f"Failed to search users: {str(e)}"}), 500
     finally:
@@ -188,81 +510,314 @@ def search_users():
 
 @matching_bp.route("/recommendations", methods=["GET"])
 def get_recommendations():
-    """Get personalized recommendations for a user"""
+    """Get personalized recommendations for a user
+
+    Teachers of the skills the user wants to learn, best score first, read
+    from the precomputed recommendation_scores table.
+
+    Query params (all optional):
+        cursor: next_cursor from the previous page
+        limit: page size, defaults to RECOMMENDATIONS_PAGE_SIZE
+        radius_km: only teachers within radius_km of the user's own
+            location, or of near / lat & lon when given (see utils/geo.py)
+        min_overlap: only teachers free at least this many of the user's
+            available hours (or of slots when given, see utils/availability.py)
+
+    Results carry overlap_hours when the user has set an availability.
+    pending is true while the user's latest changes await a score refresh.
+    """
     from utils import token_required
 
     @token_required
     def _get_recommendations(current_user):
         try:
             user_id = current_user["user_id"]
+
+            try:
+                limit = min(
+                    int(request.args.get("limit", RECOMMENDATIONS_PAGE_SIZE)),
+                    MAX_RECOMMENDATIONS_PAGE_SIZE,
+                )
+                if limit < 1:
+                    raise ValueError
+                cursor = request.args.get("cursor")
+                if cursor:
+                    score, teacher_id, skill_id = (int(v) for v in cursor.split("|"))
+                    cursor = {"score": score, "id": teacher_id, "skill_id": skill_id}
+            except ValueError:
+                return jsonify({"error": "Invalid cursor or limit parameter"}), 400
+
             db = get_db()
 
-            # Get skills the user wants to learn
-            result = db.execute(
+            own = db.execute(
                 text(
                     """
-                SELECT skill_id FROM user_skills
-                WHERE user_id = :user_id AND is_learning = 1
+                SELECT latitude, longitude, availability_slots, scores_stale_at
+                FROM users WHERE id = :user_id
             """
                 ),
                 {"user_id": user_id},
+            ).fetchone()
+            # The user's scores await a background refresh (utils/recommendation_scores.py)
+            pending = bool(own and own[3] is not None)
+            default_origin = (own[0], own[1]) if own and own[0] is not None else None
+            own_mask = decode_mask(own[2]) if own else 0
+            try:
+                radius = radius_filter_from_args(request.args, default_origin)
+                overlap = overlap_filter_from_args(request.args, own_mask)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if overlap is None and own_mask:
+                # No filtering, only overlap_hours on every result
+                overlap = OverlapFilter(own_mask, min_hours=0)
+            filter_condition, filter_params = _sql_filters(radius, overlap)
+
+            def fetch(after):
+                params = {"user_id": user_id, "limit": limit, **filter_params}
+                keyset = ""
+                after = after or cursor
+                if after:
+                    # Rows strictly after `after` in (score, teacher_id, skill_id) DESC order
+                    keyset = """
+                        AND (rs.score < :score
+                             OR (rs.score = :score AND rs.teacher_id < :teacher_id)
+                             OR (rs.score = :score AND rs.teacher_id = :teacher_id
+                                 AND rs.skill_id < :skill_id))
+                    """
+                    params.update(
+                        {
+                            "score": after["score"],
+                            "teacher_id": after["id"],
+                            "skill_id": after["skill_id"],
+                        }
+                    )
+
+                query = f"""
+                    SELECT
+                        u.id, u.full_name, u.bio, u.profile_picture, u.location,
+                        u.latitude, u.longitude, u.availability_slots,
+                        s.id as skill_id, s.name as skill_name, s.category,
+                        us.proficiency_level, rs.score
+                    FROM recommendation_scores rs
+                    JOIN users u ON u.id = rs.teacher_id
+                    JOIN skills s ON s.id = rs.skill_id
+                    JOIN user_skills us ON us.user_id = rs.teacher_id AND us.skill_id = rs.skill_id
+                    WHERE rs.learner_id = :user_id AND {filter_condition} {keyset}
+                    ORDER BY rs.score DESC, rs.teacher_id DESC, rs.skill_id DESC
+                    LIMIT :limit
+                """
+                return [dict(row._mapping) for row in db.execute(text(query), params)]
+
+            recommendations_list, last = filtered_page(
+                fetch, _row_filter(radius, overlap), limit
+            )
+
+            next_cursor = None
+            if last:
+                next_cursor = f"{last['score']}|{last['id']}|{last['skill_id']}"
+
+            return (
+                jsonify(
+                    {
+                        "recommendations": _present(recommendations_list),
+                        "next_cursor": next_cursor,
+                        # Changes not reflected yet; ask again shortly
+                        "pending": pending,
+                    }
+                ),
+                200,
             )
-            learning_skills = result.fetchall()
 
-            if not learning_skills:
-                return jsonify({"recommendations": []}), 200
+        except Exception as e:
+            return jsonify({"error": f"Failed to get recommendations: {str(e)}"}), 500
+        finally:
+            try:
+                if "db" in locals():
+                    db.close()
+            except:
+                pass
+
+    return _get_recommendations()
 
-            skill_ids = [skill._mapping["skill_id"] for skill in learning_skills]
 
-            # Build dynamic placeholders for IN clause
-            # :s0, :s1, :s2...
-            params = {"user_id": user_id}
-            placeholders = []
+@matching_bp.route("/mutual", methods=["GET"])
+@token_required
+def get_mutual_matches(current_user):
+    """Find swap partners: they teach what I want to learn and want to learn what I teach
 
-            for i, sid in enumerate(skill_ids):
-                param_name = f"s{i}"
-                placeholders.append(f":{param_name}")
-                params[param_name] = sid
+    Ranked by the number of overlapping skills in both directions, computed
+    on the in-memory skill index (utils/skill_index.py) and following the
+    skill taxonomy like find-teachers / find-learners.
+    """
+    db = None
+    try:
+        user_id = current_user["user_id"]
+        limit = min(int(request.args.get("limit", 20)), 100)
+        if limit < 1:
+            raise ValueError
 
-            placeholder_str = ", ".join(placeholders)
+        matches = skill_index.mutual_matches(
+            user_id, limit, taxonomy=skill_catalog.snapshot().taxonomy
+        )
+        if not matches:
+            return jsonify({"matches": []}), 200
 
-            # Find teachers for these skills
-            query = f"""
-                SELECT DISTINCT
-                    u.id, u.full_name, u.bio, u.profile_picture, u.location,
-                    s.id as skill_id, s.name as skill_name, s.category,
-                    us.proficiency_level
-                FROM users u
-                JOIN user_skills us ON u.id = us.user_id
-                JOIN skills s ON us.skill_id = s.id
-                WHERE us.skill_id IN ({placeholder_str})
-                AND us.is_teaching = 1
-                AND u.id != :user_id
-                ORDER BY us.proficiency_level DESC, u.full_name
-                LIMIT 20
-            """
+        user_ids = [other_id for other_id, _, _ in matches]
+        skill_ids = set()
+        for _, they_teach, they_learn in matches:
+            skill_ids |= they_teach | they_learn
 
-            result = db.execute(text(query), params)
-            recommendations = result.fetchall()
+        db = get_db()
 
-            # Process profile pictures
-            recommendations_list = []
-            for rec in recommendations:
-                rec_dict = dict(rec._mapping)
-                rec_dict["profile_picture"] = get_profile_picture_url(
-                    rec_dict["profile_picture"], rec_dict["full_name"]
-                )
-                recommendations_list.append(rec_dict)
+        user_placeholders, user_params = build_in_clause("u", user_ids)
+        result = db.execute(
+            text(
+                f"""
+            SELECT id, full_name, bio, profile_picture, location, availability
+            FROM users WHERE id IN ({user_placeholders})
+        """
+            ),
+            user_params,
+        )
+        users = {row._mapping["id"]: dict(row._mapping) for row in result}
+
+        skill_placeholders, skill_params = build_in_clause("s", list(skill_ids))
+        result = db.execute(
+            text(
+                f"SELECT id, name, category FROM skills WHERE id IN ({skill_placeholders})"
+            ),
+            skill_params,
+        )
+        skills = {row._mapping["id"]: dict(row._mapping) for row in result}
 
-            return jsonify({"recommendations": recommendations_list}), 200
+        matches_list = []
+        for other_id, they_teach, they_learn in matches:
+            user_dict = users.get(other_id)
+            if not user_dict:
+                continue  # deleted since the index was loaded
+            user_dict["profile_picture"] = get_profile_picture_url(
+                user_dict["profile_picture"], user_dict["full_name"]
+            )
+            user_dict["they_teach"] = [skills[s] for s in sorted(they_teach) if s in skills]
+            user_dict["they_learn"] = [skills[s] for s in sorted(they_learn) if s in skills]
+            user_dict["match_score"] = len(they_teach) + len(they_learn)
+            matches_list.append(user_dict)
 
-        except Exception as e:
-            return jsonify({"error": f"Failed to get recommendations: {str(e)}"}), 500
-        finally:
+        return jsonify({"matches": matches_list}), 200
+
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to find mutual matches: {str(e)}"}), 500
+    finally:
+        if db:
             try:
-                if "db" in locals():
-                    db.close()
+                db.close()
             except:
                 pass
 
-    return _get_recommendations()
+
+@matching_bp.route("/similar-users", methods=["GET"])
+@token_required
+def get_similar_users(current_user):
+    """Users with the most similar teach/learn skill profile ("users like you")
+
+    Precomputed by database/build_similarity.py.
+    """
+    db = None
+    try:
+        user_id = current_user["user_id"]
+        limit = min(int(request.args.get("limit", 10)), 50)
+        if limit < 1:
+            raise ValueError
+
+        db = get_db()
+        result = db.execute(
+            text(
+                """
+            SELECT u.id, u.full_name, u.bio, u.profile_picture, u.location, su.similarity
+            FROM similar_users su
+            JOIN users u ON u.id = su.similar_user_id
+            WHERE su.user_id = :user_id
+            ORDER BY su.ordinal
+            LIMIT :limit
+        """
+            ),
+            {"user_id": user_id, "limit": limit},
+        )
+
+        users_list = []
+        for row in result:
+            user_dict = dict(row._mapping)
+            user_dict["profile_picture"] = get_profile_picture_url(
+                user_dict["profile_picture"], user_dict["full_name"]
+            )
+            user_dict["similarity"] = float(user_dict["similarity"])
+            users_list.append(user_dict)
+
+        return jsonify({"users": users_list}), 200
+
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to get similar users: {str(e)}"}), 500
+    finally:
+        if db:
+            try:
+                db.close()
+            except:
+                pass
+
+
+@matching_bp.route("/suggested-skills", methods=["GET"])
+@token_required
+def get_suggested_skills(current_user):
+    """Skills popular among similar users that the user doesn't have yet
+
+    Precomputed by database/build_similarity.py.
+    """
+    db = None
+    try:
+        user_id = current_user["user_id"]
+        limit = min(int(request.args.get("limit", 10)), 50)
+        if limit < 1:
+            raise ValueError
+
+        db = get_db()
+        # Skills added since the last build are filtered out here
+        result = db.execute(
+            text(
+                """
+            SELECT s.id, s.name, s.category, s.description, ss.score
+            FROM suggested_skills ss
+            JOIN skills s ON s.id = ss.skill_id
+            WHERE ss.user_id = :user_id
+            AND NOT EXISTS (
+                SELECT 1 FROM user_skills us
+                WHERE us.user_id = ss.user_id AND us.skill_id = ss.skill_id
+            )
+            ORDER BY ss.ordinal
+            LIMIT :limit
+        """
+            ),
+            {"user_id": user_id, "limit": limit},
+        )
+
+        skills_list = []
+        for row in result:
+            skill_dict = dict(row._mapping)
+            skill_dict["score"] = float(skill_dict["score"])
+            skills_list.append(skill_dict)
+
+        return jsonify({"skills": skills_list}), 200
+
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+    except Exception as e:
+        return jsonify({"error": f"Failed to get suggested skills: {str(e)}"}), 500
+    finally:
+        if db:
+            try:
+                db.close()
+            except:
+                pass
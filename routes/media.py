@@ -0,0 +1,68 @@
+from flask import Blueprint, Response, request, jsonify, send_file
+from extensions import image_pipeline, limiter
+from utils.image_pipeline import AVATAR_KEY_RE, VARIANT_FORMATS
+from utils.initials_avatar import render_initials_svg
+from utils.profile_helper import AVATAR_SIZES
+
+media_bp = Blueprint("media", __name__, url_prefix="/media")
+
+# Keys are content hashes, so a variant's URL always gives the same bytes
+AVATAR_MAX_AGE = 365 * 86400
+
+
+def _accepts_webp():
+    # Explicitly listed: */* alone doesn't say the client can decode it
+    return any(
+        mimetype == "image/webp" and quality > 0 for mimetype, quality in request.accept_mimetypes
+    )
+
+
+@media_bp.route("/avatars/<key>/<int:size>", methods=["GET"])
+@limiter.exempt
+def get_avatar(key, size):
+    """A processed profile picture: WebP when the client accepts it, else JPEG
+
+    Cacheable forever, with a strong ETag naming the variant, and
+    answering If-None-Match / If-Modified-Since and Range requests.
+    """
+    if not AVATAR_KEY_RE.fullmatch(key) or size not in AVATAR_SIZES:
+        return jsonify({"error": "Avatar not found"}), 404
+
+    try:
+        # Rendered here only when the background worker hasn't got to it yet
+        if not image_pipeline.ensure(key):
+            return jsonify({"error": "Avatar not found"}), 404
+
+        extension = "webp" if _accepts_webp() else "jpg"
+        response = send_file(
+            image_pipeline.variant_path(key, size, extension),
+            mimetype=VARIANT_FORMATS[extension][1],
+            conditional=True,
+            etag=f"{key}-{size}-{extension}",
+            max_age=AVATAR_MAX_AGE,
+        )
+        response.cache_control.immutable = True
+        response.vary.add("Accept")
+        return response
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to load avatar: {str(e)}"}), 500
+
+
+@media_bp.route("/initials/<initials>/<int:color>.svg", methods=["GET"])
+@limiter.exempt
+def get_initials_avatar(initials, color):
+    """Avatar of a user without a picture: their initials on a colour (see get_initials_avatar_url)"""
+    try:
+        body, etag = render_initials_svg(initials, color)
+    except ValueError:
+        return jsonify({"error": "Avatar not found"}), 404
+
+    response = Response(body, mimetype="image/svg+xml")
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = AVATAR_MAX_AGE
+    response.cache_control.immutable = True
+    # Shown through <img>, but opened directly it mustn't run anything
+    response.headers["Content-Security-Policy"] = "default-src 'none'"
+    return response.make_conditional(request)
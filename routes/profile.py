@@ -6,22 +6,62 @@ from utils import (
     get_profile_picture_url,
     validate_skill_name,
 )
+from extensions import skill_index, people_index, image_pipeline, score_refresher
+from utils.availability import (
+    encode_mask,
+    decode_mask,
+    parse_schedule,
+    parse_utc_offset,
+    schedule_from_mask,
+)
+from utils.geo import location_columns
+from utils.people_search import person_changed
+from utils.rating_stats import get_rating_stats
+from utils.recommendation_scores import mark_stale
+from utils.skill_stats import record_user_skill_change
 from sqlalchemy import text
-import os
-import uuid
-from werkzeug.utils import secure_filename
+import json
+from utils.image_pipeline import acquire_avatar, avatar_key, release_avatar
+from utils.profile_helper import AVATAR_URL_PREFIX
 
 profile_bp = Blueprint("profile", __name__, url_prefix="/api/profile")
 
+# The profile pages show a 150px picture, so twice that for dense screens
+PROFILE_PICTURE_SIZE = 300
+
 
 def _allowed_file(filename):
     """Check if file is allowed"""
     ALLOWED_EXTENSIONS = current_app.config.get(
-        "ALLOWED_EXTENSIONS", {"png", "jpg", "jpeg", "gif"}
+        "ALLOWED_EXTENSIONS", {"png", "jpg", "jpeg", "gif", "webp"}
     )
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _availability_fields(user_dict):
+    """Structured availability for API responses: local schedule plus the raw UTC mask"""
+    utc_offset = user_dict["utc_offset"] or 0
+    slots = user_dict["availability_slots"]
+    return {
+        "availability_schedule": schedule_from_mask(decode_mask(slots), utc_offset),
+        "availability_slots": slots,
+        "utc_offset": utc_offset,
+    }
+
+
+def _skills_changed(db, user_id):
+    """
+    Queue refreshes of what is derived from a user's skills, in the
+    caller's transaction; wake score_refresher once it has committed.
+    """
+    mark_stale(db, user_id)
+    # Picked up by database/build_similarity.py --changed-only
+    db.execute(
+        text("UPDATE users SET skills_updated_at = CURRENT_TIMESTAMP WHERE id = :id"),
+        {"id": user_id},
+    )
+
+
 @profile_bp.route("/<int:user_id>", methods=["GET"])
 def get_profile(user_id):
     """Get user profile by ID"""
@@ -33,7 +73,8 @@ def get_profile(user_id):
         result = db.execute(
             text(
                 """
-                SELECT id, email, full_name, bio, profile_picture, location, availability, created_at
+                SELECT id, email, full_name, bio, profile_picture, location, availability,
+                    availability_slots, utc_offset, created_at
                 FROM users WHERE id = :id
             """
             ),
@@ -78,7 +119,7 @@ def get_profile(user_id):
 
         # Process profile picture URL
         profile_pic = get_profile_picture_url(
-            user_dict["profile_picture"], user_dict["full_name"]
+            user_dict["profile_picture"], user_dict["full_name"], PROFILE_PICTURE_SIZE
         )
 
         return (
@@ -92,10 +133,12 @@ def get_profile(user_id):
                         "profile_picture": profile_pic,
                         "location": user_dict["location"],
                         "availability": user_dict["availability"],
+                        **_availability_fields(user_dict),
                         "created_at": user_dict["created_at"],
                     },
                     "teaching_skills": teaching_skills,
                     "learning_skills": learning_skills,
+                    "rating": get_rating_stats(db, user_id),
                 }
             ),
             200,
@@ -114,7 +157,12 @@ def get_profile(user_id):
 @profile_bp.route("/update", methods=["PUT"])
 @token_required
 def update_profile(current_user):
-    """Update user profile (requires authentication)"""
+    """Update user profile (requires authentication)
+
+    availability_schedule (with utc_offset) is the structured weekly
+    availability, e.g. {"mon": ["09-12", "18-21"]} in local hours; see
+    utils/availability.py. It is a JSON string in form data.
+    """
     db = None
     try:
         user_id = current_user["user_id"]
@@ -126,14 +174,24 @@ def update_profile(current_user):
             bio = sanitize_input(data.get("bio"))
             location = sanitize_input(data.get("location"))
             availability = sanitize_input(data.get("availability"))
+            schedule = data.get("availability_schedule")
+            utc_offset = data.get("utc_offset")
         else:
             full_name = sanitize_input(request.form.get("full_name"))
             bio = sanitize_input(request.form.get("bio"))
             location = sanitize_input(request.form.get("location"))
             availability = sanitize_input(request.form.get("availability"))
+            schedule = request.form.get("availability_schedule")
+            utc_offset = request.form.get("utc_offset")
+            if schedule:
+                try:
+                    schedule = json.loads(schedule)
+                except ValueError:
+                    return jsonify({"error": "availability_schedule must be JSON"}), 400
 
         update_fields = []
         params = {"id": user_id}
+        picture_key = None
 
         # Handle profile picture upload
         if "profile_picture" in request.files:
@@ -143,36 +201,18 @@ def update_profile(current_user):
                     return (
                         jsonify(
                             {
-                                "error": "File type not allowed. Only PNG, JPG, JPEG, and GIF are allowed"
+                                "error": "File type not allowed. Only PNG, JPG, JPEG, GIF and WebP are allowed"
                             }
                         ),
                         400,
                     )
 
+                # Validated and staged here, resized and stripped of
+                # metadata in the background (see utils/image_pipeline.py)
                 try:
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{uuid.uuid4().hex}_{filename}"
-
-                    # Create upload directory if it doesn't exist
-                    upload_folder = current_app.config.get(
-                        "UPLOAD_FOLDER", "static/uploads"
-                    )
-                    profile_pics_folder = os.path.join(upload_folder, "profile_pics")
-
-                    if not os.path.exists(profile_pics_folder):
-                        os.makedirs(profile_pics_folder)
-
-                    # Save file with absolute path
-                    file_path = os.path.join(profile_pics_folder, unique_filename)
-                    file.save(file_path)
-
-                    # Store relative path in database
-                    db_path = f"{profile_pics_folder}/{unique_filename}".replace(
-                        "\\", "/"
-                    )
-                    update_fields.append("profile_picture = :profile_picture")
-                    params["profile_picture"] = db_path
-
+                    key = image_pipeline.stage(file)
+                except ValueError as e:
+                    return jsonify({"error": str(e)}), 400
                 except Exception as file_error:
                     return (
                         jsonify(
@@ -182,6 +222,9 @@ def update_profile(current_user):
                         ),
                         500,
                     )
+                picture_key = key
+                update_fields.append("profile_picture = :profile_picture")
+                params["profile_picture"] = f"{AVATAR_URL_PREFIX}{key}"
 
         # Add other fields to update
         if full_name:
@@ -195,26 +238,66 @@ def update_profile(current_user):
         if location:
             update_fields.append("location = :location")
             params["location"] = location
+            # Coordinates for radius queries, cleared if the place is unknown
+            for column, value in location_columns(location).items():
+                update_fields.append(f"{column} = :{column}")
+                params[column] = value
 
         if availability:
             update_fields.append("availability = :availability")
             params["availability"] = availability
 
+        if schedule is not None:
+            try:
+                utc_offset = parse_utc_offset(utc_offset)
+                mask = parse_schedule(schedule, utc_offset)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            update_fields.append("availability_slots = :availability_slots")
+            update_fields.append("utc_offset = :utc_offset")
+            # An empty schedule clears it
+            params["availability_slots"] = encode_mask(mask) if mask else None
+            params["utc_offset"] = utc_offset
+
         if not update_fields:
             return jsonify({"error": "No fields to update"}), 400
 
         db = get_db()
         try:
+            if picture_key:
+                previous = db.execute(
+                    text("SELECT profile_picture FROM users WHERE id = :id"), {"id": user_id}
+                ).scalar()
+                previous_key = avatar_key(previous)
+                if previous_key != picture_key:
+                    # Avatars nobody shows any more are collected later
+                    acquire_avatar(db, picture_key)
+                    if previous_key:
+                        release_avatar(db, previous_key)
+
             # Update user
             query = f"UPDATE users SET {', '.join(update_fields)} WHERE id = :id"
             db.execute(text(query), params)
+            scores_stale = bool(location) or schedule is not None
+            if scores_stale:
+                # Location and availability overlap are recommendation signals
+                mark_stale(db, user_id)
+            person = person_changed(db, user_id)
             db.commit()
+            people_index.update(user_id, *person)
+            if scores_stale:
+                score_refresher.wake()
+            if picture_key:
+                # Only now: rendering drops the staged copy once the variants
+                # are in place, which is safe while the key is referenced
+                image_pipeline.submit(picture_key)
 
             # Fetch updated user
             result = db.execute(
                 text(
                     """
-                    SELECT id, email, full_name, bio, profile_picture, location, availability
+                    SELECT id, email, full_name, bio, profile_picture, location, availability,
+                        availability_slots, utc_offset
                     FROM users WHERE id = :id
                 """
                 ),
@@ -239,9 +322,11 @@ def update_profile(current_user):
                             "profile_picture": get_profile_picture_url(
                                 updated_dict["profile_picture"],
                                 updated_dict["full_name"],
+                                PROFILE_PICTURE_SIZE,
                             ),
                             "location": updated_dict["location"],
                             "availability": updated_dict["availability"],
+                            **_availability_fields(updated_dict),
                         },
                     }
                 ),
@@ -312,7 +397,10 @@ def add_skill(current_user):
             # Check if user already has this skill
             result = db.execute(
                 text(
-                    "SELECT id FROM user_skills WHERE user_id = :user_id AND skill_id = :skill_id"
+                    """
+                SELECT proficiency_level, is_teaching, is_learning FROM user_skills
+                WHERE user_id = :user_id AND skill_id = :skill_id
+            """
                 ),
                 {"user_id": user_id, "skill_id": skill_id},
             )
@@ -354,7 +442,16 @@ def add_skill(current_user):
                     },
                 )
 
+            record_user_skill_change(
+                db,
+                skill_id,
+                tuple(existing) if existing else None,
+                (proficiency_level, is_teaching, is_learning),
+            )
+            _skills_changed(db, user_id)
             db.commit()
+            skill_index.update(user_id, skill_id, is_teaching, is_learning)
+            score_refresher.wake()
 
             return jsonify({"message": "Skill added successfully"}), 201
 
@@ -385,11 +482,15 @@ def remove_skill(current_user, skill_id):
         # Verify the skill exists for this user
         result = db.execute(
             text(
-                "SELECT id FROM user_skills WHERE user_id = :user_id AND skill_id = :skill_id"
+                """
+            SELECT proficiency_level, is_teaching, is_learning FROM user_skills
+            WHERE user_id = :user_id AND skill_id = :skill_id
+        """
             ),
             {"user_id": user_id, "skill_id": skill_id},
         )
-        if not result.fetchone():
+        existing = result.fetchone()
+        if not existing:
             return jsonify({"error": "Skill not found for this user"}), 404
 
         db.execute(
@@ -398,7 +499,11 @@ def remove_skill(current_user, skill_id):
             ),
             {"user_id": user_id, "skill_id": skill_id},
         )
+        record_user_skill_change(db, skill_id, tuple(existing), None)
+        _skills_changed(db, user_id)
         db.commit()
+        skill_index.update(user_id, skill_id)
+        score_refresher.wake()
 
         return jsonify({"message": "Skill removed successfully"}), 200
 
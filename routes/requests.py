@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
-from database.db import get_db
+from database.db import get_db, build_in_clause
 from utils import token_required, sanitize_input, get_profile_picture_url
+from utils.skill_stats import record_swap_request
 from sqlalchemy import text
 
 requests_bp = Blueprint('requests', __name__, url_prefix='/api/requests')
@@ -45,6 +46,7 @@ def create_request(current_user):
             'skill_id': skill_id, 
             'message': message
         })
+        record_swap_request(db, skill_id)
         
         db.commit()
         
@@ -67,7 +69,7 @@ def get_requests(current_user):
         # Incoming requests (others requesting me)
         result = db.execute(text('''
             SELECT 
-                r.id, r.status, r.message, r.created_at,
+                r.id, r.status, r.message, r.ring_id, r.created_at,
                 u.id as sender_id, u.full_name as sender_name, u.profile_picture as sender_pic,
                 s.name as skill_name
             FROM swap_requests r
@@ -81,7 +83,7 @@ def get_requests(current_user):
         # Sent requests (I requested others)
         result = db.execute(text('''
             SELECT 
-                r.id, r.status, r.message, r.created_at,
+                r.id, r.status, r.message, r.ring_id, r.created_at,
                 u.id as receiver_id, u.full_name as receiver_name, u.profile_picture as receiver_pic,
                 s.name as skill_name
             FROM swap_requests r
@@ -165,3 +167,161 @@ def update_status(current_user, request_id):
         return jsonify({'error': f'Failed to update status: {str(e)}'}), 500
     finally:
         db.close()
+
+def _ring_members(db, ring_ids):
+    """Members of each ring in order, keyed by ring id"""
+    members = {ring_id: [] for ring_id in ring_ids}
+    if not ring_ids:
+        return members
+
+    placeholders, params = build_in_clause('r', ring_ids)
+    result = db.execute(text(f'''
+        SELECT m.ring_id, m.ordinal, m.skill_id, s.name as skill_name, m.accepted_at, m.note,
+               u.id as user_id, u.full_name, u.profile_picture
+        FROM swap_ring_members m
+        JOIN users u ON m.user_id = u.id
+        JOIN skills s ON m.skill_id = s.id
+        WHERE m.ring_id IN ({placeholders})
+        ORDER BY m.ring_id, m.ordinal
+    '''), params)
+    for row in result:
+        row_dict = dict(row._mapping)
+        members[row_dict['ring_id']].append({
+            'user_id': row_dict['user_id'],
+            'full_name': row_dict['full_name'],
+            'profile_picture': get_profile_picture_url(row_dict['profile_picture'], row_dict['full_name']),
+            'teaches_skill_id': row_dict['skill_id'],
+            'teaches_skill_name': row_dict['skill_name'],
+            'accepted': row_dict['accepted_at'] is not None,
+            'note': row_dict['note']
+        })
+    return members
+
+@requests_bp.route('/rings', methods=['GET'])
+@token_required
+def get_rings(current_user):
+    """Swap rings (found by database/find_swap_rings.py) the current user is part of"""
+    try:
+        user_id = current_user['user_id']
+        db = get_db()
+
+        result = db.execute(text('''
+            SELECT r.id, r.size, r.status, r.created_at
+            FROM swap_rings r
+            JOIN swap_ring_members m ON m.ring_id = r.id
+            WHERE m.user_id = :user_id
+            ORDER BY r.size, r.id
+        '''), {'user_id': user_id})
+        rings = [dict(row._mapping) for row in result]
+
+        members = _ring_members(db, [ring['id'] for ring in rings])
+        for ring in rings:
+            # Each member teaches the next one, the last one teaches the first
+            ring['members'] = members[ring['id']]
+
+        return jsonify({'rings': rings}), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch swap rings: {str(e)}'}), 500
+    finally:
+        try:
+            if 'db' in locals():
+                db.close()
+        except:
+            pass
+
+@requests_bp.route('/rings/<int:ring_id>', methods=['POST'])
+@token_required
+def request_ring(current_user, ring_id):
+    """
+    Accept a proposed swap ring. Once every member has, it turns into one
+    linked swap request per leg; until then nobody's requests are sent.
+    An optional message goes on the request the caller sends.
+    """
+    try:
+        user_id = current_user['user_id']
+        db = get_db()
+
+        result = db.execute(text('SELECT id, status FROM swap_rings WHERE id = :id'), {'id': ring_id})
+        ring = result.fetchone()
+        if not ring:
+            return jsonify({'error': 'Swap ring not found'}), 404
+        if ring._mapping['status'] != 'proposed':
+            return jsonify({'error': 'Swap ring already requested'}), 409
+
+        members = _ring_members(db, [ring_id])[ring_id]
+        if user_id not in [m['user_id'] for m in members]:
+            return jsonify({'error': 'Unauthorized'}), 403
+
+        # Leg i: the next member learns members[i]'s skill from them.
+        # As with any request, the learner is the sender.
+        legs = [
+            (members[(i + 1) % len(members)], member['user_id'], member['teaches_skill_id'])
+            for i, member in enumerate(members)
+        ]
+
+        # Skills may have changed since the ring was found
+        for learner, teacher_id, skill_id in legs:
+            result = db.execute(text('''
+                SELECT COUNT(*) FROM user_skills
+                WHERE skill_id = :skill_id AND (
+                    (user_id = :teacher_id AND is_teaching = 1) OR
+                    (user_id = :learner_id AND is_learning = 1)
+                )
+            '''), {'skill_id': skill_id, 'teacher_id': teacher_id, 'learner_id': learner['user_id']})
+            if result.scalar() < 2:
+                db.execute(text('DELETE FROM swap_ring_members WHERE ring_id = :id'), {'id': ring_id})
+                db.execute(text('DELETE FROM swap_rings WHERE id = :id'), {'id': ring_id})
+                db.commit()
+                return jsonify({'error': 'Swap ring is no longer possible'}), 409
+
+        # Committed on its own, so whichever member accepts last sees every acceptance
+        note = sanitize_input((request.get_json(silent=True) or {}).get('message', '')) or None
+        db.execute(text('''
+            UPDATE swap_ring_members SET accepted_at = CURRENT_TIMESTAMP, note = :note
+            WHERE ring_id = :ring_id AND user_id = :user_id AND accepted_at IS NULL
+        '''), {'note': note, 'ring_id': ring_id, 'user_id': user_id})
+        db.commit()
+
+        # Exactly one caller claims the ring, and only once all members accepted
+        result = db.execute(text('''
+            UPDATE swap_rings SET status = 'requested'
+            WHERE id = :id AND status = 'proposed' AND NOT EXISTS (
+                SELECT 1 FROM swap_ring_members m
+                WHERE m.ring_id = swap_rings.id AND m.accepted_at IS NULL
+            )
+        '''), {'id': ring_id})
+        if result.rowcount != 1:
+            db.commit()
+            accepted = db.execute(text(
+                'SELECT COUNT(*) FROM swap_ring_members WHERE ring_id = :id AND accepted_at IS NOT NULL'
+            ), {'id': ring_id}).scalar()
+            return jsonify({'message': 'Swap ring accepted', 'accepted': accepted, 'size': len(members)}), 202
+
+        # Everyone's notes as of the claim, this caller's included
+        notes = {m['user_id']: m['note'] for m in _ring_members(db, [ring_id])[ring_id]}
+        default_message = f'Part of a {len(members)}-way skill swap'
+
+        for learner, teacher_id, skill_id in legs:
+            params = {'sender_id': learner['user_id'], 'receiver_id': teacher_id, 'skill_id': skill_id, 'ring_id': ring_id}
+            # An identical pending request just joins the ring
+            result = db.execute(text('''
+                UPDATE swap_requests SET ring_id = :ring_id
+                WHERE sender_id = :sender_id AND receiver_id = :receiver_id AND skill_id = :skill_id AND status = 'pending'
+            '''), params)
+            if result.rowcount == 0:
+                db.execute(text('''
+                    INSERT INTO swap_requests (sender_id, receiver_id, skill_id, message, ring_id)
+                    VALUES (:sender_id, :receiver_id, :skill_id, :message, :ring_id)
+                '''), {**params, 'message': notes.get(learner['user_id']) or default_message})
+                record_swap_request(db, skill_id)
+
+        db.commit()
+
+        return jsonify({'message': 'Swap ring requested', 'requests': len(legs)}), 201
+
+    except Exception as e:
+        db.rollback()
+        return jsonify({'error': f'Failed to request swap ring: {str(e)}'}), 500
+    finally:
+        db.close()
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from database.db import get_db
-from utils import token_required, sanitize_input
+from utils import token_required, sanitize_input, get_profile_picture_url
+from utils.rating_stats import record_review, get_rating_stats
+from utils.recommendation_scores import mark_stale
+from extensions import score_refresher
 from sqlalchemy import text
 
 reviews_bp = Blueprint('reviews', __name__, url_prefix='/api/reviews')
@@ -70,8 +73,14 @@ def create_review(current_user):
             'rating': rating, 
             'comment': comment
         })
-        
+
+        record_review(db, reviewed_id, rating)
+
+        # The reviewed user's rating feeds their recommendation scores
+        mark_stale(db, reviewed_id)
+
         db.commit()
+        score_refresher.wake()
         
         return jsonify({'message': 'Review submitted successfully'}), 201
         
@@ -96,29 +105,15 @@ def get_user_reviews(user_id):
             WHERE r.reviewed_id = :user_id
             ORDER BY r.created_at DESC
         '''), {'user_id': user_id})
-        reviews = result.fetchall()
-        
-        # Calculate average rating
-        result = db.execute(text('''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as count
-            FROM reviews
-            WHERE reviewed_id = :user_id
-        '''), {'user_id': user_id})
-        avg_rating = result.fetchone()
-        
-        avg_val = 0
-        count = 0
-        if avg_rating:
-            avg_dict = avg_rating._mapping
-            avg_val = avg_dict['avg_rating']
-            count = avg_dict['count']
+        reviews_list = []
+        for review in result:
+            review_dict = dict(review._mapping)
+            review_dict['reviewer_pic'] = get_profile_picture_url(review_dict['reviewer_pic'], review_dict['reviewer_name'])
+            reviews_list.append(review_dict)
         
         return jsonify({
-            'reviews': [dict(r._mapping) for r in reviews],
-            'stats': {
-                'average': round(avg_val or 0, 1),
-                'count': count
-            }
+            'reviews': reviews_list,
+            'stats': get_rating_stats(db, user_id)
         }), 200
         
     except Exception as e:
@@ -1,50 +1,51 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from database.db import get_db
-from sqlalchemy import text
+from extensions import skill_catalog, skill_index
+from utils.skill_catalog import filter_skills
+from utils.skill_stats import load_skill_stats, trending_skills
+
+AUTOCOMPLETE_LIMIT = 8
+MAX_AUTOCOMPLETE_LIMIT = 20
+MAX_STATS_SKILLS = 100
+TRENDING_LIMIT = 10
+MAX_TRENDING_LIMIT = 50
 
 skills_bp = Blueprint('skills', __name__, url_prefix='/api/skills')
 
+
+def _catalog_response(snapshot, build):
+    """
+    JSON of build() tagged with the catalog's strong ETag, or an empty 304
+    when the client already has it. Clients revalidate on every use.
+    """
+    if request.if_none_match.contains_weak(snapshot.etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build())
+    response.set_etag(snapshot.etag)
+    response.cache_control.no_cache = True
+    return response
+
+
 @skills_bp.route('/', methods=['GET'])
 def get_all_skills():
     """Get all available skills"""
     try:
-        db = get_db()
-        result = db.execute(text('SELECT id, name, category, description FROM skills ORDER BY category, name'))
-        skills = result.fetchall()
-        
-        return jsonify({
-            'skills': [dict(skill._mapping) for skill in skills]
-        }), 200
-        
+        snapshot = skill_catalog.snapshot()
+        return _catalog_response(snapshot, lambda: {'skills': list(snapshot.skills)})
+
     except Exception as e:
         return jsonify({'error': f'Failed to fetch skills: {str(e)}'}), 500
-    finally:
-        try:
-            if 'db' in locals():
-                db.close()
-        except:
-            pass
 
 @skills_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Get all skill categories"""
     try:
-        db = get_db()
-        result = db.execute(text('SELECT DISTINCT category FROM skills ORDER BY category'))
-        categories = result.fetchall()
-        
-        return jsonify({
-            'categories': [cat._mapping['category'] for cat in categories]
-        }), 200
-        
+        snapshot = skill_catalog.snapshot()
+        return _catalog_response(snapshot, lambda: {'categories': list(snapshot.categories)})
+
     except Exception as e:
         return jsonify({'error': f'Failed to fetch categories: {str(e)}'}), 500
-    finally:
-        try:
-            if 'db' in locals():
-                db.close()
-        except:
-            pass
 
 @skills_bp.route('/search', methods=['GET'])
 def search_skills():
@@ -52,41 +53,91 @@ def search_skills():
     try:
         query = request.args.get('q', '')
         category = request.args.get('category', '')
-        
-        db = get_db()
-        
-        if category:
-            # Filter by category
-            result = db.execute(
-                text('SELECT id, name, category, description FROM skills WHERE category = :category ORDER BY name'),
-                {'category': category}
-            )
-            skills = result.fetchall()
-        elif query:
-            # Search by name
-            # Note: Postgres ILIKE is case insensitive, SQLite LIKE is case insensitive (usually). 
-            # To be safe and generic, we used to use LIKE.
-            # Ideally use ILIKE for Postgres but standard SQL uses LIKE.
-            # We'll stick to LIKE for now.
-            result = db.execute(
-                text('SELECT id, name, category, description FROM skills WHERE name LIKE :query ORDER BY name'),
-                {'query': f'%{query}%'}
-            )
-            skills = result.fetchall()
-        else:
-            # Return all if no filter
-            result = db.execute(text('SELECT id, name, category, description FROM skills ORDER BY category, name'))
-            skills = result.fetchall()
-        
+
+        # The response only depends on the URL and the catalog, so the
+        # catalog's ETag identifies it too
+        snapshot = skill_catalog.snapshot()
+        return _catalog_response(
+            snapshot, lambda: {'skills': filter_skills(snapshot.skills, query, category)}
+        )
+
+    except Exception as e:
+        return jsonify({'error': f'Failed to search skills: {str(e)}'}), 500
+
+@skills_bp.route('/autocomplete', methods=['GET'])
+def autocomplete_skills():
+    """Ranked suggestions for a partial skill name, tolerating typos"""
+    try:
+        query = request.args.get('q', '').strip()
+        try:
+            limit = min(int(request.args.get('limit', AUTOCOMPLETE_LIMIT)), MAX_AUTOCOMPLETE_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit parameter'}), 400
+        if not query or limit < 1:
+            return jsonify({'suggestions': []}), 200
+
+        # Refreshes the index too when the catalog changed
+        skill_catalog.snapshot()
+        matches = skill_catalog.autocomplete.search(
+            query, limit, teachers=lambda skill_id: skill_index.count(skill_id, teaching=True)
+        )
+
         return jsonify({
-            'skills': [dict(skill._mapping) for skill in skills]
+            'suggestions': [
+                {
+                    'id': skill['id'],
+                    'name': skill['name'],
+                    'category': skill['category'],
+                    'teachers': skill_index.count(skill['id'], teaching=True),
+                    'score': round(score, 3),
+                }
+                for skill, score in matches
+            ]
         }), 200
-        
+
     except Exception as e:
-        return jsonify({'error': f'Failed to search skills: {str(e)}'}), 500
+        return jsonify({'error': f'Failed to autocomplete skills: {str(e)}'}), 500
+
+@skills_bp.route('/stats', methods=['GET'])
+def get_skill_stats():
+    """Teachers, learners and trending score of some skills (skill_ids=1,2,3) or all of them"""
+    db = None
+    try:
+        skill_ids = None
+        raw_ids = request.args.get('skill_ids') or request.args.get('skill_id')
+        if raw_ids:
+            try:
+                skill_ids = list(dict.fromkeys(int(i) for i in raw_ids.split(',') if i.strip()))
+            except ValueError:
+                return jsonify({'error': 'skill_ids must be comma-separated integers'}), 400
+            if not skill_ids or len(skill_ids) > MAX_STATS_SKILLS:
+                return jsonify({'error': f'Give between 1 and {MAX_STATS_SKILLS} skill_ids'}), 400
+
+        db = get_db()
+        stats = load_skill_stats(db, skill_ids)
+        return jsonify({'stats': [stats[skill_id] for skill_id in sorted(stats)]}), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch skill stats: {str(e)}'}), 500
     finally:
+        if db:
+            db.close()
+
+@skills_bp.route('/trending', methods=['GET'])
+def get_trending_skills():
+    """Skills with the most recent swap requests, decayed over time"""
+    db = None
+    try:
         try:
-            if 'db' in locals():
-                db.close()
-        except:
-            pass
+            limit = min(int(request.args.get('limit', TRENDING_LIMIT)), MAX_TRENDING_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'Invalid limit parameter'}), 400
+
+        db = get_db()
+        return jsonify({'skills': trending_skills(db, max(limit, 1))}), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Failed to fetch trending skills: {str(e)}'}), 500
+    finally:
+        if db:
+            db.close()
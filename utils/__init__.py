@@ -5,6 +5,8 @@ from .auth_helper import (
     generate_token,
     decode_token,
     token_required,
+    generate_stream_ticket,
+    decode_stream_ticket,
 )
 from .validators import (
     validate_email,
@@ -32,6 +34,8 @@ __all__ = [
     "generate_token",
     "decode_token",
     "token_required",
+    "generate_stream_ticket",
+    "decode_stream_ticket",
     # Validators
     "validate_email",
     "validate_password",
@@ -5,6 +5,10 @@ from functools import wraps
 from flask import request, jsonify
 from config import Config
 
+# Tickets carry this audience, which decode_token() rejects, so a ticket
+# leaked from a stream URL can't be used as a login token
+STREAM_TICKET_AUDIENCE = 'chat-stream'
+
 def hash_password(password):
     """Hash a password using bcrypt"""
     salt = bcrypt.gensalt()
@@ -26,6 +30,25 @@ def generate_token(user_id, email):
     token = jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
     return token
 
+def generate_stream_ticket(user_id):
+    """Generate a short-lived JWT that only opens the chat event stream"""
+    payload = {
+        'user_id': user_id,
+        'aud': STREAM_TICKET_AUDIENCE,
+        'exp': datetime.utcnow() + timedelta(seconds=Config.STREAM_TICKET_EXPIRES),
+        'iat': datetime.utcnow()
+    }
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+
+def decode_stream_ticket(ticket):
+    """Decode and verify a stream ticket"""
+    try:
+        return jwt.decode(
+            ticket, Config.JWT_SECRET_KEY, algorithms=['HS256'], audience=STREAM_TICKET_AUDIENCE
+        )
+    except jwt.InvalidTokenError:
+        return None
+
 def decode_token(token):
     """Decode and verify JWT token"""
     try:
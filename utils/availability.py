@@ -0,0 +1,156 @@
+"""
+Weekly availability as a bitmask.
+
+A week is 168 hourly slots in UTC, slot 0 being Monday 00:00-01:00, so
+bit day * 24 + hour is set when the user is free in that hour. Masks are
+stored in users.availability_slots as 42 hex digits, and two users'
+overlap is popcount(a & b) on Python ints. That is cheap enough to
+compute over each page of candidates after the SQL query, which avoids
+dialect-specific bit operations on 168-bit values.
+
+Users edit their schedule in local time ({"mon": ["09-12", "18-21"]})
+together with a whole-hour utc_offset, which rotates it into UTC.
+"""
+
+import re
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+HOURS_PER_DAY = 24
+SLOT_COUNT = len(DAYS) * HOURS_PER_DAY
+FULL_MASK = (1 << SLOT_COUNT) - 1
+HEX_DIGITS = SLOT_COUNT // 4
+
+MIN_UTC_OFFSET = -12
+MAX_UTC_OFFSET = 14
+
+_RANGE_PATTERN = re.compile(r"^\s*(\d{1,2})\s*-\s*(\d{1,2})\s*$")
+
+
+def encode_mask(mask):
+    return format(mask, f"0{HEX_DIGITS}x")
+
+
+def decode_mask(value):
+    """Mask from stored hex digits (0 when unset), raises ValueError"""
+    if not value:
+        return 0
+    if len(value) > HEX_DIGITS:
+        raise ValueError("Availability mask is too long")
+    return int(value, 16) & FULL_MASK
+
+
+def overlap_hours(a, b):
+    return (a & b).bit_count()
+
+
+def _rotate(mask, shift):
+    """Rotate a week by shift slots (positive = later), wrapping Sunday into Monday"""
+    shift %= SLOT_COUNT
+    return ((mask << shift) | (mask >> (SLOT_COUNT - shift))) & FULL_MASK
+
+
+def parse_utc_offset(value):
+    """Whole hours east of UTC, raises ValueError"""
+    if value is None or value == "":
+        return 0
+    offset = float(value)
+    if offset != int(offset) or not MIN_UTC_OFFSET <= offset <= MAX_UTC_OFFSET:
+        raise ValueError(
+            f"utc_offset must be a whole number of hours between {MIN_UTC_OFFSET} and {MAX_UTC_OFFSET}"
+        )
+    return int(offset)
+
+
+def parse_schedule(schedule, utc_offset=0):
+    """
+    UTC mask from a local-time schedule: day -> ["HH-HH", ...], end hour
+    exclusive. "22-02" runs past midnight into the next day. Raises
+    ValueError on anything else.
+    """
+    if not isinstance(schedule, dict):
+        raise ValueError("Availability must map days to hour ranges")
+
+    mask = 0
+    for day, ranges in schedule.items():
+        if day not in DAYS:
+            raise ValueError(f"Unknown day: {day}")
+        if not isinstance(ranges, list):
+            raise ValueError(f"Hour ranges of {day} must be a list")
+        day_start = DAYS.index(day) * HOURS_PER_DAY
+        for hour_range in ranges:
+            match = _RANGE_PATTERN.match(str(hour_range))
+            if not match:
+                raise ValueError(f"Invalid hour range: {hour_range}")
+            start, end = int(match.group(1)), int(match.group(2))
+            if start > 23 or end > 24 or start == end:
+                raise ValueError(f"Invalid hour range: {hour_range}")
+            if end < start:
+                end += HOURS_PER_DAY
+            for hour in range(start, end):
+                mask |= 1 << ((day_start + hour) % SLOT_COUNT)
+
+    return _rotate(mask, -utc_offset)
+
+
+def schedule_from_mask(mask, utc_offset=0):
+    """Local-time schedule of a UTC mask, the inverse of parse_schedule"""
+    mask = _rotate(mask, utc_offset)
+    schedule = {}
+    for i, day in enumerate(DAYS):
+        ranges, start = [], None
+        for hour in range(HOURS_PER_DAY + 1):
+            free = hour < HOURS_PER_DAY and mask >> (i * HOURS_PER_DAY + hour) & 1
+            if free and start is None:
+                start = hour
+            elif not free and start is not None:
+                ranges.append(f"{start:02d}-{hour:02d}")
+                start = None
+        if ranges:
+            schedule[day] = ranges
+    return schedule
+
+
+class OverlapFilter:
+    """Candidates free at least min_hours of the hours in mask"""
+
+    def __init__(self, mask, min_hours=1):
+        self.mask = mask
+        self.min_hours = min_hours
+
+    def overlap(self, row):
+        """Overlapping hours with a row's availability_slots, or None when too few"""
+        try:
+            hours = overlap_hours(self.mask, decode_mask(row.get("availability_slots")))
+        except ValueError:
+            return None
+        return hours if hours >= self.min_hours else None
+
+
+def overlap_filter_from_args(args, default_mask=None):
+    """
+    An OverlapFilter from the slots (hex mask) / min_overlap query params,
+    or None when neither is given. default_mask is used when only
+    min_overlap is given. Raises ValueError on bad values.
+    """
+    slots = args.get("slots")
+    min_overlap = args.get("min_overlap")
+
+    if slots:
+        try:
+            mask = decode_mask(slots)
+        except ValueError:
+            raise ValueError(f"slots must be a mask of at most {HEX_DIGITS} hex digits")
+    elif min_overlap is not None and default_mask:
+        mask = default_mask
+    elif min_overlap is not None:
+        raise ValueError("min_overlap needs slots, or an availability on your profile")
+    else:
+        return None
+
+    try:
+        min_hours = int(min_overlap) if min_overlap is not None else 1
+    except ValueError:
+        raise ValueError("min_overlap must be a whole number of hours")
+    if not 1 <= min_hours <= SLOT_COUNT:
+        raise ValueError(f"min_overlap must be between 1 and {SLOT_COUNT}")
+    return OverlapFilter(mask, min_hours)
@@ -1,11 +1,19 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet
 import os
 import base64
+import threading
 from flask import current_app
 
+# Fernet tokens are base64 of a 0x80 version byte, so they all start like this
+TOKEN_PREFIX = "gAAAA"
 
-def get_cipher_suite():
-    """Get Fernet cipher suite from app config"""
+# Process-wide key ring, rebuilt only when the configured keys change
+_key_ring = None
+_key_ring_lock = threading.Lock()
+
+
+def get_configured_keys():
+    """Primary ENCRYPTION_KEY followed by any retired ENCRYPTION_OLD_KEYS"""
     key = current_app.config.get("ENCRYPTION_KEY")
     if not key:
         raise RuntimeError(
@@ -14,30 +22,64 @@ def get_cipher_suite():
             'python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"'
         )
 
-    # Ensure key is bytes
-    if isinstance(key, str):
-        key = key.encode()
+    old_keys = current_app.config.get("ENCRYPTION_OLD_KEYS") or ()
+    if isinstance(old_keys, str):
+        old_keys = [k.strip() for k in old_keys.split(",") if k.strip()]
+
+    return (key, *old_keys)
+
 
-    return Fernet(key)
+def get_key_ring():
+    """
+    Get the cached MultiFernet for the configured keys.
+    Encrypts with the primary key and decrypts with any of them.
+    """
+    global _key_ring
+
+    keys = get_configured_keys()
+    cached = _key_ring
+    if cached is not None and cached[0] == keys:
+        return cached[1]
+
+    with _key_ring_lock:
+        if _key_ring is None or _key_ring[0] != keys:
+            # Ensure keys are bytes
+            fernets = [Fernet(k.encode() if isinstance(k, str) else k) for k in keys]
+            _key_ring = (keys, MultiFernet(fernets))
+        return _key_ring[1]
+
+
+def get_cipher_suite():
+    """Get Fernet cipher suite from app config (the cached key ring)"""
+    return get_key_ring()
+
+
+def is_encrypted(value):
+    """Whether a stored value looks like a Fernet token"""
+    return isinstance(value, str) and value.startswith(TOKEN_PREFIX)
 
 
 def encrypt_message(message):
-    """Store message as plaintext (encryption disabled for compatibility)"""
+    """
+    Encrypt with the primary key when ENCRYPT_MESSAGES is enabled,
+    otherwise store plaintext (the default, for compatibility)
+    """
     if not message:
         return ""
-    # Store plaintext - encryption can be enabled later if needed
-    return message
+    if not current_app.config.get("ENCRYPT_MESSAGES"):
+        return message
+    return get_key_ring().encrypt(message.encode()).decode()
 
 
 def decrypt_message(encrypted_message):
     """Return message as plaintext, attempting decryption if it looks encrypted"""
     if not encrypted_message:
         return ""
-        
+
     try:
         # If it looks like a Fernet token (starts with gAAAA), try to decrypt
-        if isinstance(encrypted_message, str) and encrypted_message.startswith("gAAAA"):
-            cipher_suite = get_cipher_suite()
+        if is_encrypted(encrypted_message):
+            cipher_suite = get_key_ring()
             # Decrypt returns bytes, decode to string
             decrypted_data = cipher_suite.decrypt(encrypted_message.encode())
             return decrypted_data.decode()
@@ -46,6 +88,33 @@ def decrypt_message(encrypted_message):
         # Return as-is to be safe (or could log error)
         # print(f"Decryption failed: {e}")
         pass
-        
+
     # Return as-is if not encrypted or decryption failed
     return encrypted_message
+
+
+def decrypt_many(values):
+    """
+    Batch version of decrypt_message for a page of rows.
+    Resolves the key ring once and only touches values that look encrypted.
+    """
+    results = []
+    cipher_suite = None
+
+    for value in values:
+        if not value:
+            results.append("")
+            continue
+        if not is_encrypted(value):
+            results.append(value)
+            continue
+
+        try:
+            if cipher_suite is None:
+                cipher_suite = get_key_ring()
+            results.append(cipher_suite.decrypt(value.encode()).decode())
+        except Exception:
+            # Same fallback as decrypt_message: hand back the stored value
+            results.append(value)
+
+    return results
@@ -0,0 +1,448 @@
+"""
+Location resolution and proximity queries.
+
+Free-text users.location values are resolved against the bundled offline
+gazetteer (database/gazetteer.csv, no network lookups) to a latitude,
+longitude and geohash, stored on users by the profile update. A radius
+query turns the circle into a handful of geohash cells, filters on
+geohash ranges (an index range scan on idx_users_geohash per cell), and
+drops the corners of the cells with an exact haversine distance check.
+"""
+
+import csv
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+GAZETTEER_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "gazetteer.csv"
+)
+
+# Stored precision: 9 characters is a cell of a few metres
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_RADIUS_KM = 25
+MAX_RADIUS_KM = 1000
+
+# A radius query uses the finest cells that cover it in at most this many ranges
+MAX_QUERY_CELLS = 16
+
+Place = namedtuple("Place", "name country latitude longitude")
+
+# ISO country code -> names it is written as
+COUNTRY_NAMES = {
+    "AE": ["United Arab Emirates", "UAE"],
+    "AF": ["Afghanistan"],
+    "AL": ["Albania"],
+    "AM": ["Armenia"],
+    "AO": ["Angola"],
+    "AR": ["Argentina"],
+    "AT": ["Austria", "Österreich"],
+    "AU": ["Australia"],
+    "AZ": ["Azerbaijan"],
+    "BA": ["Bosnia and Herzegovina", "Bosnia"],
+    "BD": ["Bangladesh"],
+    "BE": ["Belgium", "Belgique", "België"],
+    "BG": ["Bulgaria"],
+    "BH": ["Bahrain"],
+    "BO": ["Bolivia"],
+    "BR": ["Brazil", "Brasil"],
+    "BY": ["Belarus"],
+    "CA": ["Canada"],
+    "CD": ["Democratic Republic of the Congo", "DR Congo", "DRC"],
+    "CH": ["Switzerland", "Schweiz", "Suisse"],
+    "CI": ["Ivory Coast", "Côte d'Ivoire"],
+    "CL": ["Chile"],
+    "CN": ["China", "PRC"],
+    "CO": ["Colombia"],
+    "CR": ["Costa Rica"],
+    "CU": ["Cuba"],
+    "CZ": ["Czech Republic", "Czechia"],
+    "DE": ["Germany", "Deutschland"],
+    "DK": ["Denmark", "Danmark"],
+    "DO": ["Dominican Republic"],
+    "DZ": ["Algeria"],
+    "EC": ["Ecuador"],
+    "EE": ["Estonia"],
+    "EG": ["Egypt"],
+    "ES": ["Spain", "España"],
+    "ET": ["Ethiopia"],
+    "FI": ["Finland", "Suomi"],
+    "FR": ["France"],
+    "GB": ["United Kingdom", "UK", "Great Britain", "Britain", "England", "Scotland", "Wales", "Northern Ireland"],
+    "GE": ["Georgia"],
+    "GH": ["Ghana"],
+    "GR": ["Greece"],
+    "GT": ["Guatemala"],
+    "HK": ["Hong Kong"],
+    "HR": ["Croatia"],
+    "HU": ["Hungary"],
+    "ID": ["Indonesia"],
+    "IE": ["Ireland"],
+    "IL": ["Israel"],
+    "IN": ["India", "Bharat"],
+    "IQ": ["Iraq"],
+    "IR": ["Iran"],
+    "IS": ["Iceland"],
+    "IT": ["Italy", "Italia"],
+    "JO": ["Jordan"],
+    "JP": ["Japan"],
+    "KE": ["Kenya"],
+    "KH": ["Cambodia"],
+    "KR": ["South Korea", "Korea"],
+    "KW": ["Kuwait"],
+    "KZ": ["Kazakhstan"],
+    "LA": ["Laos"],
+    "LB": ["Lebanon"],
+    "LK": ["Sri Lanka"],
+    "LT": ["Lithuania"],
+    "LU": ["Luxembourg"],
+    "LV": ["Latvia"],
+    "MA": ["Morocco"],
+    "MD": ["Moldova"],
+    "MG": ["Madagascar"],
+    "MK": ["North Macedonia", "Macedonia"],
+    "MM": ["Myanmar", "Burma"],
+    "MN": ["Mongolia"],
+    "MO": ["Macau", "Macao"],
+    "MX": ["Mexico", "México"],
+    "MY": ["Malaysia"],
+    "MZ": ["Mozambique"],
+    "NG": ["Nigeria"],
+    "NL": ["Netherlands", "The Netherlands", "Holland"],
+    "NO": ["Norway", "Norge"],
+    "NP": ["Nepal"],
+    "NZ": ["New Zealand"],
+    "OM": ["Oman"],
+    "PA": ["Panama"],
+    "PE": ["Peru"],
+    "PH": ["Philippines"],
+    "PK": ["Pakistan"],
+    "PL": ["Poland", "Polska"],
+    "PR": ["Puerto Rico"],
+    "PT": ["Portugal"],
+    "PY": ["Paraguay"],
+    "QA": ["Qatar"],
+    "RO": ["Romania"],
+    "RS": ["Serbia"],
+    "RU": ["Russia", "Russian Federation"],
+    "RW": ["Rwanda"],
+    "SA": ["Saudi Arabia", "KSA"],
+    "SD": ["Sudan"],
+    "SE": ["Sweden", "Sverige"],
+    "SG": ["Singapore"],
+    "SI": ["Slovenia"],
+    "SK": ["Slovakia"],
+    "SN": ["Senegal"],
+    "SY": ["Syria"],
+    "TH": ["Thailand"],
+    "TN": ["Tunisia"],
+    "TR": ["Turkey", "Türkiye"],
+    "TW": ["Taiwan"],
+    "TZ": ["Tanzania"],
+    "UA": ["Ukraine"],
+    "UG": ["Uganda"],
+    "US": ["United States", "United States of America", "USA", "US", "America"],
+    "UY": ["Uruguay"],
+    "UZ": ["Uzbekistan"],
+    "VE": ["Venezuela"],
+    "VN": ["Vietnam", "Viet Nam"],
+    "ZA": ["South Africa"],
+    "ZM": ["Zambia"],
+    "ZW": ["Zimbabwe"],
+}
+
+# Regions written in place of the country ("Austin, TX"), code -> names
+REGION_NAMES = {
+    "US": [
+        "Alabama", "AL", "Alaska", "AK", "Arizona", "AZ", "Arkansas", "AR",
+        "California", "CA", "Colorado", "CO", "Connecticut", "CT", "Delaware", "DE",
+        "Florida", "FL", "Georgia", "GA", "Hawaii", "HI", "Idaho", "ID",
+        "Illinois", "IL", "Indiana", "IN", "Iowa", "IA", "Kansas", "KS",
+        "Kentucky", "KY", "Louisiana", "LA", "Maine", "ME", "Maryland", "MD",
+        "Massachusetts", "MA", "Michigan", "MI", "Minnesota", "MN",
+        "Mississippi", "MS", "Missouri", "MO", "Montana", "MT", "Nebraska", "NE",
+        "Nevada", "NV", "New Hampshire", "NH", "New Jersey", "NJ",
+        "New Mexico", "NM", "New York", "NY", "North Carolina", "NC",
+        "North Dakota", "ND", "Ohio", "OH", "Oklahoma", "OK", "Oregon", "OR",
+        "Pennsylvania", "PA", "Rhode Island", "RI", "South Carolina", "SC",
+        "South Dakota", "SD", "Tennessee", "TN", "Texas", "TX", "Utah", "UT",
+        "Vermont", "VT", "Virginia", "VA", "Washington", "WA",
+        "West Virginia", "WV", "Wisconsin", "WI", "Wyoming", "WY",
+        "District of Columbia", "DC",
+    ],
+    "CA": [
+        "Ontario", "ON", "Quebec", "QC", "British Columbia", "BC", "Alberta", "AB",
+        "Manitoba", "MB", "Saskatchewan", "SK", "Nova Scotia", "NS",
+        "New Brunswick", "NB", "Newfoundland and Labrador", "NL",
+    ],
+    "AU": [
+        "New South Wales", "NSW", "Victoria", "VIC", "Queensland", "QLD",
+        "Western Australia", "WA", "South Australia", "SA", "Tasmania", "TAS",
+        "Australian Capital Territory", "ACT", "Northern Territory", "NT",
+    ],
+}
+
+
+def normalize_place(value):
+    """Lowercase words without diacritics or punctuation, for gazetteer keys"""
+    normalized = unicodedata.normalize("NFKD", value or "")
+    stripped = "".join(c for c in normalized if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", stripped.lower()))
+
+
+@lru_cache(maxsize=1)
+def _gazetteer():
+    """(normalized name -> [(population, Place)], normalized country or region -> {codes})"""
+    places = defaultdict(list)
+    with open(GAZETTEER_PATH, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            place = Place(
+                row["name"], row["country"], float(row["latitude"]), float(row["longitude"])
+            )
+            population = int(row["population"])
+            names = [row["name"]] + [a for a in row["aliases"].split("|") if a]
+            for name in {normalize_place(n) for n in names}:
+                places[name].append((population, place))
+
+    countries = defaultdict(set)
+    for names_by_code in (COUNTRY_NAMES, REGION_NAMES):
+        for code, names in names_by_code.items():
+            for name in names:
+                countries[normalize_place(name)].add(code)
+    for code in COUNTRY_NAMES:
+        countries[code.lower()].add(code)
+
+    return places, countries
+
+
+def resolve_location(value):
+    """
+    The gazetteer Place a free-text location refers to, or None.
+
+    "City", "City, Country" and "Area, City, Region, Country" are
+    understood. A trailing country or region only narrows the match, and
+    ambiguous names go to the most populous place.
+    """
+    places, countries = _gazetteer()
+    parts = [normalize_place(part) for part in (value or "").split(",")]
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+
+    whole = " ".join(parts)
+    if whole in places:
+        return max(places[whole])[1]
+
+    country_codes = countries.get(parts[-1]) if len(parts) > 1 else None
+    names = parts[:-1] if country_codes else parts
+
+    for name in names:
+        candidates = places.get(name, [])
+        if country_codes:
+            candidates = [c for c in candidates if c[1].country in country_codes]
+        if candidates:
+            return max(candidates)[1]
+    return None
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def location_columns(location):
+    """latitude, longitude and geohash values for users, all None if unresolved"""
+    place = resolve_location(location)
+    if not place:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    return {
+        "latitude": place.latitude,
+        "longitude": place.longitude,
+        "geohash": geohash_encode(place.latitude, place.longitude),
+    }
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle, at the finest
+    precision that needs no more than MAX_QUERY_CELLS of them.
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+    # Longitude degrees shrink towards the poles, use the widest latitude
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest))
+    lon_delta = 180.0 if cos_lat < 1e-6 else min(lat_delta / cos_lat, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lon_bits = (5 * precision + 1) // 2
+        lat_bits = 5 * precision // 2
+        cell_height, cell_width = 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+        rows = range(
+            int((min_lat + 90) / cell_height),
+            min(int((max_lat + 90) / cell_height), 2**lat_bits - 1) + 1,
+        )
+        first_column = math.floor((longitude - lon_delta + 180) / cell_width)
+        last_column = math.floor((longitude + lon_delta + 180) / cell_width)
+        columns = range(first_column, min(last_column, first_column + 2**lon_bits - 1) + 1)
+
+        if len(rows) * len(columns) > MAX_QUERY_CELLS and precision > 1:
+            continue
+
+        cells = set()
+        for row in rows:
+            for column in columns:
+                # Wrap around the antimeridian
+                column %= 2**lon_bits
+                cells.add(
+                    geohash_encode(
+                        -90 + (row + 0.5) * cell_height,
+                        -180 + (column + 0.5) * cell_width,
+                        precision,
+                    )
+                )
+        return sorted(cells)
+
+
+def cell_condition(column, cells, prefix="geo"):
+    """
+    SQL matching geohash column values inside any of cells, as
+    (condition, params). Each cell is a range, so it can use an index.
+    """
+    clauses, params = [], {}
+    for i, cell in enumerate(cells):
+        params[f"{prefix}{i}"] = cell
+        end = _next_cell(cell)
+        if end:
+            clauses.append(f"({column} >= :{prefix}{i} AND {column} < :{prefix}{i}_end)")
+            params[f"{prefix}{i}_end"] = end
+        else:
+            clauses.append(f"{column} >= :{prefix}{i}")
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def _next_cell(cell):
+    """
+    The first geohash after every hash starting with cell (None if there
+    is none). Geohash characters sort the same in every collation, unlike
+    a sentinel such as "~".
+    """
+    cell = cell.rstrip(GEOHASH_ALPHABET[-1])
+    if not cell:
+        return None
+    return cell[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(cell[-1]) + 1]
+
+
+class RadiusFilter:
+    """A circle around an origin, for filtering rows that carry latitude/longitude"""
+
+    def __init__(self, latitude, longitude, radius_km):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+
+    def sql(self, column="u.geohash"):
+        return cell_condition(column, covering_cells(self.latitude, self.longitude, self.radius_km))
+
+    def distance(self, row):
+        """km from the origin to a row, or None when outside the circle"""
+        if row.get("latitude") is None or row.get("longitude") is None:
+            return None
+        km = distance_km(self.latitude, self.longitude, row["latitude"], row["longitude"])
+        return km if km <= self.radius_km else None
+
+
+def radius_filter_from_args(args, default_origin=None):
+    """
+    A RadiusFilter from the near / lat & lon / radius_km query params, or
+    None when neither is given. default_origin is a (latitude, longitude)
+    used when only radius_km is given. Raises ValueError on bad values or
+    an unknown place.
+    """
+    near = args.get("near", "").strip()
+    lat, lon = args.get("lat"), args.get("lon")
+    radius = args.get("radius_km")
+
+    if near:
+        place = resolve_location(near)
+        if not place:
+            raise ValueError(f"Unknown location: {near}")
+        origin = (place.latitude, place.longitude)
+    elif lat is not None or lon is not None:
+        try:
+            origin = (float(lat), float(lon))
+        except (TypeError, ValueError):
+            raise ValueError("lat and lon must both be numbers")
+        if not (-90 <= origin[0] <= 90 and -180 <= origin[1] <= 180):
+            raise ValueError("lat or lon out of range")
+    elif radius is not None and default_origin:
+        origin = default_origin
+    elif radius is not None:
+        raise ValueError("radius_km needs near, or lat and lon")
+    else:
+        return None
+
+    try:
+        radius_km = float(radius) if radius is not None else DEFAULT_RADIUS_KM
+    except ValueError:
+        raise ValueError("radius_km must be a number")
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f"radius_km must be above 0 and at most {MAX_RADIUS_KM}")
+    return RadiusFilter(origin[0], origin[1], radius_km)
+
+
+def filtered_page(fetch, keep, limit, max_batches=10):
+    """
+    Fill a page from keyset batches when some rows are filtered out in
+    Python (e.g. the corners of geohash cells).
+
+    fetch(after) returns the next batch of up to limit rows after the row
+    `after` (None for the first batch). keep(row) returns False for rows
+    to drop. Returns (rows, last_row): last_row is the last row scanned,
+    to build next_cursor from, or None once the results are exhausted. A
+    page may come back short after max_batches if most rows are dropped.
+    """
+    rows, after = [], None
+    for _ in range(max_batches):
+        batch = fetch(after)
+        for row in batch:
+            after = row
+            if keep(row):
+                rows.append(row)
+                if len(rows) == limit:
+                    return rows, after
+        if len(batch) < limit:
+            return rows, None
+    return rows, after
@@ -0,0 +1,361 @@
+"""
+Profile picture processing and storage.
+
+An upload is checked (a PNG, JPEG, GIF or WebP Pillow can parse, within
+MAX_IMAGE_PIXELS) and staged on the request thread. A worker pool then
+renders square variants at each of AVATAR_SIZES as WebP and JPEG. These
+are re-encoded from pixels only, so EXIF (GPS position, camera
+serial...) and other metadata are dropped, and the staged original is
+deleted.
+
+Avatars are content-addressed: the key is the SHA-256 of the uploaded
+bytes and variants live in key-sharded directories
+(avatars/ab/cd/<key>_<size>.<ext>). The same picture uploaded twice is
+stored and rendered once, and a key's files never change, so clients may
+cache them forever. The avatars table counts the users showing each key;
+database/collect_avatars.py deletes those nobody has used for a while.
+
+Collection and a new upload of the same picture can overlap. The
+collector claims a row (ref_count -1) before touching files and moves
+the variants aside before deleting it, so a row revived meanwhile gets
+them back. Uploads keep their staged copy until the profile update has
+committed and a render has found the variants in place.
+
+The stored profile_picture becomes AVATAR_URL_PREFIX + key right away.
+routes/media.py serves the variants and renders them itself if a request
+beats the worker, so the new picture never shows up broken. Animated
+GIFs keep their first frame.
+"""
+
+import hashlib
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import text
+
+from utils.logging_helper import log_error, log_info
+from utils.profile_helper import AVATAR_SIZES, AVATAR_URL_PREFIX
+
+ALLOWED_FORMATS = {"PNG", "JPEG", "GIF", "WEBP"}
+# Decoded size limit, well below what fits in a 16 MB upload as PNG
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Variant extension -> (Pillow format, MIME type, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpg": ("JPEG", "image/jpeg", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+# SHA-256 hex of the uploaded bytes
+AVATAR_KEY_RE = re.compile(r"[0-9a-f]{64}")
+VARIANT_FILE_RE = re.compile(r"([0-9a-f]{64})_\d+\.\w+")
+# Partial writes and variants moved aside by collection
+TEMPORARY_SUFFIXES = (".part", ".trash")
+
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def avatar_key(profile_picture):
+    """The avatar key in a stored profile_picture, or None for other values"""
+    if profile_picture and profile_picture.startswith(AVATAR_URL_PREFIX):
+        key = profile_picture[len(AVATAR_URL_PREFIX):]
+        if AVATAR_KEY_RE.fullmatch(key):
+            return key
+    return None
+
+
+def acquire_avatar(db, key):
+    """
+    Count one more user showing key, in the caller's transaction. A row
+    claimed by collection (ref_count -1) is revived, and the collector
+    then puts its files back.
+    """
+    result = db.execute(
+        text(
+            """
+        UPDATE avatars SET
+            ref_count = CASE WHEN ref_count < 0 THEN 1 ELSE ref_count + 1 END,
+            released_at = NULL
+        WHERE avatar_key = :key
+    """
+        ),
+        {"key": key},
+    )
+    if not result.rowcount:
+        db.execute(
+            text("INSERT INTO avatars (avatar_key, ref_count) VALUES (:key, 1)"),
+            {"key": key},
+        )
+
+
+def release_avatar(db, key):
+    """Count one user fewer showing key, in the caller's transaction"""
+    # released_at first: MySQL evaluates assignments left to right
+    db.execute(
+        text(
+            """
+        UPDATE avatars SET
+            released_at = CASE WHEN ref_count <= 1 THEN CURRENT_TIMESTAMP ELSE released_at END,
+            ref_count = ref_count - 1
+        WHERE avatar_key = :key AND ref_count > 0
+    """
+        ),
+        {"key": key},
+    )
+
+
+def recount_avatars(db):
+    """
+    Reset ref_count from users.profile_picture, in the caller's
+    transaction. Returns how many counts had drifted.
+    """
+    result = db.execute(
+        text(
+            """
+        SELECT profile_picture, COUNT(*) FROM users
+        WHERE profile_picture LIKE :prefix
+        GROUP BY profile_picture
+    """
+        ),
+        {"prefix": f"{AVATAR_URL_PREFIX}%"},
+    )
+    counts = {}
+    for profile_picture, users in result:
+        key = avatar_key(profile_picture)
+        if key:
+            counts[key] = counts.get(key, 0) + users
+
+    stored = dict(db.execute(text("SELECT avatar_key, ref_count FROM avatars")).fetchall())
+    drifted = 0
+    for key in stored.keys() | counts.keys():
+        count = counts.get(key, 0)
+        if stored.get(key) == count:
+            continue
+        drifted += 1
+        if key not in stored:
+            db.execute(
+                text("INSERT INTO avatars (avatar_key, ref_count) VALUES (:key, :count)"),
+                {"key": key, "count": count},
+            )
+        else:
+            db.execute(
+                text(
+                    """
+                UPDATE avatars SET
+                    released_at = CASE WHEN :count = 0 THEN CURRENT_TIMESTAMP ELSE NULL END,
+                    ref_count = :count
+                WHERE avatar_key = :key
+            """
+                ),
+                {"key": key, "count": count},
+            )
+    return drifted
+
+
+def inspect_upload(stream):
+    """
+    Check that stream holds an image we accept, and rewind it. Raises
+    ValueError with a message for the user otherwise.
+    """
+    try:
+        with Image.open(stream) as image:
+            if image.format not in ALLOWED_FORMATS:
+                raise ValueError("Only PNG, JPEG, GIF and WebP images are allowed")
+            width, height = image.size
+            if width * height > MAX_IMAGE_PIXELS:
+                raise ValueError("Image is too large")
+            image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("File is not a valid image")
+    finally:
+        stream.seek(0)
+
+
+def _square(image, size):
+    """Centre crop to a square of at most size pixels, without upscaling"""
+    side = min(size, *image.size)
+    return ImageOps.fit(image, (side, side), Image.LANCZOS)
+
+
+def _flatten(image):
+    """RGB on a white background, for formats without alpha"""
+    if image.mode != "RGBA":
+        return image.convert("RGB")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+class ImagePipeline:
+    """Stages avatar uploads and renders their variants off the request thread"""
+
+    def __init__(self):
+        self.folder = None
+        self._executor = None
+
+    def init_app(self, app):
+        upload_folder = app.config.get("UPLOAD_FOLDER", "static/uploads")
+        self.folder = os.path.abspath(os.path.join(app.root_path, upload_folder, "avatars"))
+        os.makedirs(os.path.join(self.folder, "incoming"), exist_ok=True)
+        # IMAGE_WORKERS = 0 renders on the request thread instead
+        workers = app.config.get("IMAGE_WORKERS", 2)
+        if workers:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="image-pipeline"
+            )
+        app.extensions["image_pipeline"] = self
+
+    def _incoming_path(self, key):
+        return os.path.join(self.folder, "incoming", key)
+
+    def key_folder(self, key):
+        return os.path.join(self.folder, key[:2], key[2:4])
+
+    def variant_path(self, key, size, extension):
+        return os.path.join(self.key_folder(key), f"{key}_{size}.{extension}")
+
+    def stage(self, file):
+        """
+        Validate an uploaded FileStorage, keep it for rendering and return
+        its key. Raises ValueError when it isn't an acceptable image.
+        Submit the key once the profile update has committed.
+        """
+        inspect_upload(file.stream)
+        return self.stage_stream(file.stream)
+
+    def stage_stream(self, stream):
+        """Hash stream while copying it to the incoming folder; returns its key"""
+        hasher = hashlib.sha256()
+        partial = self._incoming_path(f"{uuid.uuid4().hex}.part")
+        try:
+            with open(partial, "wb") as output:
+                for chunk in iter(lambda: stream.read(COPY_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+                    output.write(chunk)
+            key = hasher.hexdigest()
+            # Kept even when the variants exist: collection may be removing them
+            os.replace(partial, self._incoming_path(key))
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        return key
+
+    def submit(self, key):
+        """Render key's variants in the background"""
+        if self._executor is None:
+            self._render_logged(key)
+        else:
+            self._executor.submit(self._render_logged, key)
+
+    def _render_logged(self, key):
+        try:
+            if self.render(key):
+                log_info(f"Rendered avatar variants for {key}")
+        except Exception as e:
+            log_error(f"Rendering avatar {key} failed", exception=e)
+
+    def rendered(self, key):
+        return all(
+            os.path.exists(self.variant_path(key, size, extension))
+            for size in AVATAR_SIZES
+            for extension in VARIANT_FORMATS
+        )
+
+    def render(self, key):
+        """
+        Write key's variants from its staged upload, then delete that.
+        Returns False when there was nothing to render (already done, or
+        done by another thread or worker meanwhile).
+        """
+        source = self._incoming_path(key)
+        if self.rendered(key):
+            # The same picture again; only its staged copy is left to drop
+            try:
+                os.remove(source)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            image = Image.open(source)
+        except FileNotFoundError:
+            return False
+
+        with image:
+            image.seek(0)
+            # Apply the EXIF orientation before the EXIF block is dropped
+            image = ImageOps.exif_transpose(image)
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            image.info.clear()
+
+            os.makedirs(self.key_folder(key), exist_ok=True)
+            for size in AVATAR_SIZES:
+                variant = _square(image, size)
+                for extension, (image_format, _, options) in VARIANT_FORMATS.items():
+                    output = variant if image_format == "WEBP" else _flatten(variant)
+                    path = self.variant_path(key, size, extension)
+                    # Written aside and renamed, so readers never see half a file
+                    partial = f"{path}.{uuid.uuid4().hex}.part"
+                    output.save(partial, image_format, **options)
+                    os.replace(partial, path)
+
+        try:
+            os.remove(source)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def ensure(self, key):
+        """Whether key's variants exist, rendering them now if they are still due"""
+        if self.rendered(key):
+            return True
+        self.render(key)
+        return self.rendered(key)
+
+    def set_aside(self, key):
+        """
+        Rename key's variants out of the way, first step of deleting them.
+        Returns (path, moved to) pairs for put_back or discard.
+        """
+        moved = []
+        for size in AVATAR_SIZES:
+            for extension in VARIANT_FORMATS:
+                path = self.variant_path(key, size, extension)
+                aside = f"{path}.{uuid.uuid4().hex}.trash"
+                try:
+                    os.replace(path, aside)
+                except FileNotFoundError:
+                    continue
+                moved.append((path, aside))
+        return moved
+
+    def put_back(self, moved):
+        """Undo set_aside. Identical content, so a re-render meanwhile doesn't matter."""
+        for path, aside in moved:
+            os.replace(aside, path)
+
+    def discard(self, moved):
+        """Delete what set_aside moved; returns the bytes freed"""
+        freed = 0
+        for _, aside in moved:
+            freed += os.path.getsize(aside)
+            os.remove(aside)
+        return freed
+
+    def stored_files(self):
+        """
+        (key, path, mtime) of every variant and staged upload on disk, with
+        key None for partial writes and files left set aside
+        """
+        for root, _, files in os.walk(self.folder):
+            pattern = AVATAR_KEY_RE if os.path.basename(root) == "incoming" else VARIANT_FILE_RE
+            for name in files:
+                path = os.path.join(root, name)
+                match = pattern.fullmatch(name)
+                if match:
+                    yield match.group(match.lastindex or 0), path, os.path.getmtime(path)
+                elif name.endswith(TEMPORARY_SUFFIXES):
+                    yield None, path, os.path.getmtime(path)
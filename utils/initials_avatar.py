@@ -0,0 +1,43 @@
+"""
+Initials avatars for users without a profile picture.
+
+get_initials_avatar_url (utils/profile_helper.py) names one by its
+letters and an AVATAR_COLORS index derived from the full name, and
+routes/media.py serves it. A given URL always renders the same SVG, so
+responses are cached for good and renders are memoized per worker.
+"""
+
+import hashlib
+from functools import lru_cache
+from html import escape
+
+from utils.profile_helper import AVATAR_COLORS
+
+MAX_INITIALS_LENGTH = 2
+INITIALS_CACHE_SIZE = 4096
+
+SVG_TEMPLATE = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="128" height="128" '
+    'viewBox="0 0 128 128" role="img" aria-label="{initials}">'
+    '<rect width="128" height="128" fill="{color}"/>'
+    '<text x="64" y="64" dy=".35em" text-anchor="middle" fill="#ffffff" '
+    "font-family=\"-apple-system, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif\" "
+    'font-size="52" font-weight="600">{initials}</text></svg>'
+)
+
+
+@lru_cache(maxsize=INITIALS_CACHE_SIZE)
+def render_initials_svg(initials, color):
+    """
+    (svg bytes, etag) of an avatar showing initials on AVATAR_COLORS[color].
+    Raises ValueError for anything get_initials_avatar_url doesn't produce.
+    """
+    if not 0 < len(initials) <= MAX_INITIALS_LENGTH or initials != initials.upper():
+        raise ValueError("Invalid initials")
+    if not 0 <= color < len(AVATAR_COLORS):
+        raise ValueError("Invalid colour")
+
+    body = SVG_TEMPLATE.format(
+        initials=escape(initials, quote=True), color=AVATAR_COLORS[color]
+    ).encode()
+    return body, hashlib.sha256(body).hexdigest()[:32]
@@ -0,0 +1,356 @@
+"""
+People search over name, bio and location.
+
+Normally backed by the people_search full-text index (database.db
+SEARCH_INDEXES): FTS5 on SQLite, pg_trgm on PostgreSQL, FULLTEXT on MySQL.
+Every term matches as a prefix (trigram substring on PostgreSQL). Results
+are ranked by relevance, with name matches above location and bio
+matches, and keyset-paginated on (score, user id).
+
+Databases where the index couldn't be created (e.g. SQLite built without
+FTS5, or PostgreSQL without pg_trgm) fall back to PeopleIndex: a per-worker
+n-gram index kept current like utils/skill_index.py.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from database.db import get_db_dialect, fulltext_available, index_person
+from utils.logging_helper import log_error, log_info
+
+MAX_SEARCH_TERMS = 8
+
+# Relevance weight of a match in each field
+FIELD_WEIGHTS = {"full_name": 10.0, "bio": 1.0, "location": 3.0}
+
+PEOPLE_INDEX_MAX_AGE = 600
+PERSON_CHANGE_EVENT = "person"
+
+
+def _tokens(value):
+    """Lowercase word tokens without diacritics, safe for every dialect"""
+    normalized = unicodedata.normalize("NFKD", value or "")
+    stripped = "".join(c for c in normalized if not unicodedata.combining(c))
+    return re.findall(r"\w+", stripped.lower())
+
+
+def search_terms(query):
+    return _tokens(query)[:MAX_SEARCH_TERMS]
+
+
+def parse_cursor(cursor):
+    """(score, user_id) from a next_cursor; raises ValueError"""
+    score, user_id = cursor.split("|")
+    return float(score), int(user_id)
+
+
+def make_cursor(score, user_id):
+    return f"{score!r}|{user_id}"
+
+
+def _ranked_sql(dialect, terms, location_terms):
+    """A SELECT of (user_id, score) for every matching user, higher scores are better"""
+    params = {}
+
+    if dialect == "sqlite":
+        clauses = []
+        if terms:
+            clauses.append(" AND ".join(f'"{term}"*' for term in terms))
+        if location_terms:
+            location = " AND ".join(f'"{term}"*' for term in location_terms)
+            clauses.append(f"location : ({location})")
+        params["match"] = " AND ".join(clauses)
+        weights = ", ".join(str(FIELD_WEIGHTS[f]) for f in ("full_name", "bio", "location"))
+        # bm25 is lower for better matches
+        return (
+            f"""
+            SELECT rowid AS user_id, -bm25(people_search, {weights}) AS score
+            FROM people_search WHERE people_search MATCH :match
+        """,
+            params,
+        )
+
+    if dialect == "postgresql":
+        conditions, score_parts = [], []
+        for i, term in enumerate(terms):
+            params[f"t{i}"] = "%" + term.replace("_", "\\_") + "%"
+            conditions.append(f"document ILIKE :t{i}")
+        for i, term in enumerate(location_terms):
+            params[f"l{i}"] = "%" + term.replace("_", "\\_") + "%"
+            conditions.append(f"location ILIKE :l{i}")
+        if terms:
+            params["query"] = " ".join(terms)
+            score_parts.append(
+                f"{FIELD_WEIGHTS['full_name']} * word_similarity(:query, full_name)"
+                f" + word_similarity(:query, document)"
+            )
+        if location_terms:
+            params["location_query"] = " ".join(location_terms)
+            score_parts.append(
+                f"{FIELD_WEIGHTS['location']} * word_similarity(:location_query, location)"
+            )
+        return (
+            f"""
+            SELECT user_id, {" + ".join(score_parts)} AS score
+            FROM people_search WHERE {" AND ".join(conditions)}
+        """,
+            params,
+        )
+
+    conditions, score_parts = [], []
+    if terms:
+        params["against"] = " ".join(f"+{term}*" for term in terms)
+        conditions.append("MATCH(full_name, bio, location) AGAINST (:against IN BOOLEAN MODE)")
+        score_parts.append(
+            f"{FIELD_WEIGHTS['full_name']} * MATCH(full_name) AGAINST (:against IN BOOLEAN MODE)"
+            " + MATCH(full_name, bio, location) AGAINST (:against IN BOOLEAN MODE)"
+        )
+    if location_terms:
+        params["location_against"] = " ".join(f"+{term}*" for term in location_terms)
+        conditions.append("MATCH(location) AGAINST (:location_against IN BOOLEAN MODE)")
+        score_parts.append(
+            f"{FIELD_WEIGHTS['location']} * MATCH(location) AGAINST (:location_against IN BOOLEAN MODE)"
+        )
+    return (
+        f"""
+        SELECT user_id, {" + ".join(score_parts)} AS score
+        FROM people_search WHERE {" AND ".join(conditions)}
+    """,
+        params,
+    )
+
+
+def search_people(db, terms, location_terms, cursor=None, limit=20, geo=None):
+    """
+    One page of [(user_id, score)] from the people_search index, best
+    first. cursor is a parsed (score, user_id) from the previous page.
+    geo is an optional (condition, params) on users u, e.g. from
+    utils.geo.RadiusFilter.sql().
+    """
+    ranked, params = _ranked_sql(get_db_dialect(), terms, location_terms)
+    params["limit"] = limit
+
+    join = ""
+    if geo:
+        condition, geo_params = geo
+        join = f"JOIN users u ON u.id = ranked.user_id AND {condition}"
+        params.update(geo_params)
+
+    keyset = ""
+    if cursor:
+        keyset = """
+            WHERE ranked.score < :score
+            OR (ranked.score = :score AND ranked.user_id > :user_id)
+        """
+        params["score"], params["user_id"] = cursor
+
+    result = db.execute(
+        text(
+            f"""
+        SELECT ranked.user_id, ranked.score FROM ({ranked}) ranked
+        {join}
+        {keyset}
+        ORDER BY ranked.score DESC, ranked.user_id
+        LIMIT :limit
+    """
+        ),
+        params,
+    )
+    return [(row[0], float(row[1])) for row in result]
+
+
+def person_changed(db, user_id):
+    """
+    Re-index a user's name, bio and location inside the caller's
+    transaction. Returns them for PeopleIndex.update once committed.
+    """
+    row = db.execute(
+        text("SELECT full_name, bio, location FROM users WHERE id = :id"),
+        {"id": user_id},
+    ).fetchone()
+    if fulltext_available("people_search"):
+        index_person(db, user_id, *row)
+    return tuple(row)
+
+
+class PeopleIndex:
+    """
+    In-process fallback for the people_search index.
+
+    Postings map each field's tokens to user ids. Substring lookups go
+    through a trigram index over the token vocabulary (not over every
+    user), and terms shorter than a trigram use a sorted vocabulary for
+    prefix ranges, so memory grows with distinct words rather than users.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._broker = None
+        self._loaded_at = None
+        self._loading = False
+        self._pending = []
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}  # user_id -> {field: tokens}
+        self._postings = {field: defaultdict(set) for field in FIELD_WEIGHTS}
+        self._grams = defaultdict(set)  # trigram -> tokens containing it
+        self._vocab = []  # sorted tokens
+
+    def init_app(self, app, broker):
+        self._broker = broker
+        broker.add_listener(PERSON_CHANGE_EVENT, self._on_change)
+        app.extensions["people_index"] = self
+
+    def load(self):
+        """(Re)build the index from users"""
+        from database.db import get_db
+
+        with self._lock:
+            self._loading = True
+            self._pending = []
+
+        db = get_db()
+        try:
+            rows = db.execute(
+                text("SELECT id, full_name, bio, location FROM users")
+            ).fetchall()
+        except Exception:
+            with self._lock:
+                self._loading = False
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._reset()
+            for user_id, full_name, bio, location in rows:
+                self._set(user_id, full_name, bio, location)
+            # Changes published while the snapshot was being read
+            for change in self._pending:
+                self._set(**change)
+            self._pending = []
+            self._loading = False
+            self._loaded_at = time.monotonic()
+
+        log_info(f"People index loaded: {len(rows)} users")
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > PEOPLE_INDEX_MAX_AGE:
+            self.load()
+
+    def update(self, user_id, full_name, bio, location):
+        """Record a user's new name, bio and location here and in every other worker"""
+        change = {
+            "user_id": int(user_id),
+            "full_name": full_name,
+            "bio": bio,
+            "location": location,
+        }
+        self._on_change(change)
+        if self._broker:
+            self._broker.publish([], PERSON_CHANGE_EVENT, change)
+
+    def _on_change(self, change):
+        with self._lock:
+            if self._loading:
+                self._pending.append(change)
+            if self._loaded_at is not None or self._loading:
+                self._set(**change)
+
+    def _set(self, user_id, full_name, bio, location):
+        old = self._docs.pop(user_id, None)
+        if old:
+            for field, tokens in old.items():
+                for token in tokens:
+                    self._postings[field][token].discard(user_id)
+
+        doc = {
+            "full_name": set(_tokens(full_name)),
+            "bio": set(_tokens(bio)),
+            "location": set(_tokens(location)),
+        }
+        self._docs[user_id] = doc
+        for field, tokens in doc.items():
+            for token in tokens:
+                postings = self._postings[field]
+                if token not in postings and not self._known(token):
+                    insort(self._vocab, token)
+                    for i in range(len(token) - 2):
+                        self._grams[token[i : i + 3]].add(token)
+                postings[token].add(user_id)
+
+    def _known(self, token):
+        i = bisect_left(self._vocab, token)
+        return i < len(self._vocab) and self._vocab[i] == token
+
+    def _matching_tokens(self, term):
+        """Vocabulary tokens containing term (starting with it, if shorter than 3)"""
+        if len(term) < 3:
+            i = bisect_left(self._vocab, term)
+            matches = []
+            while i < len(self._vocab) and self._vocab[i].startswith(term):
+                matches.append(self._vocab[i])
+                i += 1
+            return matches
+
+        grams = [term[i : i + 3] for i in range(len(term) - 2)]
+        candidates = set.intersection(*(self._grams.get(g, set()) for g in grams))
+        return [token for token in candidates if term in token]
+
+    def _term_scores(self, term, fields):
+        """user_id -> best weighted match of term in any of fields"""
+        scores = {}
+        for token in self._matching_tokens(term):
+            # Whole-word matches beat prefix matches beat infix matches
+            if token == term:
+                quality = 1.0
+            elif token.startswith(term):
+                quality = 0.75
+            else:
+                quality = 0.5
+            for field in fields:
+                score = FIELD_WEIGHTS[field] * quality
+                for user_id in self._postings[field].get(token, ()):
+                    if score > scores.get(user_id, 0):
+                        scores[user_id] = score
+        return scores
+
+    def search(self, terms, location_terms, cursor=None, limit=20):
+        """Same contract as search_people"""
+        try:
+            self.ensure_loaded()
+        except Exception as e:
+            log_error("People index reload failed, serving the previous snapshot", exception=e)
+            if self._loaded_at is None:
+                raise
+
+        with self._lock:
+            per_term = [self._term_scores(term, FIELD_WEIGHTS) for term in terms]
+            per_term += [self._term_scores(term, ("location",)) for term in location_terms]
+
+        # Every term has to match
+        per_term.sort(key=len)
+        totals = dict(per_term[0]) if per_term else {}
+        for scores in per_term[1:]:
+            totals = {
+                user_id: total + scores[user_id]
+                for user_id, total in totals.items()
+                if user_id in scores
+            }
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        if cursor:
+            score, user_id = cursor
+            ranked = [
+                (uid, s) for uid, s in ranked if s < score or (s == score and uid > user_id)
+            ]
+        return ranked[:limit]
+
@@ -1,16 +1,60 @@
-def get_profile_picture_url(profile_picture, full_name):
+import zlib
+from urllib.parse import quote
+
+# Uploads processed by utils/image_pipeline.py are stored as this prefix
+# plus a key, and served at each of AVATAR_SIZES (square, in pixels)
+AVATAR_URL_PREFIX = '/media/avatars/'
+AVATAR_SIZES = (48, 128, 512)
+# Enough for the 60px list avatars on high-density screens
+DEFAULT_AVATAR_SIZE = 128
+
+# Background colours of initials avatars (utils/initials_avatar.py), all
+# dark enough for white text
+AVATAR_COLORS = (
+    '#16a085', '#27ae60', '#2980b9', '#8e44ad', '#2c3e50', '#d35400',
+    '#c0392b', '#7f8c8d', '#1f6f8b', '#6d4c41', '#5b6abf', '#b83b5e',
+)
+
+
+def get_initials(full_name):
+    """Up to two letters standing for a name"""
+    names = (full_name or '').strip().split()
+    if len(names) >= 2:
+        letters = [names[0][0], names[-1][0]]
+    elif names:
+        letters = names[0][:2]
+    else:
+        letters = 'SS'  # Default fallback
+    # Letter by letter: str.upper() can expand one ('ß' -> 'SS')
+    return ''.join(letter.upper()[0] for letter in letters)
+
+
+def get_initials_avatar_url(full_name):
+    """URL of the local initials avatar, its colour picked from the name"""
+    color = zlib.crc32((full_name or '').strip().lower().encode()) % len(AVATAR_COLORS)
+    return f"/media/initials/{quote(get_initials(full_name), safe='')}/{color}.svg"
+
+
+def get_profile_picture_url(profile_picture, full_name, size=DEFAULT_AVATAR_SIZE):
     """
-    Generate profile picture URL with fallback to UI Avatars.
+    Generate profile picture URL with fallback to an initials avatar.
     
     Args:
         profile_picture: The profile_picture value from database
         full_name: User's full name for generating initials
+        size: Displayed size in pixels; processed uploads are served at the
+            smallest variant at least this large
         
     Returns:
-        str: URL to profile picture (either uploaded image or UI Avatars)
+        str: URL to profile picture (either uploaded image or initials avatar)
     """
-    # If user has uploaded a custom picture and it's not the old default
+    # If user has uploaded a custom picture and it's not one of the old defaults
+    # (ui-avatars.com URLs until database/clear_remote_avatars.py has run)
     if profile_picture and profile_picture != 'default-avatar.png' and not profile_picture.startswith('https://ui-avatars.com'):
+        if profile_picture.startswith(AVATAR_URL_PREFIX):
+            variant = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+            return f"{profile_picture}/{variant}"
+
         # External URL
         if profile_picture.startswith('http'):
             return profile_picture
@@ -26,13 +70,4 @@ def get_profile_picture_url(profile_picture, full_name):
         # Legacy: just filename, assume in profile_pics folder
         return f"/static/uploads/profile_pics/{profile_picture}"
     
-    # Generate initials for UI Avatars
-    names = full_name.strip().split()
-    if len(names) >= 2:
-        initials = f"{names[0][0]}{names[-1][0]}"
-    elif names:
-        initials = names[0][:2]
-    else:
-        initials = "SS"  # Default fallback
-    
-    return f"https://ui-avatars.com/api/?name={initials}&background=random"
+    return get_initials_avatar_url(full_name)
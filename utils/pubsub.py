@@ -0,0 +1,396 @@
+"""
+Lightweight publish/subscribe broker for pushing chat events to clients.
+Events are fanned out to per-user subscriber queues inside each worker.
+Cross-worker delivery goes through a pluggable backend chosen by URL:
+
+- memory://          single process only (development, one gunicorn worker)
+- file:///path/log   shared append-only spool file, a local stand-in broker
+                     for several gunicorn workers on one machine
+- redis://host:6379  Redis pub/sub (requires the optional `redis` package)
+
+Server-side listeners can also register for an event name, which is how
+per-worker caches (e.g. the skill index) hear about writes made by other
+workers.
+
+Each worker keeps a short replay buffer only for users it is streaming
+to, or did within REPLAY_WINDOW_SECONDS. A reconnect it can't fully
+replay, like events a backend lost, makes clients resync from the database.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from utils.logging_helper import log_error, log_warning
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl; spool writes are then unlocked
+    fcntl = None
+
+# How long recent events are kept for replay after a reconnect
+REPLAY_WINDOW_SECONDS = 120
+REPLAY_BUFFER_PER_USER = 50
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A single client's view of the event stream"""
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Slow consumer; it will be told to resync instead of blocking publishers
+            self.overflowed = True
+
+    def resync(self):
+        """Have the client refetch from the database, waking it up now"""
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def get(self, timeout=None):
+        """Return the next event, or None if nothing arrived within timeout"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryBackend:
+    """In-process delivery only"""
+
+    def __init__(self, dispatch, on_gap=None):
+        self.dispatch = dispatch
+
+    def publish(self, payload):
+        self.dispatch(json.loads(payload))
+
+    def start(self):
+        pass
+
+
+class SpoolBackend:
+    """
+    Append-only spool file shared by all workers on one host.
+    Publishers append one JSON line per event; every worker that has
+    subscribers tails the file and dispatches to its own clients.
+
+    Past MAX_BYTES the publisher replaces the file with an empty one whose
+    first line holds the next generation number. Tailers keep the old file
+    open and read it to the end before following the new one, so nothing
+    is lost; if they still skipped a generation, on_gap() is called.
+    """
+
+    POLL_INTERVAL = 0.1
+    MAX_BYTES = 1024 * 1024
+
+    def __init__(self, dispatch, path, on_gap=None):
+        self.dispatch = dispatch
+        self.path = path
+        self.on_gap = on_gap or (lambda: None)
+        self._thread = None
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def publish(self, payload):
+        while True:
+            with open(self.path, "a+", encoding="utf-8") as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    # Rotated while we waited for the lock: write to the new file
+                    if os.fstat(f.fileno()).st_ino != os.stat(self.path).st_ino:
+                        continue
+                    f.write(payload + "\n")
+                    f.flush()
+                    if f.tell() > self.MAX_BYTES:
+                        self._rotate(f)
+                    return
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _rotate(self, f):
+        """Replace the spool, whose lock the caller holds, with an empty one"""
+        f.seek(0)
+        generation = _spool_generation(f.readline()) or 0
+        partial = f"{self.path}.{uuid.uuid4().hex}.part"
+        with open(partial, "w", encoding="utf-8") as new:
+            new.write(json.dumps({"spool": generation + 1}) + "\n")
+        try:
+            os.replace(partial, self.path)
+        except OSError as e:
+            # e.g. Windows, where an open file can't be replaced; keep appending
+            os.remove(partial)
+            log_warning(f"Chat event spool not rotated: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._tail, daemon=True)
+                self._thread.start()
+
+    def _open(self):
+        """(file positioned after the header, inode, generation) of the current spool"""
+        open(self.path, "a").close()
+        f = open(self.path, "r", encoding="utf-8")
+        generation = _spool_generation(f.readline())
+        if generation is None:
+            f.seek(0)  # no header: written before rotation, or since re-created
+        return f, os.fstat(f.fileno()).st_ino, generation or 0
+
+    def _read(self, f, buffered):
+        """Dispatch the complete lines appended since the last read"""
+        buffered += f.read()
+        *lines, buffered = buffered.split("\n")
+        for line in lines:
+            if line.strip():
+                self.dispatch(json.loads(line))
+        return buffered
+
+    def _tail(self):
+        f, inode, generation = self._open()
+        f.seek(0, os.SEEK_END)
+        buffered = ""
+
+        while True:
+            try:
+                try:
+                    rotated = os.stat(self.path).st_ino != inode
+                except FileNotFoundError:
+                    rotated = True
+                # Publishers stop writing to a file once it is replaced, so
+                # after seeing the rotation this read gets all of it
+                buffered = self._read(f, buffered)
+                if rotated:
+                    f.close()
+                    f, inode, new_generation = self._open()
+                    if new_generation != generation + 1:
+                        log_warning("Chat event spool rotated more than once between reads")
+                        self.on_gap()
+                    generation, buffered = new_generation, ""
+                    continue
+            except Exception as e:
+                log_error("Chat event spool tail failed", exception=e)
+            time.sleep(self.POLL_INTERVAL)
+
+
+def _spool_generation(line):
+    """The generation in a spool header line, or None for other lines"""
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return None
+    return header.get("spool") if isinstance(header, dict) else None
+
+
+class RedisBackend:
+    """Redis pub/sub channel shared by all workers"""
+
+    CHANNEL = "skillswap:chat-events"
+
+    def __init__(self, dispatch, url, on_gap=None):
+        import redis  # optional dependency, only needed for redis:// URLs
+
+        self.dispatch = dispatch
+        # Pub/sub drops messages while disconnected
+        self.on_gap = on_gap or (lambda: None)
+        self.client = redis.Redis.from_url(url)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, payload):
+        self.client.publish(self.CHANNEL, payload)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    self.dispatch(json.loads(message["data"]))
+            except Exception as e:
+                log_error("Chat event redis listener failed", exception=e)
+                self.on_gap()
+                time.sleep(1)
+
+
+class Broker:
+    """Fan-out of events to subscribed users, configured from CHAT_BROKER_URL"""
+
+    def __init__(self):
+        self._backend = MemoryBackend(self._dispatch)
+        self._subscribers = defaultdict(set)
+        self._recent = defaultdict(lambda: deque(maxlen=REPLAY_BUFFER_PER_USER))
+        # user_id -> [buffering since, last unsubscribed or None while subscribed]
+        self._watched = {}
+        self._listeners = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        url = app.config.get("CHAT_BROKER_URL", "memory://")
+
+        if url.startswith("file://"):
+            self._backend = SpoolBackend(self._dispatch, url[len("file://") :], self._on_gap)
+        elif url.startswith("redis://") or url.startswith("rediss://"):
+            try:
+                self._backend = RedisBackend(self._dispatch, url, self._on_gap)
+            except ImportError:
+                log_warning(
+                    "CHAT_BROKER_URL is redis but the redis package is not installed; "
+                    "falling back to in-process delivery"
+                )
+                self._backend = MemoryBackend(self._dispatch)
+        else:
+            self._backend = MemoryBackend(self._dispatch)
+
+        app.extensions["chat_broker"] = self
+
+    def publish(self, user_ids, event, data):
+        """Publish an event to every listed user. Never raises."""
+        payload = {
+            "id": uuid.uuid4().hex,
+            "ts": time.time(),
+            "users": [int(uid) for uid in user_ids],
+            "event": event,
+            "data": data,
+        }
+        try:
+            self._backend.publish(json.dumps(payload))
+        except Exception as e:
+            # Push is best effort; clients resync from the database on reconnect
+            log_error(f"Failed to publish chat event {event}", exception=e)
+
+    def subscribe(self, user_id):
+        self._backend.start()
+        subscription = Subscription(self, user_id)
+        now = time.time()
+        with self._lock:
+            if self._watching(user_id, now):
+                self._watched[user_id][1] = None
+            else:
+                # Buffered from now on; earlier events can't be replayed here
+                self._watched[user_id] = [now, None]
+                self._recent.pop(user_id, None)
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def add_listener(self, event, callback):
+        """
+        Call callback(data) in this worker for every `event` published by
+        any worker, including this one. Callbacks run on the backend's
+        delivery thread and must not block.
+        """
+        with self._lock:
+            self._listeners[event].append(callback)
+        self._backend.start()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+                    self._watched[subscription.user_id][1] = time.time()
+
+    def recent(self, user_id, since):
+        """
+        Events for user_id published after the given timestamp, or None
+        when this worker can't tell: it wasn't buffering for the user all
+        that time, since is older than the replay window, or more events
+        came in than are kept.
+        """
+        now = time.time()
+        with self._lock:
+            watched = self._watched.get(user_id)
+            if (
+                since < now - REPLAY_WINDOW_SECONDS
+                or not self._watching(user_id, now)
+                or watched[0] > since
+            ):
+                return None
+            buffer = self._recent.get(user_id)
+            if not buffer:
+                return []
+            if len(buffer) == buffer.maxlen and buffer[0]["ts"] > since:
+                return None  # older events were pushed out
+            return [e for e in buffer if e["ts"] > since]
+
+    def _watching(self, user_id, now):
+        """Whether user_id is, or was lately, subscribed here; call with the lock held"""
+        if user_id in self._subscribers:
+            return True
+        watched = self._watched.get(user_id)
+        return watched is not None and watched[1] >= now - REPLAY_WINDOW_SECONDS
+
+    def _on_gap(self):
+        """The backend lost events: everyone resyncs, and replay starts over"""
+        now = time.time()
+        with self._lock:
+            for watched in self._watched.values():
+                watched[0] = now
+            self._recent.clear()
+            for subscriptions in self._subscribers.values():
+                for subscription in subscriptions:
+                    subscription.resync()
+
+    def _dispatch(self, payload):
+        for callback in self._listeners.get(payload["event"], ()):
+            try:
+                callback(payload["data"])
+            except Exception as e:
+                log_error(f"Listener for {payload['event']} failed", exception=e)
+
+        now = time.time()
+        cutoff = now - REPLAY_WINDOW_SECONDS
+        with self._lock:
+            for user_id in payload["users"]:
+                # Only users this worker streams to, or did lately
+                if not self._watching(user_id, now):
+                    continue
+                buffer = self._recent[user_id]
+                while buffer and buffer[0]["ts"] < cutoff:
+                    buffer.popleft()
+                buffer.append(payload)
+
+                for subscription in self._subscribers.get(user_id, ()):
+                    subscription.put(payload)
+
+            # Forget users that stopped streaming here
+            if len(self._watched) > 1000:
+                for user_id in [u for u in self._watched if not self._watching(u, now)]:
+                    del self._watched[user_id]
+                    self._recent.pop(user_id, None)
@@ -0,0 +1,136 @@
+"""
+Precomputed per-user rating aggregates.
+
+user_rating_stats holds one row per reviewed user: review count, rating
+sum, a 1-5 star histogram and a Bayesian-adjusted score. create_review
+updates the row in the same transaction as the review insert, so rating
+lookups are a primary-key read instead of aggregates over reviews.
+database/rebuild_rating_stats.py recomputes the table from reviews.
+"""
+
+from sqlalchemy import text
+
+from database.db import build_in_clause
+
+# Bayesian prior: a user with few reviews is pulled towards this rating
+PRIOR_RATING = 3.5
+PRIOR_WEIGHT = 2
+
+STARS = range(1, 6)
+
+BAYESIAN_SQL = f"({PRIOR_RATING * PRIOR_WEIGHT} + rating_sum) / ({PRIOR_WEIGHT} + review_count)"
+
+# Keep IN (...) lists well under every driver's parameter limit
+CHUNK_SIZE = 500
+
+
+def record_review(db, user_id, rating):
+    """Add one rating (1-5) to user_id's stats, inside the caller's transaction"""
+    params = {"user_id": user_id, "rating": rating}
+    stars_column = f"stars_{int(rating)}"
+
+    result = db.execute(
+        text(
+            f"""
+        UPDATE user_rating_stats
+        SET review_count = review_count + 1, rating_sum = rating_sum + :rating,
+            {stars_column} = {stars_column} + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE user_id = :user_id
+    """
+        ),
+        params,
+    )
+    if result.rowcount == 0:
+        db.execute(
+            text(
+                f"""
+            INSERT INTO user_rating_stats (user_id, review_count, rating_sum, {stars_column})
+            VALUES (:user_id, 1, :rating, 1)
+        """
+            ),
+            params,
+        )
+
+    # Separate statement: MySQL evaluates SET assignments left to right
+    db.execute(
+        text(
+            f"UPDATE user_rating_stats SET bayesian_score = {BAYESIAN_SQL} WHERE user_id = :user_id"
+        ),
+        params,
+    )
+
+
+def rebuild_rating_stats(db, user_ids=None):
+    """Recompute rows from reviews: for user_ids, or for everyone if None"""
+    stats_condition = reviews_condition = "1=1"
+    params = {}
+    if user_ids is not None:
+        placeholders, params = build_in_clause("u", user_ids)
+        stats_condition = f"user_id IN ({placeholders})"
+        reviews_condition = f"reviewed_id IN ({placeholders})"
+
+    db.execute(text(f"DELETE FROM user_rating_stats WHERE {stats_condition}"), params)
+    star_sums = ", ".join(
+        f"SUM(CASE WHEN rating = {star} THEN 1 ELSE 0 END)" for star in STARS
+    )
+    result = db.execute(
+        text(
+            f"""
+        INSERT INTO user_rating_stats (
+            user_id, review_count, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5,
+            bayesian_score
+        )
+        SELECT reviewed_id, COUNT(*), SUM(rating), {star_sums},
+            ({PRIOR_RATING * PRIOR_WEIGHT} + SUM(rating)) / ({PRIOR_WEIGHT} + COUNT(*))
+        FROM reviews
+        WHERE {reviews_condition}
+        GROUP BY reviewed_id
+    """
+        ),
+        params,
+    )
+    return result.rowcount
+
+
+def _stats_dict(row):
+    """API shape of a user_rating_stats row (None = no reviews yet)"""
+    if row is None:
+        return {
+            "count": 0,
+            "average": 0,
+            "score": PRIOR_RATING,
+            "histogram": {str(star): 0 for star in STARS},
+        }
+
+    row_dict = row._mapping
+    count = int(row_dict["review_count"])
+    return {
+        "count": count,
+        "average": round(row_dict["rating_sum"] / count, 1) if count else 0,
+        "score": round(float(row_dict["bayesian_score"] or PRIOR_RATING), 2),
+        "histogram": {str(star): int(row_dict[f"stars_{star}"]) for star in STARS},
+    }
+
+
+def get_rating_stats(db, user_id):
+    """Rating stats of one user"""
+    row = db.execute(
+        text("SELECT * FROM user_rating_stats WHERE user_id = :user_id"),
+        {"user_id": user_id},
+    ).fetchone()
+    return _stats_dict(row)
+
+
+def load_rating_stats(db, user_ids):
+    """Rating stats of many users, keyed by user id (users without reviews included)"""
+    stats = {}
+    user_ids = list(user_ids)
+    for i in range(0, len(user_ids), CHUNK_SIZE):
+        placeholders, params = build_in_clause("u", user_ids[i : i + CHUNK_SIZE])
+        result = db.execute(
+            text(f"SELECT * FROM user_rating_stats WHERE user_id IN ({placeholders})"),
+            params,
+        )
+        for row in result:
+            stats[row._mapping["user_id"]] = _stats_dict(row)
+    return {user_id: stats.get(user_id) or _stats_dict(None) for user_id in user_ids}
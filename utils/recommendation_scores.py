@@ -0,0 +1,506 @@
+"""
+Precomputed recommendation scores.
+
+recommendation_scores holds, per learner, the MAX_SCORES_PER_LEARNER best
+(teacher, skill) pairs where the teacher teaches a skill the learner wants.
+Its score (0-1000) blends the signals below.
+/api/matching/recommendations serves it with keyset pagination, so a page
+costs one index range scan.
+
+Whenever something that feeds a user's scores changes (their skills, a
+review of them, their location or their availability), the request only
+marks them stale (users.scores_stale_at). ScoreRefresher recomputes stale
+users on a background thread in each worker, leasing each user to one
+refresher for REFRESH_LEASE_SECONDS. A refreshed learner gets a complete
+top list. As a teacher, they are rescored for TEACHER_BATCH_SIZE
+learners per transaction. Their rows in other learners' lists are rescored and kept if they
+still make the cut; a teacher that falls out of the cut leaves a slot
+that database/rebuild_recommendation_scores.py refills. Recency also
+decays with time alone, so that script should run periodically (e.g.
+nightly) to recompute everything.
+"""
+
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from database.db import build_in_clause, get_db
+from utils.availability import decode_mask, overlap_hours
+from utils.logging_helper import log_error
+from utils.geo import distance_km
+from utils.rating_stats import load_rating_stats
+
+# Weights of each signal; they sum to 1
+WEIGHTS = {
+    "proficiency": 0.30,
+    "rating": 0.25,
+    "review_count": 0.05,
+    "reciprocity": 0.15,
+    "recency": 0.10,
+    "location": 0.05,
+    "availability": 0.10,
+}
+
+PROFICIENCY_ORDINAL = {"Beginner": 1, "Intermediate": 2, "Expert": 3}
+
+REVIEW_COUNT_CAP = 10
+
+RECENCY_HALF_LIFE_DAYS = 30
+
+# Teachers this close to the learner count as local
+LOCAL_RADIUS_KM = 50
+
+# Weekly hours in common that earn the full availability signal
+AVAILABILITY_OVERLAP_CAP = 10
+
+SCORE_SCALE = 1000
+
+# Rows kept per learner, enough for the first pages of recommendations
+MAX_SCORES_PER_LEARNER = 200
+
+# Learners rescored per transaction when a teacher is refreshed
+TEACHER_BATCH_SIZE = 500
+
+# How long a claimed stale user is left to one refresher; after that
+# (e.g. the worker was restarted mid-refresh) another one takes it over
+REFRESH_LEASE_SECONDS = 600
+
+# Keep IN (...) lists well under every driver's parameter limit
+CHUNK_SIZE = 500
+
+
+def _utcnow():
+    # Naive UTC, like CURRENT_TIMESTAMP values read back from the database
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _normalize_location(value):
+    return " ".join(value.lower().split()) if value else ""
+
+
+def _availability_mask(value):
+    try:
+        return decode_mask(value)
+    except ValueError:
+        return 0
+
+
+def compute_score(proficiency, teacher, learner, reciprocal, now=None):
+    """
+    Score one teacher for one learner and skill.
+
+    teacher/learner are feature dicts from _load_features: rating (the
+    Bayesian-adjusted score from user_rating_stats), review_count,
+    last_active_at, location, coordinates and availability (a mask).
+    """
+    now = now or _utcnow()
+
+    proficiency_score = PROFICIENCY_ORDINAL.get(proficiency, 1) / len(
+        PROFICIENCY_ORDINAL
+    )
+
+    rating_score = teacher["rating"] / 5
+
+    count_score = min(teacher["review_count"], REVIEW_COUNT_CAP) / REVIEW_COUNT_CAP
+
+    last_active = teacher["last_active_at"]
+    if last_active:
+        idle_days = max((now - last_active).total_seconds() / 86400, 0)
+        recency_score = math.pow(0.5, idle_days / RECENCY_HALF_LIFE_DAYS)
+    else:
+        recency_score = 0
+
+    if teacher["coordinates"] and learner["coordinates"]:
+        km = distance_km(*teacher["coordinates"], *learner["coordinates"])
+        location_score = 1 if km <= LOCAL_RADIUS_KM else 0
+    else:
+        # Locations the gazetteer couldn't resolve
+        location_score = (
+            1
+            if teacher["location"] and teacher["location"] == learner["location"]
+            else 0
+        )
+
+    # Users who haven't set an availability score 0 here, uniformly
+    shared_hours = overlap_hours(teacher["availability"], learner["availability"])
+    availability_score = min(shared_hours, AVAILABILITY_OVERLAP_CAP) / AVAILABILITY_OVERLAP_CAP
+
+    score = (
+        WEIGHTS["proficiency"] * proficiency_score
+        + WEIGHTS["rating"] * rating_score
+        + WEIGHTS["review_count"] * count_score
+        + WEIGHTS["reciprocity"] * (1 if reciprocal else 0)
+        + WEIGHTS["recency"] * recency_score
+        + WEIGHTS["location"] * location_score
+        + WEIGHTS["availability"] * availability_score
+    )
+    return int(round(score * SCORE_SCALE))
+
+
+def _chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i : i + CHUNK_SIZE]
+
+
+def _load_features(db, user_ids):
+    """Per-user scoring inputs: ratings, activity, location, availability and skill sets"""
+    features = {}
+    for chunk in _chunks(user_ids):
+        placeholders, params = build_in_clause("u", chunk)
+
+        result = db.execute(
+            text(
+                f"""
+            SELECT id, location, latitude, longitude, availability_slots,
+                COALESCE(last_active_at, created_at) AS last_active_at
+            FROM users WHERE id IN ({placeholders})
+        """
+            ),
+            params,
+        )
+        for row in result:
+            row_dict = row._mapping
+            features[row_dict["id"]] = {
+                "location": _normalize_location(row_dict["location"]),
+                "coordinates": (
+                    (row_dict["latitude"], row_dict["longitude"])
+                    if row_dict["latitude"] is not None
+                    else None
+                ),
+                "last_active_at": _to_datetime(row_dict["last_active_at"]),
+                "availability": _availability_mask(row_dict["availability_slots"]),
+                "teaches": set(),
+                "learns": set(),
+            }
+
+        for user_id, stats in load_rating_stats(db, chunk).items():
+            if user_id in features:
+                features[user_id].update(
+                    rating=stats["score"], review_count=stats["count"]
+                )
+
+        result = db.execute(
+            text(
+                f"""
+            SELECT user_id, skill_id, is_teaching, is_learning
+            FROM user_skills WHERE user_id IN ({placeholders})
+        """
+            ),
+            params,
+        )
+        for row in result:
+            user_id, skill_id, is_teaching, is_learning = row
+            if user_id in features:
+                if is_teaching:
+                    features[user_id]["teaches"].add(skill_id)
+                if is_learning:
+                    features[user_id]["learns"].add(skill_id)
+
+    return features
+
+
+def _score_pairs(db, pairs):
+    """Score (learner_id, teacher_id, skill_id, proficiency) pairs into rows"""
+    if not pairs:
+        return []
+
+    user_ids = {p[0] for p in pairs} | {p[1] for p in pairs}
+    features = _load_features(db, user_ids)
+    now = _utcnow()
+
+    rows = []
+    for learner_id, teacher_id, skill_id, proficiency in pairs:
+        learner = features.get(learner_id)
+        teacher = features.get(teacher_id)
+        if not learner or not teacher:
+            continue
+        # The swap works both ways if the teacher wants something the learner teaches
+        reciprocal = bool(teacher["learns"] & learner["teaches"])
+        rows.append(
+            {
+                "learner_id": learner_id,
+                "teacher_id": teacher_id,
+                "skill_id": skill_id,
+                "score": compute_score(proficiency, teacher, learner, reciprocal, now),
+            }
+        )
+    return rows
+
+
+def _rank(row):
+    """Sort key matching the (score, teacher_id, skill_id) DESC order pages are served in"""
+    return (row["score"], row["teacher_id"], row["skill_id"])
+
+
+def _top_per_learner(rows):
+    """Each learner's MAX_SCORES_PER_LEARNER best rows"""
+    by_learner = {}
+    for row in rows:
+        by_learner.setdefault(row["learner_id"], []).append(row)
+    return [
+        row
+        for learner_rows in by_learner.values()
+        for row in sorted(learner_rows, key=_rank, reverse=True)[:MAX_SCORES_PER_LEARNER]
+    ]
+
+
+def _insert_scores(db, rows):
+    if rows:
+        db.execute(
+            text(
+                """
+            INSERT INTO recommendation_scores (learner_id, teacher_id, skill_id, score)
+            VALUES (:learner_id, :teacher_id, :skill_id, :score)
+        """
+            ),
+            rows,
+        )
+    return len(rows)
+
+
+def _trim_learners(db, learner_ids):
+    """Drop the lowest rows of learners now holding more than MAX_SCORES_PER_LEARNER"""
+    for chunk in _chunks(learner_ids):
+        placeholders, params = build_in_clause("l", chunk)
+        result = db.execute(
+            text(
+                f"""
+            SELECT learner_id, COUNT(*) FROM recommendation_scores
+            WHERE learner_id IN ({placeholders})
+            GROUP BY learner_id HAVING COUNT(*) > :max_rows
+        """
+            ),
+            {**params, "max_rows": MAX_SCORES_PER_LEARNER},
+        )
+        for learner_id, count in result.fetchall():
+            excess = db.execute(
+                text(
+                    """
+                SELECT teacher_id, skill_id FROM recommendation_scores
+                WHERE learner_id = :learner_id
+                ORDER BY score, teacher_id, skill_id
+                LIMIT :excess
+            """
+                ),
+                {"learner_id": learner_id, "excess": count - MAX_SCORES_PER_LEARNER},
+            ).fetchall()
+            db.execute(
+                text(
+                    """
+                DELETE FROM recommendation_scores
+                WHERE learner_id = :learner_id AND teacher_id = :teacher_id
+                    AND skill_id = :skill_id
+            """
+                ),
+                [
+                    {"learner_id": learner_id, "teacher_id": teacher_id, "skill_id": skill_id}
+                    for teacher_id, skill_id in excess
+                ],
+            )
+
+
+# Candidate pairs: learner wants a skill that someone else teaches
+PAIRS_QUERY = """
+    SELECT l.user_id, t.user_id, t.skill_id, t.proficiency_level
+    FROM user_skills l
+    JOIN user_skills t ON t.skill_id = l.skill_id AND t.is_teaching = 1
+        AND t.user_id != l.user_id
+    WHERE l.is_learning = 1 AND {condition}
+"""
+
+
+def _pairs(db, condition, params):
+    return [tuple(row) for row in db.execute(text(PAIRS_QUERY.format(condition=condition)), params)]
+
+
+def mark_stale(db, user_id):
+    """Queue user_id's scores for ScoreRefresher, in the caller's transaction"""
+    db.execute(
+        text("UPDATE users SET scores_stale_at = CURRENT_TIMESTAMP WHERE id = :id"),
+        {"id": user_id},
+    )
+
+
+def _rescore_as_teacher(db, user_id, after):
+    """
+    Score teacher user_id for the next TEACHER_BATCH_SIZE learners (by
+    id, after `after`) who want a skill they teach, and store the rows
+    that make those learners' top lists. Returns the last learner id, or
+    None when there are no more.
+    """
+    learner_ids = [
+        row[0]
+        for row in db.execute(
+            text(
+                """
+            SELECT DISTINCT l.user_id FROM user_skills l
+            JOIN user_skills t ON t.skill_id = l.skill_id AND t.is_teaching = 1
+            WHERE t.user_id = :user_id AND l.is_learning = 1
+                AND l.user_id != :user_id AND l.user_id > :after
+            ORDER BY l.user_id LIMIT :limit
+        """
+            ),
+            {"user_id": user_id, "after": after, "limit": TEACHER_BATCH_SIZE},
+        )
+    ]
+    if not learner_ids:
+        return None
+
+    placeholders, params = build_in_clause("l", learner_ids)
+    pairs = _pairs(
+        db, f"t.user_id = :user_id AND l.user_id IN ({placeholders})", {**params, "user_id": user_id}
+    )
+    # Offered to every learner; those whose list is full keep the best rows
+    _insert_scores(db, _score_pairs(db, pairs))
+    _trim_learners(db, learner_ids)
+    return learner_ids[-1]
+
+
+def refresh_user_scores(db, user_id):
+    """
+    Recompute user_id's own top list, then rescore their rows as a
+    teacher in other learners' lists one batch of learners at a time,
+    committing each.
+    """
+    rebuild_learner_scores(db, [user_id])
+    db.execute(
+        text("DELETE FROM recommendation_scores WHERE teacher_id = :user_id"),
+        {"user_id": user_id},
+    )
+    db.commit()
+
+    after = 0
+    while after is not None:
+        after = _rescore_as_teacher(db, user_id, after)
+        db.commit()
+
+
+def refresh_stale_scores(db, batch_size=50):
+    """
+    Refresh up to batch_size users marked by mark_stale(), oldest first.
+    Returns how many were refreshed.
+    """
+    now = _utcnow()
+    stale = db.execute(
+        text(
+            """
+        SELECT id, scores_stale_at FROM users WHERE scores_stale_at <= :now
+        ORDER BY scores_stale_at, id LIMIT :limit
+    """
+        ),
+        {"now": now, "limit": batch_size},
+    ).fetchall()
+
+    refreshed = 0
+    lease = now + timedelta(seconds=REFRESH_LEASE_SECONDS)
+    for user_id, stale_at in stale:
+        # Lease the user first, so two workers never refresh them at once
+        claimed = db.execute(
+            text(
+                """
+            UPDATE users SET scores_stale_at = :lease
+            WHERE id = :id AND scores_stale_at = :stale_at
+        """
+            ),
+            {"id": user_id, "stale_at": stale_at, "lease": lease},
+        ).rowcount
+        db.commit()
+        if claimed != 1:
+            continue
+
+        try:
+            refresh_user_scores(db, user_id)
+            # Still stale if a change marked them again meanwhile
+            db.execute(
+                text(
+                    """
+                UPDATE users SET scores_stale_at = NULL
+                WHERE id = :id AND scores_stale_at = :lease
+            """
+                ),
+                {"id": user_id, "lease": lease},
+            )
+            db.commit()
+            refreshed += 1
+        except Exception as e:
+            db.rollback()
+            mark_stale(db, user_id)
+            db.commit()
+            log_error(f"Refreshing recommendation scores of user {user_id} failed", exception=e)
+    return refreshed
+
+
+def rebuild_learner_scores(db, learner_ids):
+    """Recompute all rows of a batch of learners (used by the full rebuild)"""
+    placeholders, params = build_in_clause("l", learner_ids)
+    db.execute(
+        text(f"DELETE FROM recommendation_scores WHERE learner_id IN ({placeholders})"),
+        params,
+    )
+    pairs = _pairs(db, f"l.user_id IN ({placeholders})", params)
+    return _insert_scores(db, _top_per_learner(_score_pairs(db, pairs)))
+
+
+class ScoreRefresher:
+    """Refreshes stale recommendation scores on a background thread in each worker"""
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0
+        self._thread = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        # RECOMMENDATION_REFRESH_SECONDS = 0 leaves stale users to
+        # database/rebuild_recommendation_scores.py --stale-only
+        self.interval = app.config.get("RECOMMENDATION_REFRESH_SECONDS", 10)
+        if self.interval:
+            # Started by the first request rather than here, so scripts that
+            # create the app don't refresh too; users left stale by an
+            # earlier process are picked up right away
+            app.before_request(self.start)
+        app.extensions["score_refresher"] = self
+
+    def start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="score-refresher", daemon=True
+                    )
+                    self._thread.start()
+
+    def wake(self):
+        """Refresh soon; call after committing a mark_stale()"""
+        if self.interval:
+            self.start()
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    db = get_db()
+                    try:
+                        while refresh_stale_scores(db):
+                            pass
+                    finally:
+                        db.close()
+            except Exception as e:
+                log_error("Refreshing stale recommendation scores failed", exception=e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
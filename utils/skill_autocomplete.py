@@ -0,0 +1,256 @@
+"""
+Typo-tolerant skill autocomplete.
+
+Words of each skill's name, aliases and description go into a prefix
+trie, whose nodes hold skill id -> field weight postings, so a term that
+is a prefix of an indexed word is a walk plus a subtree scan. Name and
+alias words are also indexed by character bigram. A term with no prefix
+match in a skill is then compared with those candidate words by prefix
+edit distance, so "pyhto" still finds Python.
+
+Every query term has to match for a skill to be suggested. Scores add
+up across terms, whole-name prefixes get a bonus, and skills with more
+teachers rank higher. SkillCatalog feeds each new snapshot to update(),
+which only re-indexes skills that were added, changed or removed.
+"""
+
+import heapq
+import math
+import re
+import threading
+import unicodedata
+
+MAX_QUERY_TERMS = 5
+
+# Relevance weight of a word in each field
+FIELD_WEIGHTS = {"name": 3.0, "aliases": 2.0, "description": 0.5}
+# Multiplier when the term is only a prefix of the word / a fuzzy match
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.4
+NAME_PREFIX_BONUS = 2.0
+# Score multiplier per e-fold of teachers: 1 + TEACHER_BOOST * ln(1 + teachers)
+TEACHER_BOOST = 0.15
+
+FUZZY_MIN_LENGTH = 3
+
+
+def _normalize(value):
+    """Lowercase without diacritics"""
+    normalized = unicodedata.normalize("NFKD", value or "")
+    return "".join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+def _tokens(value):
+    return re.findall(r"\w+", _normalize(value))
+
+
+def _bigrams(token):
+    return {token[i:i + 2] for i in range(len(token) - 1)}
+
+
+def max_edits(term):
+    return 1 if len(term) < 6 else 2
+
+
+def prefix_distance(term, word, limit):
+    """
+    Fewest edits (insertions, deletions, substitutions or swaps of adjacent
+    letters) turning term into some prefix of word, or None when more than
+    limit.
+    """
+    before, previous = None, list(range(len(term) + 1))
+    best = previous[-1]
+    for i, char in enumerate(word, 1):
+        current = [i]
+        for j, term_char in enumerate(term, 1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (term_char != char),
+            )
+            if before and j > 1 and term_char == word[i - 2] and term[j - 2] == char:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        best = min(best, current[-1])
+        if min(current) > limit:
+            break
+        before, previous = previous, current
+    return best if best <= limit else None
+
+
+class _Node:
+    __slots__ = ("children", "postings")
+
+    def __init__(self):
+        self.children = {}
+        self.postings = {}  # skill_id -> field weight
+
+
+class SkillAutocomplete:
+    """Ranked skill suggestions for a partial query"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._root = _Node()
+        self._grams = {}  # bigram -> name/alias words containing it
+        self._gram_refs = {}  # name/alias word -> number of skills using it
+        self._skills = {}  # skill_id -> skill dict
+        self._indexed = {}  # skill_id -> (signature, [(word, weight)])
+        self._phrases = {}  # skill_id -> normalized name
+
+    @staticmethod
+    def _signature(skill):
+        return (skill["name"], skill.get("aliases"), skill.get("description"))
+
+    def update(self, skills):
+        """Re-index the skills that differ from the last update; returns (added, removed)"""
+        with self._lock:
+            current = {skill["id"]: skill for skill in skills}
+            removed = [
+                skill_id
+                for skill_id, (signature, _) in self._indexed.items()
+                if skill_id not in current
+                or self._signature(current[skill_id]) != signature
+            ]
+            for skill_id in removed:
+                self._remove(skill_id)
+            added = [skill for skill_id, skill in current.items() if skill_id not in self._indexed]
+            for skill in added:
+                self._add(skill)
+            # Category and the like can change without re-indexing
+            self._skills = current
+            return len(added), len(removed)
+
+    def _add(self, skill):
+        words = {}
+        fields = {
+            "name": skill["name"],
+            "aliases": (skill.get("aliases") or "").replace("|", " "),
+            "description": skill.get("description"),
+        }
+        for field, value in fields.items():
+            for word in _tokens(value):
+                words[word] = max(words.get(word, 0), FIELD_WEIGHTS[field])
+
+        for word, weight in words.items():
+            node = self._root
+            for char in word:
+                node = node.children.setdefault(char, _Node())
+            node.postings[skill["id"]] = weight
+            if weight >= FIELD_WEIGHTS["aliases"]:
+                self._gram_refs[word] = self._gram_refs.get(word, 0) + 1
+                if self._gram_refs[word] == 1:
+                    for gram in _bigrams(word):
+                        self._grams.setdefault(gram, set()).add(word)
+        self._indexed[skill["id"]] = (self._signature(skill), list(words.items()))
+        self._phrases[skill["id"]] = " ".join(_tokens(skill["name"]))
+
+    def _remove(self, skill_id):
+        _, words = self._indexed.pop(skill_id)
+        del self._phrases[skill_id]
+        for word, weight in words:
+            path = [self._root]
+            for char in word:
+                path.append(path[-1].children[char])
+            path[-1].postings.pop(skill_id, None)
+            # Prune nodes left without postings or children
+            for depth in range(len(word), 0, -1):
+                node = path[depth]
+                if node.postings or node.children:
+                    break
+                del path[depth - 1].children[word[depth - 1]]
+
+            if weight >= FIELD_WEIGHTS["aliases"]:
+                self._gram_refs[word] -= 1
+                if not self._gram_refs[word]:
+                    del self._gram_refs[word]
+                    for gram in _bigrams(word):
+                        self._grams[gram].discard(word)
+                        if not self._grams[gram]:
+                            del self._grams[gram]
+
+    def _prefix_scores(self, term):
+        """skill_id -> best score of words starting with term"""
+        node = self._root
+        for char in term:
+            node = node.children.get(char)
+            if node is None:
+                return {}
+
+        scores = {}
+        stack = [(node, True)]
+        while stack:
+            node, exact = stack.pop()
+            factor = 1.0 if exact else PREFIX_FACTOR
+            for skill_id, weight in node.postings.items():
+                if weight * factor > scores.get(skill_id, 0):
+                    scores[skill_id] = weight * factor
+            stack.extend((child, False) for child in node.children.values())
+        return scores
+
+    def _fuzzy_scores(self, term, skip):
+        """skill_id -> best score of name/alias words within max_edits of term"""
+        limit = max_edits(term)
+        candidates = set()
+        for gram in _bigrams(term):
+            candidates |= self._grams.get(gram, set())
+
+        scores = {}
+        for word in candidates:
+            if len(word) < len(term) - limit:
+                continue
+            distance = prefix_distance(term, word, limit)
+            if not distance:
+                continue  # None, or a prefix match already scored
+            node = self._root
+            for char in word:
+                node = node.children[char]
+            for skill_id, weight in node.postings.items():
+                if skill_id in skip:
+                    continue
+                score = weight * FUZZY_FACTOR / distance
+                if score > scores.get(skill_id, 0):
+                    scores[skill_id] = score
+        return scores
+
+    def search(self, query, limit=8, teachers=None):
+        """
+        Up to limit (skill, score) pairs, best first. teachers(skill_id)
+        gives the teacher count used for the popularity boost.
+        """
+        terms = _tokens(query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+
+        with self._lock:
+            totals = None
+            for term in terms:
+                scores = self._prefix_scores(term)
+                if len(term) >= FUZZY_MIN_LENGTH:
+                    for skill_id, score in self._fuzzy_scores(term, scores).items():
+                        scores[skill_id] = score
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {
+                        skill_id: total + scores[skill_id]
+                        for skill_id, total in totals.items()
+                        if skill_id in scores
+                    }
+                if not totals:
+                    return []
+
+            phrase = " ".join(terms)
+            ranked = []
+            for skill_id, score in totals.items():
+                skill = self._skills.get(skill_id)
+                if skill is None:
+                    continue
+                if self._phrases[skill_id].startswith(phrase):
+                    score += NAME_PREFIX_BONUS
+                if teachers:
+                    score *= 1 + TEACHER_BOOST * math.log1p(teachers(skill_id))
+                ranked.append((score, -skill_id, skill))
+
+        best = heapq.nlargest(limit, ranked, key=lambda item: item[:2])
+        return [(skill, score) for score, _, skill in best]
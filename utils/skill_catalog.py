@@ -0,0 +1,153 @@
+"""
+In-process cache of the skills catalog.
+
+The skills table changes only when scripts add skills, yet every page that
+shows a skill picker fetched all of it. Each worker keeps one immutable
+snapshot (skills ordered by category and name, the category list, and an
+ETag over both) and serves /api/skills from it, filtering searches in
+Python. Its autocomplete index (utils/skill_autocomplete.py) is updated
+from each new snapshot, and the snapshot carries the skill taxonomy
+(utils/skill_taxonomy.py) that matching expands skills with.
+
+Writers call bump_catalog_version in the transaction that changes skills.
+Workers compare the stored version with their snapshot's at most every
+CATALOG_CHECK_SECONDS, a primary-key lookup, and reload only when it
+moved. The ETag is a digest of the content rather than the version, so it
+stays the same across restarts and workers.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import text
+
+from utils.logging_helper import log_error, log_info
+from utils.skill_autocomplete import SkillAutocomplete
+
+CATALOG_CHECK_SECONDS = 5
+CATALOG_VERSION_NAME = "skills"
+
+Snapshot = namedtuple("Snapshot", "version skills categories etag taxonomy")
+
+
+def bump_catalog_version(db):
+    """Mark the catalog changed, in the caller's transaction"""
+    result = db.execute(
+        text("UPDATE cache_versions SET version = version + 1 WHERE name = :name"),
+        {"name": CATALOG_VERSION_NAME},
+    )
+    if not result.rowcount:
+        db.execute(
+            text("INSERT INTO cache_versions (name, version) VALUES (:name, 1)"),
+            {"name": CATALOG_VERSION_NAME},
+        )
+
+
+def _read_version(db):
+    version = db.execute(
+        text("SELECT version FROM cache_versions WHERE name = :name"),
+        {"name": CATALOG_VERSION_NAME},
+    ).scalar()
+    return version or 0
+
+
+def filter_skills(skills, query="", category=""):
+    """
+    Skills in a category (exact match), or whose name contains query
+    (case-insensitive), ordered by name. All of them when neither is given.
+    """
+    if category:
+        matches = [skill for skill in skills if skill["category"] == category]
+    elif query:
+        needle = query.casefold()
+        matches = [skill for skill in skills if needle in skill["name"].casefold()]
+    else:
+        return list(skills)
+    return sorted(matches, key=lambda skill: skill["name"])
+
+
+class SkillCatalog:
+    """All skills and categories, reloaded when the catalog version changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = None
+        self.autocomplete = SkillAutocomplete()
+
+    def init_app(self, app):
+        app.extensions["skill_catalog"] = self
+
+    def load(self):
+        """(Re)read the catalog and its version"""
+        from database.db import get_db
+        from utils.skill_taxonomy import SkillTaxonomy, load_paths
+
+        db = get_db()
+        try:
+            # Version first: a bump landing in between triggers another reload
+            version = _read_version(db)
+            rows = db.execute(
+                text(
+                    "SELECT id, name, category, parent_id, aliases, description FROM skills "
+                    "ORDER BY category, name"
+                )
+            ).fetchall()
+            paths = load_paths(db)
+        finally:
+            db.close()
+
+        skills = tuple(dict(row._mapping) for row in rows)
+        categories = tuple(sorted({skill["category"] for skill in skills}))
+        digest = hashlib.sha256(
+            json.dumps([skills, categories], sort_keys=True, default=str).encode()
+        ).hexdigest()
+        added, removed = self.autocomplete.update(skills)
+        self._checked_at = time.monotonic()
+        self._snapshot = Snapshot(
+            version, skills, categories, digest[:32], SkillTaxonomy(paths)
+        )
+        log_info(
+            f"Skill catalog loaded: {len(skills)} skills (version {version}), "
+            f"autocomplete +{added} -{removed}"
+        )
+        return self._snapshot
+
+    def _current_version(self):
+        from database.db import get_db
+
+        db = get_db()
+        try:
+            return _read_version(db)
+        finally:
+            db.close()
+
+    def snapshot(self):
+        """
+        The current catalog. Checks the version when the last check is older
+        than CATALOG_CHECK_SECONDS, and keeps serving the previous snapshot
+        if that check or the reload fails.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < CATALOG_CHECK_SECONDS:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have checked while we waited
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < CATALOG_CHECK_SECONDS:
+                return snapshot
+            try:
+                if snapshot is not None and self._current_version() == snapshot.version:
+                    self._checked_at = time.monotonic()
+                    return snapshot
+                return self.load()
+            except Exception as e:
+                if snapshot is None:
+                    raise
+                log_error("Skill catalog refresh failed, serving the previous snapshot", exception=e)
+                self._checked_at = time.monotonic()
+                return snapshot
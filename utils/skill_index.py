@@ -0,0 +1,182 @@
+"""
+In-memory inverted index of user_skills for swap matching.
+
+Each worker keeps skill -> {teacher ids} / {learner ids} plus the reverse
+user -> skills maps, so a mutual-match query is a handful of set lookups
+instead of self-joins on user_skills. The index is loaded at boot and kept
+current by add_skill / remove_skill: the writing worker applies the change
+immediately and publishes it on the broker so the other workers apply it
+too. A full reload after SKILL_INDEX_MAX_AGE seconds bounds any drift
+(e.g. rows written by scripts, or memory:// with several workers).
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import text
+
+from utils.logging_helper import log_error, log_info
+
+SKILL_INDEX_MAX_AGE = 600
+SKILL_CHANGE_EVENT = "user_skill"
+
+
+class SkillIndex:
+    """Teachers and learners per skill, and skills per user"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._broker = None
+        self._loaded_at = None
+        self._loading = False
+        self._pending = []
+        self._reset()
+
+    def _reset(self):
+        self.teachers = defaultdict(set)  # skill_id -> user ids
+        self.learners = defaultdict(set)
+        self.teaches = defaultdict(set)  # user_id -> skill ids
+        self.learns = defaultdict(set)
+
+    def init_app(self, app, broker):
+        self._broker = broker
+        broker.add_listener(SKILL_CHANGE_EVENT, self._on_change)
+        app.extensions["skill_index"] = self
+
+    def load(self):
+        """(Re)build the index from user_skills"""
+        from database.db import get_db
+
+        with self._lock:
+            self._loading = True
+            self._pending = []
+
+        db = get_db()
+        try:
+            rows = db.execute(
+                text(
+                    "SELECT user_id, skill_id, is_teaching, is_learning FROM user_skills"
+                )
+            ).fetchall()
+        except Exception:
+            with self._lock:
+                self._loading = False
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._reset()
+            for user_id, skill_id, is_teaching, is_learning in rows:
+                self._set(user_id, skill_id, is_teaching, is_learning)
+            # Changes published while the snapshot was being read
+            for change in self._pending:
+                self._set(**change)
+            self._pending = []
+            self._loading = False
+            self._loaded_at = time.monotonic()
+
+        log_info(f"Skill index loaded: {len(rows)} user skills")
+
+    def ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > SKILL_INDEX_MAX_AGE:
+            self.load()
+
+    def update(self, user_id, skill_id, is_teaching=False, is_learning=False):
+        """
+        Record a user's new state for one skill (both flags False = removed)
+        here and in every other worker.
+        """
+        change = {
+            "user_id": int(user_id),
+            "skill_id": int(skill_id),
+            "is_teaching": bool(is_teaching),
+            "is_learning": bool(is_learning),
+        }
+        self._on_change(change)
+        if self._broker:
+            self._broker.publish([], SKILL_CHANGE_EVENT, change)
+
+    def _on_change(self, change):
+        with self._lock:
+            if self._loading:
+                self._pending.append(change)
+            if self._loaded_at is not None or self._loading:
+                self._set(**change)
+
+    def _set(self, user_id, skill_id, is_teaching, is_learning):
+        for flag, by_skill, by_user in (
+            (is_teaching, self.teachers, self.teaches),
+            (is_learning, self.learners, self.learns),
+        ):
+            if flag:
+                by_skill[skill_id].add(user_id)
+                by_user[user_id].add(skill_id)
+            else:
+                by_skill.get(skill_id, set()).discard(user_id)
+                by_user.get(user_id, set()).discard(skill_id)
+
+    def _fresh(self):
+        """ensure_loaded, but keep serving the previous snapshot if a reload fails"""
+        try:
+            self.ensure_loaded()
+        except Exception as e:
+            log_error("Skill index reload failed, serving the previous snapshot", exception=e)
+            if self._loaded_at is None:
+                raise
+
+    def count(self, skill_id, teaching=True):
+        """
+        Number of teachers (or learners) of a skill. May lag the database
+        by up to a reload, so callers should present it as an estimate.
+        """
+        self._fresh()
+        with self._lock:
+            by_skill = self.teachers if teaching else self.learners
+            return len(by_skill.get(skill_id, ()))
+
+    def mutual_matches(self, user_id, limit=20, taxonomy=None):
+        """
+        Users who teach something user_id wants to learn AND want to learn
+        something user_id teaches, most overlapping skills first. With a
+        SkillTaxonomy (utils/skill_taxonomy.py), teaching a skill under one
+        I want to learn counts, as does learning one above what I teach.
+
+        Returns [(other_id, {skills they teach me}, {skills I teach them})].
+        """
+        self._fresh()
+
+        with self._lock:
+            my_teach = set(self.teaches.get(user_id, ()))
+            my_learn = set(self.learns.get(user_id, ()))
+            if taxonomy is not None:
+                my_learn = taxonomy.expand(my_learn, downwards=True)
+                my_teach = taxonomy.expand(my_teach, downwards=False)
+
+            they_teach = Counter()
+            for skill_id in my_learn:
+                they_teach.update(self.teachers.get(skill_id, ()))
+            they_learn = Counter()
+            for skill_id in my_teach:
+                they_learn.update(self.learners.get(skill_id, ()))
+
+            candidates = (they_teach.keys() & they_learn.keys()) - {user_id}
+            ranked = sorted(
+                candidates,
+                key=lambda uid: (
+                    -(they_teach[uid] + they_learn[uid]),
+                    -min(they_teach[uid], they_learn[uid]),
+                    uid,
+                ),
+            )[:limit]
+
+            return [
+                (
+                    other_id,
+                    self.teaches[other_id] & my_learn,
+                    self.learns[other_id] & my_teach,
+                )
+                for other_id in ranked
+            ]
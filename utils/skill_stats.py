@@ -0,0 +1,258 @@
+"""
+Per-skill supply and demand counters and trending scores.
+
+skill_stats holds one row per skill: how many users teach and learn it,
+split by their proficiency, and a trending score fed by new swap
+requests. add_skill / remove_skill apply the change to the counters in
+the same transaction as the user_skills write, and create_request /
+request_ring add to the trending score, so reads are primary-key lookups
+(or an index scan for the trending list). database/rebuild_skill_stats.py
+recomputes the table to fix any drift.
+
+Trending decays exponentially with TRENDING_HALF_LIFE_DAYS. Rather than
+decaying every row over time, a request made at t adds
+2 ** ((t - TRENDING_EPOCH) / half-life) to the stored score. That keeps
+updates to a single increment and the stored order equal to the decayed
+order, and dividing by the current weight gives the score in requests.
+The weights need a double, so the column is DOUBLE PRECISION (a 4-byte
+REAL would overflow by 2027). That holds a thousand half-lives, until
+about 2044. Before then, move TRENDING_EPOCH forward and run
+database/rebuild_skill_stats.py to rescale the stored scores.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from database.db import build_in_clause
+
+LEVELS = ("Beginner", "Intermediate", "Expert")
+ROLES = ("teachers", "learners")
+
+TRENDING_HALF_LIFE_DAYS = 7
+TRENDING_EPOCH = datetime(2025, 1, 1)
+# Requests older than this many half-lives add under 0.1% and are skipped by rebuilds
+TRENDING_WINDOW_HALF_LIVES = 10
+
+COUNT_COLUMNS = [
+    column for role in ROLES for column in [role] + [f"{role}_{level.lower()}" for level in LEVELS]
+]
+
+
+def _utcnow():
+    # Naive UTC, like CURRENT_TIMESTAMP values read back from the database
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _to_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def request_weight(moment):
+    """Trending weight of a request made at moment (naive UTC)"""
+    elapsed = (moment - TRENDING_EPOCH).total_seconds()
+    return 2 ** (elapsed / (TRENDING_HALF_LIFE_DAYS * 86400))
+
+
+def _count_columns(user_skill):
+    """Counters a user_skills row (level, is_teaching, is_learning) adds to"""
+    if user_skill is None:
+        return []
+    level, is_teaching, is_learning = user_skill
+    columns = []
+    for role, active in (("teachers", is_teaching), ("learners", is_learning)):
+        if active:
+            columns.append(role)
+            if level in LEVELS:
+                columns.append(f"{role}_{level.lower()}")
+    return columns
+
+
+def _upsert_increments(db, skill_id, increments):
+    """Add increments ({column: delta}) to a skill's row, inside the caller's transaction"""
+    params = {"skill_id": skill_id, **{f"d_{column}": delta for column, delta in increments.items()}}
+    assignments = ", ".join(f"{column} = {column} + :d_{column}" for column in increments)
+    result = db.execute(
+        text(
+            f"""
+        UPDATE skill_stats SET {assignments}, updated_at = CURRENT_TIMESTAMP
+        WHERE skill_id = :skill_id
+    """
+        ),
+        params,
+    )
+    if result.rowcount == 0:
+        # A missing row with a negative delta is drift the rebuild will fix
+        columns = ", ".join(increments)
+        values = ", ".join(f":d_{column}" for column in increments)
+        db.execute(
+            text(f"INSERT INTO skill_stats (skill_id, {columns}) VALUES (:skill_id, {values})"),
+            {"skill_id": skill_id, **{f"d_{column}": max(delta, 0) for column, delta in increments.items()}},
+        )
+
+
+def record_user_skill_change(db, skill_id, old, new):
+    """
+    Move skill_id's counters from one user_skills state to another, inside
+    the caller's transaction. old/new are (proficiency_level, is_teaching,
+    is_learning) tuples, or None when the row didn't / doesn't exist.
+    """
+    increments = {}
+    for column in _count_columns(new):
+        increments[column] = increments.get(column, 0) + 1
+    for column in _count_columns(old):
+        increments[column] = increments.get(column, 0) - 1
+    increments = {column: delta for column, delta in increments.items() if delta}
+    if increments:
+        _upsert_increments(db, skill_id, increments)
+
+
+def record_swap_request(db, skill_id, moment=None):
+    """Count a new swap request towards skill_id's trending score"""
+    _upsert_increments(db, skill_id, {"trending_score": request_weight(moment or _utcnow())})
+
+
+def rebuild_skill_stats(db, skill_ids, now=None):
+    """
+    Recompute the rows of skill_ids from user_skills and recent swap
+    requests. Returns how many of them had drifted.
+    """
+    now = now or _utcnow()
+    placeholders, params = build_in_clause("s", skill_ids)
+
+    fresh = {skill_id: dict.fromkeys(COUNT_COLUMNS + ["trending_score"], 0) for skill_id in skill_ids}
+    sums = []
+    for flag in ("is_teaching", "is_learning"):
+        sums.append(f"SUM(CASE WHEN {flag} = :yes THEN 1 ELSE 0 END)")
+        sums.extend(
+            f"SUM(CASE WHEN {flag} = :yes AND proficiency_level = '{level}' THEN 1 ELSE 0 END)"
+            for level in LEVELS
+        )
+    result = db.execute(
+        text(
+            f"""
+        SELECT skill_id, {', '.join(sums)} FROM user_skills
+        WHERE skill_id IN ({placeholders})
+        GROUP BY skill_id
+    """
+        ),
+        {**params, "yes": True},
+    )
+    for row in result:
+        fresh[row[0]].update(zip(COUNT_COLUMNS, (int(value or 0) for value in row[1:])))
+
+    since = now - timedelta(days=TRENDING_HALF_LIFE_DAYS * TRENDING_WINDOW_HALF_LIVES)
+    result = db.execute(
+        text(
+            f"""
+        SELECT skill_id, created_at FROM swap_requests
+        WHERE skill_id IN ({placeholders}) AND created_at >= :since
+    """
+        ),
+        {**params, "since": since},
+    )
+    for skill_id, created_at in result:
+        created_at = _to_datetime(created_at)
+        if created_at:
+            fresh[skill_id]["trending_score"] += request_weight(created_at)
+
+    result = db.execute(
+        text(f"SELECT * FROM skill_stats WHERE skill_id IN ({placeholders})"), params
+    )
+    drifted = 0
+    current = {row._mapping["skill_id"]: row._mapping for row in result}
+    for skill_id, values in fresh.items():
+        row = current.get(skill_id)
+        if row is None:
+            drifted += any(values.values())
+            continue
+        stored = row["trending_score"] or 0
+        if any(row[column] != values[column] for column in COUNT_COLUMNS) or (
+            abs(stored - values["trending_score"]) > 0.01 * max(stored, values["trending_score"])
+        ):
+            drifted += 1
+
+    db.execute(text(f"DELETE FROM skill_stats WHERE skill_id IN ({placeholders})"), params)
+    rows = [
+        {"skill_id": skill_id, **values} for skill_id, values in fresh.items() if any(values.values())
+    ]
+    if rows:
+        columns = ["skill_id"] + COUNT_COLUMNS + ["trending_score"]
+        db.execute(
+            text(
+                f"INSERT INTO skill_stats ({', '.join(columns)}) "
+                f"VALUES ({', '.join(':' + column for column in columns)})"
+            ),
+            rows,
+        )
+    return drifted
+
+
+def _stats_dict(skill_id, row, now):
+    """API shape of a skill_stats row (None = nobody has the skill yet)"""
+    row = row or {}
+    teachers = int(row.get("teachers") or 0)
+    learners = int(row.get("learners") or 0)
+    return {
+        "skill_id": skill_id,
+        "teachers": teachers,
+        "learners": learners,
+        # Learners per teacher: above 1 means more demand than supply
+        "demand_ratio": round(learners / teachers, 2) if teachers else None,
+        "teachers_by_level": {
+            level: int(row.get(f"teachers_{level.lower()}") or 0) for level in LEVELS
+        },
+        "learners_by_level": {
+            level: int(row.get(f"learners_{level.lower()}") or 0) for level in LEVELS
+        },
+        "trending": round((row.get("trending_score") or 0) / request_weight(now), 3),
+    }
+
+
+def load_skill_stats(db, skill_ids=None):
+    """Stats keyed by skill id: of skill_ids, or of every skill when None"""
+    now = _utcnow()
+    if skill_ids is None:
+        result = db.execute(text("SELECT * FROM skill_stats"))
+        return {
+            row._mapping["skill_id"]: _stats_dict(row._mapping["skill_id"], row._mapping, now)
+            for row in result
+        }
+
+    placeholders, params = build_in_clause("s", skill_ids)
+    result = db.execute(
+        text(f"SELECT * FROM skill_stats WHERE skill_id IN ({placeholders})"), params
+    )
+    rows = {row._mapping["skill_id"]: row._mapping for row in result}
+    return {skill_id: _stats_dict(skill_id, rows.get(skill_id), now) for skill_id in skill_ids}
+
+
+def trending_skills(db, limit=10):
+    """Skills with the highest decayed request rate, best first"""
+    now = _utcnow()
+    result = db.execute(
+        text(
+            """
+        SELECT st.*, s.name, s.category
+        FROM skill_stats st
+        JOIN skills s ON s.id = st.skill_id
+        WHERE st.trending_score > 0
+        ORDER BY st.trending_score DESC, st.skill_id
+        LIMIT :limit
+    """
+        ),
+        {"limit": limit},
+    )
+    return [
+        {
+            "name": row._mapping["name"],
+            "category": row._mapping["category"],
+            **_stats_dict(row._mapping["skill_id"], row._mapping, now),
+        }
+        for row in result
+    ]
@@ -0,0 +1,168 @@
+"""
+Skill taxonomy: skills.parent_id with a closure table.
+
+skill_closure holds a row (ancestor_id, descendant_id, depth) for every
+skill in the taxonomy and each of its ancestors, including the skill
+itself at depth 0.
+Expanding "Web Development" to everything under it is then one indexed
+join on ancestor_id, and the reverse (what JavaScript is part of) one on
+descendant_id, whatever the depth.
+
+Matching reads the hierarchy from an in-memory SkillTaxonomy, loaded
+with the skill catalog (utils/skill_catalog.py). That decides whether a
+skill needs expanding at all, so skills outside the taxonomy keep the
+flat query. set_parent moves a subtree and bumps the catalog version.
+database/seed_taxonomy.py sets up the default hierarchy once, and
+database/edit_taxonomy.py edits it.
+"""
+
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from database.db import build_in_clause
+from utils.skill_catalog import bump_catalog_version
+
+
+class SkillTaxonomy:
+    """Ancestors and descendants of each skill, both including the skill itself"""
+
+    def __init__(self, paths=()):
+        ancestors, descendants = defaultdict(set), defaultdict(set)
+        for ancestor_id, descendant_id in paths:
+            if ancestor_id != descendant_id:
+                ancestors[descendant_id].add(ancestor_id)
+                descendants[ancestor_id].add(descendant_id)
+        self._ancestors = {k: frozenset(v | {k}) for k, v in ancestors.items()}
+        self._descendants = {k: frozenset(v | {k}) for k, v in descendants.items()}
+
+    def ancestors(self, skill_id):
+        return self._ancestors.get(skill_id) or frozenset((skill_id,))
+
+    def descendants(self, skill_id):
+        return self._descendants.get(skill_id) or frozenset((skill_id,))
+
+    def expand(self, skill_ids, downwards=True):
+        """The union of descendants (or ancestors) of several skills"""
+        related = self.descendants if downwards else self.ancestors
+        expanded = set()
+        for skill_id in skill_ids:
+            expanded |= related(skill_id)
+        return expanded
+
+
+def load_paths(db):
+    """(ancestor_id, descendant_id) of every proper ancestor relation"""
+    result = db.execute(
+        text("SELECT ancestor_id, descendant_id FROM skill_closure WHERE depth > 0")
+    )
+    return [tuple(row) for row in result]
+
+
+def ensure_nodes(db, skill_ids):
+    """Depth-0 closure rows for skills that don't have one yet"""
+    skill_ids = list(skill_ids)
+    if not skill_ids:
+        return
+    placeholders, params = build_in_clause("s", skill_ids)
+    result = db.execute(
+        text(
+            f"""
+        SELECT descendant_id FROM skill_closure
+        WHERE depth = 0 AND descendant_id IN ({placeholders})
+    """
+        ),
+        params,
+    )
+    missing = set(skill_ids) - {row[0] for row in result}
+    if missing:
+        db.execute(
+            text(
+                "INSERT INTO skill_closure (ancestor_id, descendant_id, depth) "
+                "VALUES (:id, :id, 0)"
+            ),
+            [{"id": skill_id} for skill_id in sorted(missing)],
+        )
+
+
+def set_parent(db, skill_id, parent_id):
+    """
+    Move skill_id (with everything under it) below parent_id, or to the
+    top when parent_id is None, inside the caller's transaction. Raises
+    ValueError when that would put a skill under itself.
+    """
+    ensure_nodes(db, [skill_id] if parent_id is None else [skill_id, parent_id])
+
+    subtree = db.execute(
+        text("SELECT descendant_id, depth FROM skill_closure WHERE ancestor_id = :id"),
+        {"id": skill_id},
+    ).fetchall()
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    if parent_id is not None and parent_id in subtree_ids:
+        raise ValueError("A skill can't be placed under itself or its descendants")
+
+    # Paths from outside the subtree into it. Ids are fetched first since
+    # MySQL can't DELETE from a table it selects from.
+    placeholders, params = build_in_clause("d", subtree_ids)
+    db.execute(
+        text(
+            f"""
+        DELETE FROM skill_closure
+        WHERE descendant_id IN ({placeholders}) AND ancestor_id NOT IN ({placeholders})
+    """
+        ),
+        params,
+    )
+
+    if parent_id is not None:
+        above = db.execute(
+            text("SELECT ancestor_id, depth FROM skill_closure WHERE descendant_id = :id"),
+            {"id": parent_id},
+        ).fetchall()
+        db.execute(
+            text(
+                "INSERT INTO skill_closure (ancestor_id, descendant_id, depth) "
+                "VALUES (:ancestor_id, :descendant_id, :depth)"
+            ),
+            [
+                {
+                    "ancestor_id": ancestor_id,
+                    "descendant_id": descendant_id,
+                    "depth": up + down + 1,
+                }
+                for ancestor_id, up in above
+                for descendant_id, down in subtree
+            ],
+        )
+
+    db.execute(
+        text("UPDATE skills SET parent_id = :parent_id WHERE id = :id"),
+        {"parent_id": parent_id, "id": skill_id},
+    )
+    bump_catalog_version(db)
+
+
+def rebuild_closure(db):
+    """Recompute skill_closure from skills.parent_id; returns the number of rows"""
+    parents = dict(db.execute(text("SELECT id, parent_id FROM skills")).fetchall())
+
+    rows = []
+    for skill_id in parents:
+        ancestor_id, depth, seen = skill_id, 0, set()
+        # Stop at missing parents and at cycles left by manual edits
+        while ancestor_id in parents and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": skill_id, "depth": depth})
+            ancestor_id, depth = parents[ancestor_id], depth + 1
+
+    db.execute(text("DELETE FROM skill_closure"))
+    if rows:
+        db.execute(
+            text(
+                "INSERT INTO skill_closure (ancestor_id, descendant_id, depth) "
+                "VALUES (:ancestor_id, :descendant_id, :depth)"
+            ),
+            rows,
+        )
+    bump_catalog_version(db)
+    return len(rows)
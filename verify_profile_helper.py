@@ -4,10 +4,10 @@ from utils.profile_helper import get_profile_picture_url
 def test_profile_helper():
     print("Testing get_profile_picture_url...")
 
-    # TestCase 1: None -> UI Avatars
+    # TestCase 1: None -> Local initials avatar
     url = get_profile_picture_url(None, "John Doe")
     print(f"1. None -> {url}")
-    assert "ui-avatars.com" in url
+    assert url.startswith("/media/initials/JD/") and url.endswith(".svg")
 
     # TestCase 2: External URL -> As is
     ext = "https://example.com/pic.jpg"